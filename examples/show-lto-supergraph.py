@@ -19,7 +19,7 @@
 # Show the "supergraph": the CFG of all functions, linked by
 # interproceduraledges:
 import gcc
-from gccutils.graph.supergraph import Supergraph
+from gccutils.graph.supergraph import get_supergraph
 from gccutils import invoke_dot
 
 # We'll implement this as a custom pass, to be called directly before
@@ -29,8 +29,10 @@ class ShowSupergraph(gcc.IpaPass):
     def execute(self):
         # (the callgraph should be set up by this point)
         if gcc.is_lto():
-            sg = Supergraph(split_phi_nodes=False,
-                            add_fake_entry_node=False)
+            # (reusing the supergraph from any earlier pass, if nothing
+            # has changed since)
+            sg = get_supergraph(split_phi_nodes=False,
+                                add_fake_entry_node=False)
             dot = sg.to_dot('supergraph')
             invoke_dot(dot)
 
@@ -163,6 +163,9 @@ PyGcc_FinishInvokingCallback(PyGILState_STATE gstate,
         PyGcc_PrintException("Unhandled Python exception raised within callback");
     }
 
+    /* GCC may modify the CFG once we return: */
+    PyGcc_DiscardCfgExports();
+
     // FIXME: the result is ignored
 
 cleanup:
@@ -22,6 +22,7 @@
 #include "gcc-python-wrappers.h"
 #include "gcc-c-api/gcc-cfg.h"
 #include "gcc-c-api/gcc-gimple.h"
+#include "gcc-c-api/gcc-function.h"
 
 #include "gcc-c-api/gcc-private-compat.h" /* for now */
 
@@ -452,6 +453,435 @@ PyGccCfg_get_block_for_label(PyObject *s, PyObject *args)
     return PyGccBasicBlock_New(gcc_private_make_cfg_block(bb));
 }
 
+/*
+  Support for gcc.Cfg.export(), which builds an immutable snapshot of the
+  whole CFG in one call.
+
+  Building the snapshot is about as expensive as walking the CFG via
+  the attributes of gcc.BasicBlock and gcc.Edge, but the result is cached,
+  so that every analysis run within the same callback or pass can reuse it.
+
+  GCC is free to modify the CFG whenever control is back within GCC (not
+  just within passes, but e.g. in the TODO actions that follow them), so
+  the cached snapshots are discarded whenever a Python callback or pass
+  returns to GCC, via PyGcc_DiscardCfgExports.  Hence the cache can be
+  keyed on the address of the CFG: the CFG can't be freed (and its address
+  reused) whilst the snapshot is in the cache, and nothing within the
+  snapshot is kept alive beyond the call into Python that built it.
+ */
+
+/* dict mapping from the address of the CFG to its snapshot: */
+static PyObject *cfg_export_cache = NULL;
+
+void
+PyGcc_DiscardCfgExports(void)
+{
+    if (cfg_export_cache) {
+        PyDict_Clear(cfg_export_cache);
+    }
+}
+
+/* The flags of an edge that are exposed within a snapshot, as per the
+   boolean attributes of gcc.Edge: */
+#define NUM_EXPORTED_EDGE_FLAGS 6
+static const char *exported_edge_flag_names[NUM_EXPORTED_EDGE_FLAGS] = {
+    "true_value",
+    "false_value",
+    "loop_exit",
+    "can_fallthru",
+    "complex",
+    "eh"
+};
+static PyObject *exported_edge_flag_strs[NUM_EXPORTED_EDGE_FLAGS];
+
+static PyObject *
+make_edge_flags_tuple(gcc_cfg_edge e)
+{
+    bool flags[NUM_EXPORTED_EDGE_FLAGS];
+    PyObject *result;
+    int i;
+    int count = 0;
+
+    flags[0] = gcc_cfg_edge_is_true_value(e);
+    flags[1] = gcc_cfg_edge_is_false_value(e);
+    flags[2] = gcc_cfg_edge_is_loop_exit(e);
+    flags[3] = gcc_cfg_edge_get_can_fallthru(e);
+    flags[4] = gcc_cfg_edge_is_complex(e);
+    flags[5] = gcc_cfg_edge_is_eh(e);
+
+    for (i = 0; i < NUM_EXPORTED_EDGE_FLAGS; i++) {
+        if (flags[i]) {
+            /* The strings are lazily created, and then kept forever: */
+            if (!exported_edge_flag_strs[i]) {
+                exported_edge_flag_strs[i] =
+                    PyGccString_FromString(exported_edge_flag_names[i]);
+                if (!exported_edge_flag_strs[i]) {
+                    return NULL;
+                }
+            }
+            count++;
+        }
+    }
+
+    result = PyTuple_New(count);
+    if (!result) {
+        return NULL;
+    }
+    count = 0;
+    for (i = 0; i < NUM_EXPORTED_EDGE_FLAGS; i++) {
+        if (flags[i]) {
+            Py_INCREF(exported_edge_flag_strs[i]);
+            PyTuple_SET_ITEM(result, count++, exported_edge_flag_strs[i]);
+        }
+    }
+    return result;
+}
+
+static bool
+add_succ_edge_to_export(gcc_cfg_edge e, void *user_data)
+{
+    PyObject *succs = (PyObject *)user_data;
+    PyObject *obj_edge = NULL;
+    PyObject *dest_index = NULL;
+    PyObject *flags = NULL;
+    PyObject *item = NULL;
+
+    obj_edge = PyGccEdge_New(e);
+    if (!obj_edge) {
+        goto error;
+    }
+    dest_index = PyGccInt_FromLong(
+                     gcc_cfg_block_get_index(gcc_cfg_edge_get_dest(e)));
+    if (!dest_index) {
+        goto error;
+    }
+    flags = make_edge_flags_tuple(e);
+    if (!flags) {
+        goto error;
+    }
+
+    item = PyTuple_Pack(3, obj_edge, dest_index, flags);
+    if (!item) {
+        goto error;
+    }
+    if (-1 == PyList_Append(succs, item)) {
+        goto error;
+    }
+
+    Py_DECREF(obj_edge);
+    Py_DECREF(dest_index);
+    Py_DECREF(flags);
+    Py_DECREF(item);
+    return false;
+
+error:
+    Py_XDECREF(obj_edge);
+    Py_XDECREF(dest_index);
+    Py_XDECREF(flags);
+    Py_XDECREF(item);
+    return true;
+}
+
+/* Convert a list to a tuple, stealing the reference to the list: */
+static PyObject *
+steal_list_as_tuple(PyObject *list)
+{
+    PyObject *result;
+
+    if (!list) {
+        return NULL;
+    }
+    result = PyList_AsTuple(list);
+    Py_DECREF(list);
+    return result;
+}
+
+static bool
+add_block_to_export(gcc_cfg_block bb, void *user_data)
+{
+    PyObject *result = (PyObject *)user_data;
+    PyObject *index = NULL;
+    PyObject *obj_bb = NULL;
+    PyObject *phi_nodes = NULL;
+    PyObject *gimple = NULL;
+    PyObject *succs = NULL;
+    PyObject *item = NULL;
+
+    /* As per add_block_to_list, skip any NULL blocks: */
+    if (!bb.inner) {
+        return false;
+    }
+
+    index = PyGccInt_FromLong(gcc_cfg_block_get_index(bb));
+    if (!index) {
+        goto error;
+    }
+
+    obj_bb = PyGccBasicBlock_New(bb);
+    if (!obj_bb) {
+        goto error;
+    }
+
+    phi_nodes = PyList_New(0);
+    if (!phi_nodes) {
+        goto error;
+    }
+    if (gcc_cfg_block_for_each_gimple_phi(bb,
+                                          append_gimple_phi_to_list,
+                                          phi_nodes)) {
+        goto error;
+    }
+    phi_nodes = steal_list_as_tuple(phi_nodes);
+    if (!phi_nodes) {
+        goto error;
+    }
+
+    gimple = PyList_New(0);
+    if (!gimple) {
+        goto error;
+    }
+    if (gcc_cfg_block_for_each_gimple(bb,
+                                      append_gimple_to_list,
+                                      gimple)) {
+        goto error;
+    }
+    gimple = steal_list_as_tuple(gimple);
+    if (!gimple) {
+        goto error;
+    }
+
+    succs = PyList_New(0);
+    if (!succs) {
+        goto error;
+    }
+    if (gcc_cfg_block_for_each_succ_edge(bb,
+                                         add_succ_edge_to_export,
+                                         succs)) {
+        goto error;
+    }
+    succs = steal_list_as_tuple(succs);
+    if (!succs) {
+        goto error;
+    }
+
+    item = PyTuple_Pack(5, index, obj_bb, phi_nodes, gimple, succs);
+    if (!item) {
+        goto error;
+    }
+    if (-1 == PyList_Append(result, item)) {
+        goto error;
+    }
+
+    Py_DECREF(index);
+    Py_DECREF(obj_bb);
+    Py_DECREF(phi_nodes);
+    Py_DECREF(gimple);
+    Py_DECREF(succs);
+    Py_DECREF(item);
+    return false;
+
+error:
+    Py_XDECREF(index);
+    Py_XDECREF(obj_bb);
+    Py_XDECREF(phi_nodes);
+    Py_XDECREF(gimple);
+    Py_XDECREF(succs);
+    Py_XDECREF(item);
+    return true;
+}
+
+/*
+  Get the (possibly cached) snapshot of the given CFG, as a new reference
+ */
+static PyObject *
+get_cfg_export(gcc_cfg cfg)
+{
+    PyObject *key = NULL;
+    PyObject *result = NULL;
+
+    if (!cfg_export_cache) {
+        cfg_export_cache = PyDict_New();
+        if (!cfg_export_cache) {
+            return NULL;
+        }
+    }
+
+    key = PyLong_FromVoidPtr(cfg.inner);
+    if (!key) {
+        return NULL;
+    }
+
+    result = PyDict_GetItem(cfg_export_cache, key); /* borrowed ref */
+    if (result) {
+        Py_INCREF(result);
+        Py_DECREF(key);
+        return result;
+    }
+
+    result = PyList_New(0);
+    if (!result) {
+        goto error;
+    }
+    if (gcc_cfg_for_each_block(cfg, add_block_to_export, result)) {
+        goto error;
+    }
+    result = steal_list_as_tuple(result);
+    if (!result) {
+        goto error;
+    }
+
+    if (-1 == PyDict_SetItem(cfg_export_cache, key, result)) {
+        goto error;
+    }
+
+    Py_DECREF(key);
+    return result;
+
+error:
+    Py_XDECREF(key);
+    Py_XDECREF(result);
+    return NULL;
+}
+
+PyObject *
+PyGccCfg_export(PyGccCfg *self, PyObject *noargs)
+{
+    return get_cfg_export(self->cfg);
+}
+
+/*
+  Bulk export of a function's CFG, for use when building a
+  gccutils.graph.stmtgraph.StmtGraph, so that the graph can be built
+  without having to go through the various getters (and build their lists)
+  for every block and edge.
+
+  This is built from the snapshot from gcc.Cfg.export(), converting the
+  index of the destination block of each edge into the position of that
+  block within the result.
+ */
+static PyObject *
+make_stmtgraph_block(PyObject *export_item, PyObject *pos_for_index)
+{
+    PyObject *exported_succs = PyTuple_GET_ITEM(export_item, 4);
+    PyObject *phi_nodes = NULL;
+    PyObject *gimple = NULL;
+    PyObject *succs = NULL;
+    PyObject *result = NULL;
+    Py_ssize_t i;
+
+    phi_nodes = PySequence_List(PyTuple_GET_ITEM(export_item, 2));
+    if (!phi_nodes) {
+        goto cleanup;
+    }
+    gimple = PySequence_List(PyTuple_GET_ITEM(export_item, 3));
+    if (!gimple) {
+        goto cleanup;
+    }
+
+    succs = PyList_New(PyTuple_GET_SIZE(exported_succs));
+    if (!succs) {
+        goto cleanup;
+    }
+    for (i = 0; i < PyTuple_GET_SIZE(exported_succs); i++) {
+        /* (edge, dest_index, flags): */
+        PyObject *exported_edge = PyTuple_GET_ITEM(exported_succs, i);
+        PyObject *pos;
+        PyObject *item;
+
+        /* After optimization, the CFG sometimes contains edges that point to
+           blocks that are no longer within the CFG; use -1 for these: */
+        pos = PyDict_GetItem(pos_for_index,
+                             PyTuple_GET_ITEM(exported_edge, 1)); /* borrowed ref */
+        if (pos) {
+            Py_INCREF(pos);
+        } else {
+            pos = PyGccInt_FromLong(-1);
+            if (!pos) {
+                goto cleanup;
+            }
+        }
+
+        item = PyTuple_Pack(2, PyTuple_GET_ITEM(exported_edge, 0), pos);
+        Py_DECREF(pos);
+        if (!item) {
+            goto cleanup;
+        }
+        PyList_SET_ITEM(succs, i, item); /* steals ref */
+    }
+
+    result = PyTuple_Pack(4,
+                          PyTuple_GET_ITEM(export_item, 1),
+                          phi_nodes, gimple, succs);
+
+cleanup:
+    Py_XDECREF(phi_nodes);
+    Py_XDECREF(gimple);
+    Py_XDECREF(succs);
+    return result;
+}
+
+PyObject *
+PyGccFunction_get_stmtgraph_data(PyObject *s, PyObject *noargs)
+{
+    struct PyGccFunction *self = (struct PyGccFunction *)s;
+    gcc_cfg cfg;
+    PyObject *snapshot = NULL;
+    PyObject *pos_for_index = NULL;
+    PyObject *result = NULL;
+    Py_ssize_t i;
+
+    cfg = gcc_function_get_cfg(self->fun);
+    if (!cfg.inner) {
+        Py_RETURN_NONE;
+    }
+
+    snapshot = get_cfg_export(cfg);
+    if (!snapshot) {
+        goto error;
+    }
+
+    /* dict mapping from block index to position within the result: */
+    pos_for_index = PyDict_New();
+    if (!pos_for_index) {
+        goto error;
+    }
+    for (i = 0; i < PyTuple_GET_SIZE(snapshot); i++) {
+        PyObject *index = PyTuple_GET_ITEM(PyTuple_GET_ITEM(snapshot, i), 0);
+        PyObject *pos = PyGccInt_FromLong(i);
+        if (!pos) {
+            goto error;
+        }
+        if (-1 == PyDict_SetItem(pos_for_index, index, pos)) {
+            Py_DECREF(pos);
+            goto error;
+        }
+        Py_DECREF(pos);
+    }
+
+    result = PyList_New(PyTuple_GET_SIZE(snapshot));
+    if (!result) {
+        goto error;
+    }
+    for (i = 0; i < PyTuple_GET_SIZE(snapshot); i++) {
+        PyObject *item = make_stmtgraph_block(PyTuple_GET_ITEM(snapshot, i),
+                                              pos_for_index);
+        if (!item) {
+            goto error;
+        }
+        PyList_SET_ITEM(result, i, item); /* steals ref */
+    }
+
+    Py_DECREF(snapshot);
+    Py_DECREF(pos_for_index);
+    return result;
+
+error:
+    Py_XDECREF(snapshot);
+    Py_XDECREF(pos_for_index);
+    Py_XDECREF(result);
+    return NULL;
+}
+
 union gcc_cfg_as_ptr {
     gcc_cfg cfg;
     void *ptr;
@@ -40,6 +40,8 @@
 #endif
 
 #include "gcc-c-api/gcc-gimple.h"
+#include "gcc-c-api/gcc-cfg.h"
+#include "gcc-c-api/gcc-function.h"
 
 /* GCC 4.9 moved struct walk_stmt_info into the new header gimple-walk.h,
    which in turn needs the new header gimple-iterator.h: */
@@ -273,6 +275,206 @@ PyGccGimple_walk_tree(struct PyGccGimple * self, PyObject *args, PyObject *kwarg
     return PyGccTree_New(gcc_private_make_tree(result));
 }
 
+/*
+  Support for finding all of the gcc.Tree nodes of particular types within
+  statements, without calling back into Python for every node visited
+ */
+struct find_trees_state {
+    /* The gcc.Tree subclass, or tuple of subclasses, to look for: */
+    PyObject *types;
+
+    /* For each tree code: 1 if it is one of the types, 0 if not, and -1 if
+       not yet known: */
+    signed char wanted[MAX_TREE_CODES];
+
+    /* The list of results being built: */
+    PyObject *result;
+
+    /* If "with_stmts", results are (gcc.Gimple, gcc.Tree) pairs; the
+       wrapper for the current statement is created on its first match: */
+    bool with_stmts;
+    gcc_gimple stmt;
+    PyObject *stmt_obj;
+
+    /* Set if an exception occurred, terminating the traversal: */
+    bool error;
+};
+
+static void
+find_trees_state_init(struct find_trees_state *state, PyObject *types,
+                      PyObject *result, bool with_stmts)
+{
+    state->types = types;
+    memset(state->wanted, -1, sizeof(state->wanted));
+    state->result = result;
+    state->with_stmts = with_stmts;
+    state->stmt_obj = NULL;
+    state->error = false;
+}
+
+static tree
+find_trees_callback(tree *tree_ptr, int *walk_subtrees, void *data)
+{
+    struct walk_stmt_info *wi = (struct walk_stmt_info*)data;
+    struct find_trees_state *state = (struct find_trees_state *)wi->info;
+    enum tree_code code;
+    PyObject *tree_obj = NULL;
+    PyObject *item = NULL;
+
+    assert(state);
+    assert(*tree_ptr);
+    code = TREE_CODE(*tree_ptr);
+
+    /* Only create a wrapper object for nodes of the requested types;
+       the result of the check is cached per tree code: */
+    if (state->wanted[code] < 0) {
+        int rc = PyObject_IsSubclass(
+            (PyObject*)PyGcc_autogenerated_tree_type_for_tree_code(code, 1),
+            state->types);
+        if (rc == -1) {
+            goto error;
+        }
+        state->wanted[code] = rc;
+    }
+    if (!state->wanted[code]) {
+        return NULL;
+    }
+
+    tree_obj = PyGccTree_New(gcc_private_make_tree(*tree_ptr));
+    if (!tree_obj) {
+        goto error;
+    }
+
+    if (state->with_stmts) {
+        if (!state->stmt_obj) {
+            state->stmt_obj = PyGccGimple_New(state->stmt);
+            if (!state->stmt_obj) {
+                goto error;
+            }
+        }
+        item = PyTuple_Pack(2, state->stmt_obj, tree_obj);
+        if (!item) {
+            goto error;
+        }
+    } else {
+        item = tree_obj;
+        Py_INCREF(item);
+    }
+
+    if (-1 == PyList_Append(state->result, item)) {
+        goto error;
+    }
+
+    Py_DECREF(tree_obj);
+    Py_DECREF(item);
+    return NULL;
+
+ error:
+    /* On an exception, terminate the traversal: */
+    *walk_subtrees = 0;
+    state->error = true;
+    Py_XDECREF(tree_obj);
+    Py_XDECREF(item);
+    return *tree_ptr;
+}
+
+static bool
+find_trees_within_stmt(gcc_gimple stmt, void *user_data)
+{
+    struct find_trees_state *state = (struct find_trees_state *)user_data;
+    struct walk_stmt_info wi;
+
+    state->stmt = stmt;
+    state->stmt_obj = NULL;
+
+    memset(&wi, 0, sizeof(wi));
+    wi.info = state;
+
+    walk_gimple_op (stmt.inner,
+                    find_trees_callback,
+                    &wi);
+
+    Py_XDECREF(state->stmt_obj);
+    state->stmt_obj = NULL;
+
+    /* Terminate the iteration if there was an exception: */
+    return state->error;
+}
+
+PyObject *
+PyGccGimple_find_trees(struct PyGccGimple * self, PyObject *args)
+{
+    PyObject *types;
+    PyObject *result;
+    struct find_trees_state state;
+
+    if (!PyArg_ParseTuple(args,
+                          "O:find_trees",
+                          &types)) {
+        return NULL;
+    }
+
+    result = PyList_New(0);
+    if (!result) {
+        return NULL;
+    }
+
+    find_trees_state_init(&state, types, result, false);
+    if (find_trees_within_stmt(self->stmt, &state)) {
+        Py_DECREF(result);
+        return NULL;
+    }
+
+    return result;
+}
+
+static bool
+find_trees_within_block(gcc_cfg_block bb, void *user_data)
+{
+    /* Skip any NULL blocks: */
+    if (!bb.inner) {
+        return false;
+    }
+    return gcc_cfg_block_for_each_gimple(bb,
+                                         find_trees_within_stmt,
+                                         user_data);
+}
+
+PyObject *
+PyGccFunction_find_trees(PyObject *s, PyObject *args)
+{
+    struct PyGccFunction *self = (struct PyGccFunction *)s;
+    PyObject *types;
+    PyObject *result;
+    gcc_cfg cfg;
+    struct find_trees_state state;
+
+    if (!PyArg_ParseTuple(args,
+                          "O:find_trees",
+                          &types)) {
+        return NULL;
+    }
+
+    result = PyList_New(0);
+    if (!result) {
+        return NULL;
+    }
+
+    cfg = gcc_function_get_cfg(self->fun);
+    if (!cfg.inner) {
+        /* No statements to look in yet: */
+        return result;
+    }
+
+    find_trees_state_init(&state, types, result, true);
+    if (gcc_cfg_for_each_block(cfg, find_trees_within_block, &state)) {
+        Py_DECREF(result);
+        return NULL;
+    }
+
+    return result;
+}
+
 PyObject *
 PyGccGimple_get_rhs(struct PyGccGimple *self, void *closure)
 {
@@ -92,6 +92,9 @@ static bool impl_gate(function *fun)
         result_obj = PyObject_CallMethod(pass_obj, (char*)"gate", NULL);
     }
 
+    /* GCC may modify the CFG once we return: */
+    PyGcc_DiscardCfgExports();
+
     Py_XDECREF(cfun_obj);
     Py_DECREF(pass_obj);
 
@@ -137,6 +140,9 @@ static unsigned int impl_execute(function *fun)
         result_obj = PyObject_CallMethod(pass_obj, (char*)"execute", NULL);
     }
 
+    /* GCC may modify the CFG once we return: */
+    PyGcc_DiscardCfgExports();
+
     Py_XDECREF(cfun_obj);
     Py_DECREF(pass_obj);
 
@@ -184,9 +184,15 @@ PyGccBasicBlock_get_rtl(PyGccBasicBlock *self, void *closure);
 PyObject *
 PyGccCfg_get_basic_blocks(PyGccCfg *self, void *closure);
 
+PyObject *
+PyGccCfg_export(PyGccCfg *self, PyObject *noargs);
+
 PyObject *
 PyGccCfg_get_block_for_label(PyObject *self, PyObject *args);
 
+PyObject *
+PyGccFunction_get_stmtgraph_data(PyObject *self, PyObject *noargs);
+
 /* autogenerated-tree.c: */
 
 /* return -1 if there isn't an enum tree_code associated with this type */
@@ -387,6 +393,12 @@ PyGccGimple_richcompare(PyObject *o1, PyObject *o2, int op);
 PyObject *
 PyGccGimple_walk_tree(struct PyGccGimple * self, PyObject *args, PyObject *kwargs);
 
+PyObject *
+PyGccGimple_find_trees(struct PyGccGimple * self, PyObject *args);
+
+PyObject *
+PyGccFunction_find_trees(PyObject *self, PyObject *args);
+
 PyObject *
 PyGccGimple_get_rhs(struct PyGccGimple *self, void *closure);
 
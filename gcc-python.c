@@ -372,6 +372,21 @@ PyGcc_get_dump_base_name(PyObject *self, PyObject *noargs)
     return PyGccStringOrNone(dump_base_name);
 }
 
+static PyObject *
+PyGcc_get_main_input_filename(PyObject *self, PyObject *noargs)
+{
+    /*
+      The generated gcc/options.h has:
+          #ifdef GENERATOR_FILE
+          extern const char *main_input_filename;
+          #else
+            const char *x_main_input_filename;
+          #define main_input_filename global_options.x_main_input_filename
+          #endif
+    */
+    return PyGccStringOrNone(main_input_filename);
+}
+
 static PyObject *
 PyGcc_get_is_lto(PyObject *self, PyObject *noargs)
 {
@@ -474,6 +489,9 @@ static PyMethodDef GccMethods[] = {
     {"get_dump_base_name", PyGcc_get_dump_base_name, METH_NOARGS,
      "Get the base name used when writing dump files"},
 
+    {"get_main_input_filename", PyGcc_get_main_input_filename, METH_NOARGS,
+     "Get the name of the main input file, as given on the command line"},
+
     {"is_lto", PyGcc_get_is_lto, METH_NOARGS,
      "Determine whether or not we're being invoked during link-time optimization"},
 
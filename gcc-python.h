@@ -355,6 +355,11 @@ PyGcc_insert_new_wrapper_into_cache(PyObject **cache,
                                          void *ptr,
                                          PyObject *obj);
 
+/* Called whenever Python code returns control to GCC, which may then modify
+   the CFG, to discard the cached snapshots from gcc.Cfg.export(): */
+void
+PyGcc_DiscardCfgExports(void);
+
 
 /* gcc-python.c */
 int PyGcc_IsWithinEvent(enum plugin_event *out_event);
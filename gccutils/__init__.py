@@ -33,18 +33,77 @@ def get_field_by_name(typeobj, name):
         if field.name == name:
             return field
 
+class GlobalDeclIndex(object):
+    """
+    An index of the declarations in global scope, mapping from names to
+    the gcc.TypeDecl and gcc.VarDecl instances, so that these can be looked
+    up without walking all of the translation units' globals each time
+    """
+    def __init__(self):
+        self.typedefs = {}
+        self.vardecls = {}
+
+        # For C++, names are looked up in the global namespace instead; as
+        # before, this happens for any name not found within the units
+        # preceding the first C++ one:
+        self.typedefs_use_namespace = False
+        self.vardecls_use_namespace = False
+
+        for u in gcc.get_translation_units():
+            if u.language.startswith('GNU C++'):
+                self.typedefs_use_namespace = True
+            if u.language == 'GNU C++':
+                self.vardecls_use_namespace = True
+            if self.typedefs_use_namespace and self.vardecls_use_namespace:
+                break
+            if u.block:
+                for v in u.block.vars:
+                    if isinstance(v, gcc.TypeDecl):
+                        if not self.typedefs_use_namespace:
+                            self.typedefs.setdefault(v.name, v)
+                    elif isinstance(v, gcc.VarDecl):
+                        if not self.vardecls_use_namespace:
+                            self.vardecls.setdefault(v.name, v)
+
+    def get_typedef(self, name):
+        if name in self.typedefs:
+            return self.typedefs[name]
+        if self.typedefs_use_namespace:
+            return gcc.get_global_namespace().lookup(name)
+
+    def get_vardecl(self, name):
+        if name in self.vardecls:
+            return self.vardecls[name]
+        if self.vardecls_use_namespace:
+            return gcc.get_global_namespace().lookup(name)
+
+# The GlobalDeclIndex, built on first use, and discarded whenever a new
+# declaration is parsed, or a translation unit is finished:
+_global_decl_index = None
+_registered_index_callbacks = False
+
+def _invalidate_global_decl_index(*args):
+    global _global_decl_index
+    _global_decl_index = None
+
+def get_global_decl_index():
+    global _global_decl_index, _registered_index_callbacks
+    if _global_decl_index is None:
+        if not _registered_index_callbacks:
+            if hasattr(gcc, 'PLUGIN_FINISH_DECL'):
+                # GCC 4.7 and later:
+                gcc.register_callback(gcc.PLUGIN_FINISH_DECL,
+                                      _invalidate_global_decl_index)
+            gcc.register_callback(gcc.PLUGIN_FINISH_UNIT,
+                                  _invalidate_global_decl_index)
+            _registered_index_callbacks = True
+        _global_decl_index = GlobalDeclIndex()
+    return _global_decl_index
+
 def get_global_typedef(name):
     # Look up a typedef in global scope by name, returning a gcc.TypeDecl,
     # or None if not found
-    for u in gcc.get_translation_units():
-        if u.language.startswith('GNU C++'):
-            gns = gcc.get_global_namespace()
-            return gns.lookup(name)
-        if u.block:
-            for v in u.block.vars:
-                if isinstance(v, gcc.TypeDecl):
-                    if v.name == name:
-                        return v
+    return get_global_decl_index().get_typedef(name)
 
 def get_variables_as_dict():
     result = {}
@@ -55,14 +114,7 @@ def get_variables_as_dict():
 def get_global_vardecl_by_name(name):
     # Look up a variable in global scope by name, returning a gcc.VarDecl,
     # or None if not found
-    for u in gcc.get_translation_units():
-        if u.language == 'GNU C++':
-            gns = gcc.get_global_namespace()
-            return gns.lookup(name)
-        for v in u.block.vars:
-            if isinstance(v, gcc.VarDecl):
-                if v.name == name:
-                    return v
+    return get_global_decl_index().get_vardecl(name)
 
 def get_nonnull_arguments(funtype):
     """
@@ -439,30 +491,42 @@ class CfgPrettyPrinter(DotPrettyPrinter):
         return ''
 
     def to_dot(self):
+        from gccutils.graph import StringWriter
+        out = StringWriter()
+        self.write_dot(out)
+        return out.getvalue()
+
+    def write_dot(self, out):
+        """
+        Write the graphviz source to the given file-like object, a block
+        at a time
+        """
+        from gccutils.graph import ChunkedWriter
+        out = ChunkedWriter(out)
         if hasattr(self, 'name'):
             name = self.name
         else:
             name = 'G'
-        result = 'digraph %s {\n' % name
-        result += ' subgraph cluster_cfg {\n'
-        #result += '  label="CFG";\n'
-        result += '  node [shape=box];\n'
+        out.write('digraph %s {\n' % name)
+        out.write(' subgraph cluster_cfg {\n')
+        #out.write('  label="CFG";\n')
+        out.write('  node [shape=box];\n')
         for block in self.cfg.basic_blocks:
 
-            result += ('  %s [label=<%s>];\n'
-                       % (self.block_id(block), self.block_to_dot_label(block)))
+            out.write('  %s [label=<%s>];\n'
+                      % (self.block_id(block), self.block_to_dot_label(block)))
 
             for edge in block.succs:
-                result += self.edge_to_dot(edge)
+                out.write(self.edge_to_dot(edge))
             # FIXME: this will have duplicates:
             #for edge in block.preds:
-            #    result += edge_to_dot(edge)
-        result += ' }\n'
+            #    out.write(edge_to_dot(edge))
+        out.write(' }\n')
 
         # Potentially add extra material:
-        result += self.extra_items()
-        result += '}\n'
-        return result
+        out.write(self.extra_items())
+        out.write('}\n')
+        out.flush()
 
 class TreePrettyPrinter(DotPrettyPrinter):
     # Generate a graphviz visualization of this gcc.Tree and the graphs of
@@ -538,6 +602,13 @@ def cfg_to_dot(cfg, name = None):
     pp = CfgPrettyPrinter(cfg, name)
     return pp.to_dot()
 
+def write_cfg_dot(out, cfg, name = None):
+    """
+    As per cfg_to_dot, but writing to a file-like object
+    """
+    pp = CfgPrettyPrinter(cfg, name)
+    pp.write_dot(out)
+
 
 def tree_to_dot(tree):
     pp = TreePrettyPrinter(tree)
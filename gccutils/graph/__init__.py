@@ -15,25 +15,36 @@
 #   along with this program.  If not, see
 #   <http://www.gnu.org/licenses/>.
 
+from array import array
+
 from gccutils.dot import to_html
 
 ############################################################################
 # Generic directed graphs
 ############################################################################
 class Graph(object):
-    __slots__ = ('nodes', 'edges')
+    __slots__ = ('nodes', 'edges', 'adjacency', 'generation', '__weakref__')
 
     def __init__(self):
         self.nodes = set()
         self.edges = set()
+        # CompactAdjacency, once the graph has been compacted:
+        self.adjacency = None
+        # Incremented whenever nodes are added or removed:
+        self.generation = 0
 
     def add_node(self, node):
+        if self.adjacency:
+            raise ValueError('cannot add nodes to a compacted graph')
         self.nodes.add(node)
+        self.generation += 1
         return node
 
     def add_edge(self, srcnode, dstnode, *args, **kwargs):
         assert isinstance(srcnode, Node)
         assert isinstance(dstnode, Node)
+        if self.adjacency:
+            raise ValueError('cannot add edges to a compacted graph')
         e = self._make_edge(srcnode, dstnode, *args, **kwargs)
         self.edges.add(e)
         srcnode.succs.add(e)
@@ -44,9 +55,12 @@ class Graph(object):
         return Edge(srcnode, dstnode)
 
     def remove_node(self, node):
+        if self.adjacency:
+            raise ValueError('cannot remove nodes from a compacted graph')
         if node not in self.nodes:
             return 0
         self.nodes.remove(node)
+        self.generation += 1
         victims = 1
         for edge in list(node.succs):
             victims += self.remove_edge(edge)
@@ -55,6 +69,8 @@ class Graph(object):
         return victims
 
     def remove_edge(self, edge):
+        if self.adjacency:
+            raise ValueError('cannot remove edges from a compacted graph')
         if edge not in self.edges:
             return 0
         self.edges.remove(edge)
@@ -67,15 +83,65 @@ class Graph(object):
                 victims += self.remove_node(edge.dstnode)
         return victims
 
-    def to_dot(self, name, ctxt=None):
-        result = 'digraph %s {\n' % name
-        result += '  node [shape=box];\n'
-        result += self._nodes_to_dot(ctxt)
-        result += self._edges_to_dot(ctxt)
-        result += '}\n'
-        return result
-
-    def _nodes_to_dot(self, ctxt):
+    def compact(self):
+        """
+        Freeze the graph, replacing the sets of edges on the graph and on
+        every node with a CompactAdjacency, giving each node and edge an
+        integer ID.
+
+        The nodes' "preds" and "succs" become read-only views onto the
+        CompactAdjacency, and "edges" becomes a list (in order of edge ID),
+        so that existing code that walks the graph continues to work, but
+        a large graph takes up much less memory.
+
+        Returns the CompactAdjacency; once compacted, nodes and edges can no
+        longer be added or removed.
+        """
+        if self.adjacency:
+            return self.adjacency
+        adj = CompactAdjacency(self.nodes, self.edges)
+        for nid, node in enumerate(adj.nodes):
+            node.preds = PredsView(adj, nid)
+            node.succs = SuccsView(adj, nid)
+        self.edges = adj.edges
+        self.adjacency = adj
+        return adj
+
+    def get_node_id(self, node):
+        """
+        Get the integer ID of a node within a compacted graph
+        """
+        assert self.adjacency
+        return node.succs.nid
+
+    def to_dot(self, name, ctxt=None, maxclusternodes=None):
+        out = StringWriter()
+        self.write_dot(out, name, ctxt, maxclusternodes)
+        return out.getvalue()
+
+    def write_dot(self, out, name, ctxt=None, maxclusternodes=None):
+        """
+        Write graphviz source for the graph to the given file-like object,
+        as it's generated, rather than building it up as a string.
+
+        If maxclusternodes is not None, then any innermost subgraph (e.g.
+        a function within a supergraph) with more than that many nodes is
+        collapsed into a single node, with the edges to and from it merged.
+        """
+        out = ChunkedWriter(out)
+        out.write('digraph %s {\n' % name)
+        out.write('  node [shape=box];\n')
+        collapsed = self._write_nodes_dot(out, ctxt, maxclusternodes)
+        self._write_edges_dot(out, ctxt, collapsed)
+        out.write('}\n')
+        out.flush()
+
+    def _write_nodes_dot(self, out, ctxt, maxclusternodes):
+        """
+        Write out the nodes, returning a dict mapping from each node that
+        was collapsed into a summary node to the dot ID of that summary
+        node
+        """
         # A subgraph path is a tuple of Subgraph instances
 
         from pprint import pprint
@@ -120,43 +186,71 @@ class Graph(object):
             print('child_paths:')
             pprint(child_paths)
 
+        # dict from node to the dot ID of the node it's been collapsed into:
+        collapsed = {}
+
         # 3rd pass: recursively render the subgraph paths:
         def render_subgraph_path(subgraph_path, indent):
             def _indent():
                 return ' ' * indent
-            result = ''
+            nodes = subgraph_paths.get(subgraph_path, set())
+            if (maxclusternodes is not None
+                    and subgraph_path
+                    and subgraph_path not in child_paths
+                    and len(nodes) > maxclusternodes):
+                # Collapse this subgraph into a single node:
+                summary_id = 'collapsed_%s' % '_'.join(subgraph.id
+                                                       for subgraph in subgraph_path)
+                out.write('%s%s [label=<%s>];\n'
+                          % (_indent(),
+                             summary_id,
+                             to_html('%s (%i nodes)'
+                                     % (subgraph_path[-1].label, len(nodes)))))
+                for node in nodes:
+                    collapsed[node] = summary_id
+                return
+
             if subgraph_path:
-                result += ('%ssubgraph cluster_%s {\n'
-                           % (_indent(), subgraph_path[-1].id))
+                out.write('%ssubgraph cluster_%s {\n'
+                          % (_indent(), subgraph_path[-1].id))
                 indent += 2
-                result += ('%slabel = "%s";\n'
-                           % (_indent(), subgraph_path[-1].label))
-
-            for node in subgraph_paths.get(subgraph_path, set()):
-                result += ('%s%s [label=<%s>];\n'
-                           % (_indent(),
-                              node.to_dot_id(),
-                              node.to_dot_label(ctxt)))
+                out.write('%slabel = "%s";\n'
+                          % (_indent(), subgraph_path[-1].label))
+
+            for node in nodes:
+                out.write('%s%s [label=<%s>];\n'
+                          % (_indent(),
+                             node.to_dot_id(),
+                             node.to_dot_label(ctxt)))
             # Recurse:
             for child_path in child_paths.get(subgraph_path, set()):
-                result += render_subgraph_path(child_path, indent)
+                render_subgraph_path(child_path, indent)
 
             if subgraph_path:
                 indent -= 2
-                result += '%s}\n' % _indent()
-            return result
+                out.write('%s}\n' % _indent())
 
-        return render_subgraph_path( (), 2)
+        render_subgraph_path( (), 2)
+        return collapsed
 
-    def _edges_to_dot(self, ctxt):
-        result = ''
+    def _write_edges_dot(self, out, ctxt, collapsed):
+        # set of (srcid, dstid) pairs for edges to/from collapsed nodes that
+        # have already been written:
+        merged = set()
         for edge in self.edges:
-            result += ('    %s -> %s [label=<%s>%s];\n'
-                       % (edge.srcnode.to_dot_id(),
-                          edge.dstnode.to_dot_id(),
-                          edge.to_dot_label(ctxt),
-                          edge.to_dot_attrs(ctxt)))
-        return result
+            if edge.srcnode in collapsed or edge.dstnode in collapsed:
+                srcid = collapsed.get(edge.srcnode, None) or edge.srcnode.to_dot_id()
+                dstid = collapsed.get(edge.dstnode, None) or edge.dstnode.to_dot_id()
+                if srcid == dstid or (srcid, dstid) in merged:
+                    continue
+                merged.add((srcid, dstid))
+                out.write('    %s -> %s;\n' % (srcid, dstid))
+                continue
+            out.write('    %s -> %s [label=<%s>%s];\n'
+                      % (edge.srcnode.to_dot_id(),
+                         edge.dstnode.to_dot_id(),
+                         edge.to_dot_label(ctxt),
+                         edge.to_dot_attrs(ctxt)))
 
     def topologically_sorted_nodes(self):
         from gccutils import topological_sort
@@ -250,6 +344,46 @@ class Graph(object):
         return None
 
 
+class StringWriter(object):
+    """
+    Minimal file-like object, gathering what's written to it into a string
+    """
+    __slots__ = ('chunks', )
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+class ChunkedWriter(object):
+    """
+    Wrapper around a file-like object, passing on what's written to it in
+    chunks of up to "chunksize" writes at a time
+    """
+    __slots__ = ('out', 'chunksize', 'pending')
+
+    def __init__(self, out, chunksize=1024):
+        self.out = out
+        self.chunksize = chunksize
+        self.pending = []
+
+    def write(self, text):
+        self.pending.append(text)
+        if len(self.pending) >= self.chunksize:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.out.write(''.join(self.pending))
+            self.pending = []
+
 class Node(object):
     __slots__ = ('preds', 'succs')
 
@@ -301,6 +435,125 @@ class Edge(object):
     def to_dot_attrs(self, ctxt):
         return ''
 
+############################################################################
+# Compact representation of a graph that's been fully built, in the
+# "compressed sparse row" style:
+#   - the nodes and edges are numbered from 0
+#   - the edges are sorted by the ID of their source node, so that the
+#     out-edges of node N are those with IDs in the range
+#        succ_start[N] <= ID < succ_start[N + 1]
+#   - pred_edges holds the edge IDs sorted by the ID of their destination
+#     node, so that the in-edges of node N are those given by
+#        pred_edges[pred_start[N]:pred_start[N + 1]]
+# with the integers held in arrays, rather than as sets of objects on
+# every node
+############################################################################
+def _get_row_starts(sorted_ids, numnodes):
+    """
+    Given a sequence of node IDs in increasing order, get an array giving
+    the index of the first occurrence of each ID (or of where it would
+    have been), with a final entry for the length of the sequence
+    """
+    starts = array('i', [0] * (numnodes + 1))
+    for nid in sorted_ids:
+        starts[nid + 1] += 1
+    for nid in range(numnodes):
+        starts[nid + 1] += starts[nid]
+    return starts
+
+class CompactAdjacency(object):
+    __slots__ = ('nodes', # list of Node, indexed by node ID
+                 'edges', # list of Edge, indexed by edge ID
+                 'edge_src', # array of node ID, indexed by edge ID
+                 'edge_dst', # array of node ID, indexed by edge ID
+                 'succ_start', # array of edge ID, indexed by node ID
+                 'pred_start', # array of index into pred_edges, by node ID
+                 'pred_edges', # array of edge ID
+                 )
+
+    def __init__(self, nodes, edges):
+        self.nodes = list(nodes)
+        id_for_node = dict((node, nid)
+                           for nid, node in enumerate(self.nodes))
+        self.edges = sorted(edges,
+                            key=lambda edge: id_for_node[edge.srcnode])
+        numnodes = len(self.nodes)
+        self.edge_src = array('i', [id_for_node[edge.srcnode]
+                                    for edge in self.edges])
+        self.edge_dst = array('i', [id_for_node[edge.dstnode]
+                                    for edge in self.edges])
+        self.succ_start = _get_row_starts(self.edge_src, numnodes)
+        self.pred_edges = array('i', sorted(range(len(self.edges)),
+                                            key=self.edge_dst.__getitem__))
+        self.pred_start = _get_row_starts([self.edge_dst[eid]
+                                           for eid in self.pred_edges],
+                                          numnodes)
+
+    def get_succ_edge_ids(self, nid):
+        return range(self.succ_start[nid], self.succ_start[nid + 1])
+
+    def get_pred_edge_ids(self, nid):
+        return self.pred_edges[self.pred_start[nid]:self.pred_start[nid + 1]]
+
+    def get_succ_ids(self, nid):
+        """
+        Get the IDs of the destination nodes of the out-edges of a node
+        """
+        return [self.edge_dst[eid] for eid in self.get_succ_edge_ids(nid)]
+
+    def get_pred_ids(self, nid):
+        """
+        Get the IDs of the source nodes of the in-edges of a node
+        """
+        return [self.edge_src[eid] for eid in self.get_pred_edge_ids(nid)]
+
+class EdgesView(object):
+    """
+    Read-only view of the in-edges or out-edges of a node within a
+    compacted graph, replacing the set of Edge instances
+    """
+    __slots__ = ('adjacency', 'nid')
+
+    def __init__(self, adjacency, nid):
+        self.adjacency = adjacency
+        self.nid = nid
+
+    def _get_edge_ids(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        edges = self.adjacency.edges
+        for eid in self._get_edge_ids():
+            yield edges[eid]
+
+    def __len__(self):
+        return len(self._get_edge_ids())
+
+    def __bool__(self):
+        return len(self) > 0
+    __nonzero__ = __bool__
+
+    def __contains__(self, edge):
+        for other in self:
+            if other is edge:
+                return True
+        return False
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self))
+
+class PredsView(EdgesView):
+    __slots__ = ()
+
+    def _get_edge_ids(self):
+        return self.adjacency.get_pred_edge_ids(self.nid)
+
+class SuccsView(EdgesView):
+    __slots__ = ()
+
+    def _get_edge_ids(self):
+        return self.adjacency.get_succ_edge_ids(self.nid)
+
 class Subgraph(object):
     __slots__ = ('id', 'label')
 
@@ -15,6 +15,8 @@
 #   along with this program.  If not, see
 #   <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
+
 from gccutils.graph import Graph, Node, Edge, Subgraph
 from gccutils.graph.supergraph import Supergraph, CallToStart, \
     ExitToReturnSite, CallNode
@@ -56,8 +58,21 @@ class Callstring:
         return '_'.join([str(id(callnode))
                          for callnode in self.callnodes])
 
+def push_callstring(callstring, callnode, maxlength):
+    """
+    Get the Callstring for a call from the given CallNode
+    """
+    assert len(callstring.callnodes) <= maxlength
+    if len(callstring.callnodes) == maxlength:
+        # Truncate, losing the bottom of the stack:
+        oldstack = list(callstring.callnodes[1:])
+    else:
+        oldstack = list(callstring.callnodes)
+    return Callstring(tuple(oldstack + [callnode]))
+
 class IvpGraph(Graph):
-    __slots__ = ('sg', 'maxlength', 'ivpnodes', '_entrynodes')
+    __slots__ = ('sg', 'maxlength', 'ivpnodes', '_entrynodes',
+                 'all_callstrings')
 
     def __init__(self, sg, maxlength):
         Graph.__init__(self)
@@ -107,14 +122,9 @@ class IvpGraph(Graph):
                 def get_callstring():
                     if isinstance(inneredge, CallToStart):
                         # interprocedural call: push onto stack:
-                        callnode = inneredge.srcnode
-                        assert len(callstring.callnodes) <= maxlength
-                        if len(callstring.callnodes) == maxlength:
-                            # Truncate, losing the bottom of the stack:
-                            oldstack = list(callstring.callnodes[1:])
-                        else:
-                            oldstack = list(callstring.callnodes)
-                        return Callstring(tuple(oldstack + [callnode]))
+                        return push_callstring(callstring,
+                                               inneredge.srcnode,
+                                               maxlength)
 
                     elif isinstance(inneredge, ExitToReturnSite):
                         # interprocedural return: pop from stack
@@ -276,3 +286,164 @@ class IvpEdge(Edge):
     @property
     def stmtedge(self):
         return self.inneredge.stmtedge
+
+############################################################################
+# Demand-driven alternative to IvpGraph, for when building all of the
+# (callstring, supernode) pairs up-front would be too expensive (e.g. with
+# a larger maxlength)
+############################################################################
+class LazyIvpGraph(object):
+    """
+    Rather than building all of the (callstring, supernode) pairs up-front,
+    the out-edges of each LazyIvpNode are only built when its "succs" are
+    looked at.  They are memoized in a table holding the out-edges of up to
+    "maxentries" nodes, discarding those of the least recently used nodes
+    when it fills up (they will be rebuilt if needed again), so that the
+    memory used is bounded however much of the graph gets explored.
+
+    Unlike IvpGraph, a return from a truncated callstring leads to every
+    callstring that could have been truncated, rather than just those seen
+    whilst building the graph, and nodes don't track their "preds".
+    """
+    __slots__ = ('sg', 'maxlength', 'maxentries',
+                 '_entrynodes', '_succs_for_key', '_callers_for_fun',
+                 'hits', 'misses')
+
+    def __init__(self, sg, maxlength, maxentries=100000):
+        self.sg = sg
+        self.maxlength = maxlength
+        self.maxentries = maxentries
+
+        self._entrynodes = [LazyIvpNode(self, Callstring(tuple()), supernode)
+                            for supernode in sg.get_entry_nodes()]
+
+        # LRU table mapping from (callstring, supernode) to tuple of IvpEdge:
+        self._succs_for_key = OrderedDict()
+
+        # dict mapping from gcc.Function to list of CallNode:
+        self._callers_for_fun = {}
+
+        # Number of lookups of out-edges that were/weren't memoized:
+        self.hits = 0
+        self.misses = 0
+
+    def get_functions(self):
+        for fun in self.sg.get_functions():
+            yield fun
+
+    def get_entry_nodes(self):
+        for node in self._entrynodes:
+            yield node
+
+    def get_succs(self, ivpnode):
+        """
+        Get the out-edges of the given LazyIvpNode, as a tuple of IvpEdge
+        """
+        key = (ivpnode.callstring, ivpnode.innernode)
+        succs = self._succs_for_key.pop(key, None)
+        if succs is None:
+            self.misses += 1
+            succs = self._make_succs(ivpnode)
+            if len(self._succs_for_key) >= self.maxentries:
+                # Discard the least recently used entry:
+                self._succs_for_key.popitem(last=False)
+        else:
+            self.hits += 1
+        # (re)insert, as the most recently used entry:
+        self._succs_for_key[key] = succs
+        return succs
+
+    def _make_succs(self, ivpnode):
+        callstring = ivpnode.callstring
+        result = []
+        for inneredge in ivpnode.innernode.succs:
+            if isinstance(inneredge, CallToStart):
+                # interprocedural call: push onto stack:
+                newcallstrings = [push_callstring(callstring,
+                                                  inneredge.srcnode,
+                                                  self.maxlength)]
+            elif isinstance(inneredge, ExitToReturnSite):
+                # interprocedural return: pop from stack
+                newcallstrings = self._get_return_callstrings(callstring,
+                                                              inneredge)
+            else:
+                # same stack depth:
+                newcallstrings = [callstring]
+            for newcallstring in newcallstrings:
+                dstnode = LazyIvpNode(self, newcallstring, inneredge.dstnode)
+                result.append(IvpEdge(ivpnode, dstnode, inneredge))
+        return tuple(result)
+
+    def _get_return_callstrings(self, callstring, inneredge):
+        if not callstring.callnodes:
+            return []
+
+        # Ensure that we're returning to the correct place according to the
+        # top of the stack:
+        callnode = callstring.callnodes[-1]
+        if inneredge.dstnode != callnode.returnnode:
+            return []
+
+        # We could be at the top of an untruncated stack, in which case we
+        # simply lose the top element:
+        suffix = callstring.callnodes[:-1]
+        result = [Callstring(suffix)]
+
+        # Alternatively, the stack could be truncated, in which case the
+        # lost bottom element could be any of the calls of the function
+        # containing the new bottom element:
+        if len(callstring.callnodes) == self.maxlength:
+            for caller in self._get_callers(callstring.callnodes[0].function):
+                result.append(Callstring((caller, ) + suffix))
+        return result
+
+    def _get_callers(self, fun):
+        """
+        Get the list of CallNode within the supergraph that call the given
+        gcc.Function
+        """
+        if fun not in self._callers_for_fun:
+            stmtg = self.sg.stmtg_for_fun[fun]
+            entrynode = self.sg.supernode_for_stmtnode[stmtg.entry]
+            self._callers_for_fun[fun] = [edge.srcnode
+                                          for edge in entrynode.preds
+                                          if isinstance(edge, CallToStart)]
+        return self._callers_for_fun[fun]
+
+class LazyIvpNode(IvpNode):
+    """
+    A node within a LazyIvpGraph.  These are created afresh whenever an
+    edge leading to them is built, and so compare by their callstring and
+    supernode, rather than by identity.
+    """
+    __slots__ = ('graph', )
+
+    def __init__(self, graph, callstring, innernode):
+        # (not calling Node.__init__, as "preds" and "succs" aren't sets)
+        self.graph = graph
+        self.callstring = callstring
+        self.innernode = innernode
+
+    @property
+    def succs(self):
+        return self.graph.get_succs(self)
+
+    @property
+    def preds(self):
+        raise NotImplementedError('the nodes of a LazyIvpGraph'
+                                  ' do not track their predecessors')
+
+    def __eq__(self, other):
+        if isinstance(other, LazyIvpNode):
+            return (self.callstring == other.callstring
+                    and self.innernode == other.innernode)
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.callstring) ^ hash(self.innernode)
+
+    def __repr__(self):
+        return 'LazyIvpNode(%r, %r)' % (self.callstring, self.innernode)
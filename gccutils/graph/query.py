@@ -17,6 +17,15 @@
 
 # Queries on graphs, with composable filters
 #   Query(graph).filters
+#
+# Some of the filters can be answered from indexes of the graph's nodes
+# (built on first use, and shared between queries on the same graph, for as
+# long as the graph is alive and has the same nodes); when
+# a query is run, it starts from whichever of these gives the fewest
+# candidate nodes, applying the remaining filters to those candidates,
+# rather than scanning every node in the graph.
+
+import weakref
 
 import gcc
 
@@ -24,6 +33,77 @@ from gccutils.graph.supergraph import ReturnNode
 
 __all__ = ['Query']
 
+def _get_called_funcname(node):
+    """
+    Get the name of the function called by the node's statement, or None
+    """
+    # For an interprocedural call, we want the CallNode, not the
+    # ReturnNode.
+    # For a call to an external function, the GimpleCall will be
+    # within a regular SupergraphNode:
+    if not isinstance(node, ReturnNode):
+        stmt = node.stmt
+        if isinstance(stmt, gcc.GimpleCall):
+            if isinstance(stmt.fn, gcc.AddrExpr):
+                if isinstance(stmt.fn.operand, gcc.FunctionDecl):
+                    return stmt.fn.operand.name
+    return None
+
+def _get_funcname(node):
+    """
+    Get the name of the function containing the node, or None
+    """
+    if node.function:
+        return node.function.decl.name
+    return None
+
+def _get_lhs_varname(node):
+    """
+    Get the name of the variable assigned to by the node's statement, or None
+    """
+    lhs = getattr(node.stmt, 'lhs', None)
+    var = getattr(lhs, 'var', None)
+    return getattr(var, 'name', None)
+
+class GraphIndex:
+    """
+    Indexes of the nodes of a graph, each built on first use
+    """
+    def __init__(self, graph):
+        # (a weak reference, so that the index doesn't keep the graph alive)
+        self._graph = weakref.ref(graph)
+        self.generation = graph.generation
+        # dict mapping from key function to dict mapping from key to list
+        # of nodes:
+        self._indexes = {}
+
+    def is_stale(self, graph):
+        return (graph is not self._graph()
+                or graph.generation != self.generation)
+
+    def lookup(self, getkey, key):
+        """
+        Get the list of nodes for which getkey(node) == key
+        """
+        if getkey not in self._indexes:
+            index = {}
+            for node in self._graph().nodes:
+                nodekey = getkey(node)
+                if nodekey is not None:
+                    index.setdefault(nodekey, []).append(node)
+            self._indexes[getkey] = index
+        return self._indexes[getkey].get(key, [])
+
+# Mapping from graph to its GraphIndex, discarded along with the graph:
+_index_for_graph = weakref.WeakKeyDictionary()
+
+def get_index(graph):
+    index = _index_for_graph.get(graph)
+    if index is None or index.is_stale(graph):
+        index = GraphIndex(graph)
+        _index_for_graph[graph] = index
+    return index
+
 class BaseQuery:
     def first(self):
         results = list(self)
@@ -44,88 +124,104 @@ class BaseQuery:
     #######################################################################
 
     def get_calls_of(self, funcname):
-        class GetCallsOf(CompoundQuery):
-            def __init__(self, innerquery, funcname):
-                CompoundQuery.__init__(self, innerquery)
-                self.funcname = funcname
-            def __iter__(self):
-                for node in self.innerquery:
-                    # For an interprocedural call, we want the CallNode, not the
-                    # ReturnNode.
-                    # For a call to an external function, the GimpleCall will be
-                    # within a regular SupergraphNode:
-                    if not isinstance(node, ReturnNode):
-                        stmt = node.stmt
-                        if isinstance(stmt, gcc.GimpleCall):
-                            if isinstance(stmt.fn, gcc.AddrExpr):
-                                if isinstance(stmt.fn.operand, gcc.FunctionDecl):
-                                    if stmt.fn.operand.name == funcname:
-                                        yield node
-            def __repr__(self):
-                return ('GetCallsOf(%r, funcname=%r)'
-                        % (self.innerquery, self.funcname))
-            def __str__(self):
-                return '%s that are calls of %s()' % (self.innerquery, self.funcname)
-
         return GetCallsOf(self, funcname)
 
     def assigning_to(self, varname):
-        class AssigningTo(CompoundQuery):
-            def __init__(self, innerquery, varname):
-                CompoundQuery.__init__(self, innerquery)
-                self.varname = varname
-            def __iter__(self):
-                for node in self.innerquery:
-                    stmt = node.stmt
-                    if stmt.lhs.var.name == self.varname:
-                        yield node
-            def __repr__(self):
-                return ('AssigningTo(%r, varname=%r)'
-                        % (self.innerquery, self.varname))
-            def __str__(self):
-                return '%s in which the LHS is assigned to a variable named %s' % (self.innerquery, self.varname)
         return AssigningTo(self, varname)
 
     def assigning_constant(self, constant):
-        class AssigningConstant(CompoundQuery):
-            def __init__(self, innerquery, constant):
-                CompoundQuery.__init__(self, innerquery)
-                self.constant = constant
-            def __iter__(self):
-                for node in self.innerquery:
-                    stmt = node.stmt
-                    if isinstance(stmt, gcc.GimpleAssign):
-                        if stmt.exprcode == gcc.IntegerCst:
-                            if stmt.rhs[0] == self.constant:
-                                yield node
-            def __repr__(self):
-                return ('AssigningConstant(%r, constant=%r)'
-                        % (self.innerquery, self.constant))
-            def __str__(self):
-                return '%s in which an assignment of the value %s is made' % (self.innerquery, self.constant)
         return AssigningConstant(self, constant)
 
     def within(self, funcname):
-        class Within(CompoundQuery):
-            def __init__(self, innerquery, funcname):
-                CompoundQuery.__init__(self, innerquery)
-                self.funcname = funcname
-            def __iter__(self):
-                for node in self.innerquery:
-                    if node.function:
-                        if node.function.decl.name == self.funcname:
-                            yield node
-            def __repr__(self):
-                return ('Within(%r, funcname=%r)'
-                        % (self.innerquery, self.funcname))
-            def __str__(self):
-                return '%s within %s' % (self.innerquery, self.funcname)
         return Within(self, funcname)
 
 class CompoundQuery(BaseQuery):
+    """
+    A filter on the nodes of an inner query
+    """
     def __init__(self, innerquery):
         self.innerquery = innerquery
 
+    def __iter__(self):
+        # Gather the chain of filters, down to the Query itself:
+        filters = []
+        query = self
+        while isinstance(query, CompoundQuery):
+            filters.append(query)
+            query = query.innerquery
+        # (innermost first, as written):
+        filters.reverse()
+        return query.iter_filtered(filters)
+
+    def matches(self, node):
+        raise NotImplementedError
+
+    def get_candidates(self, index):
+        """
+        Get the list of all nodes satisfying this filter from the given
+        GraphIndex, or None if this filter can't use an index
+        """
+        return None
+
+class GetCallsOf(CompoundQuery):
+    def __init__(self, innerquery, funcname):
+        CompoundQuery.__init__(self, innerquery)
+        self.funcname = funcname
+    def matches(self, node):
+        return _get_called_funcname(node) == self.funcname
+    def get_candidates(self, index):
+        return index.lookup(_get_called_funcname, self.funcname)
+    def __repr__(self):
+        return ('GetCallsOf(%r, funcname=%r)'
+                % (self.innerquery, self.funcname))
+    def __str__(self):
+        return '%s that are calls of %s()' % (self.innerquery, self.funcname)
+
+class AssigningTo(CompoundQuery):
+    def __init__(self, innerquery, varname):
+        CompoundQuery.__init__(self, innerquery)
+        self.varname = varname
+    def matches(self, node):
+        return _get_lhs_varname(node) == self.varname
+    def get_candidates(self, index):
+        return index.lookup(_get_lhs_varname, self.varname)
+    def __repr__(self):
+        return ('AssigningTo(%r, varname=%r)'
+                % (self.innerquery, self.varname))
+    def __str__(self):
+        return '%s in which the LHS is assigned to a variable named %s' % (self.innerquery, self.varname)
+
+class AssigningConstant(CompoundQuery):
+    def __init__(self, innerquery, constant):
+        CompoundQuery.__init__(self, innerquery)
+        self.constant = constant
+    def matches(self, node):
+        stmt = node.stmt
+        if isinstance(stmt, gcc.GimpleAssign):
+            if stmt.exprcode == gcc.IntegerCst:
+                if stmt.rhs[0] == self.constant:
+                    return True
+        return False
+    def __repr__(self):
+        return ('AssigningConstant(%r, constant=%r)'
+                % (self.innerquery, self.constant))
+    def __str__(self):
+        return '%s in which an assignment of the value %s is made' % (self.innerquery, self.constant)
+
+class Within(CompoundQuery):
+    def __init__(self, innerquery, funcname):
+        CompoundQuery.__init__(self, innerquery)
+        self.funcname = funcname
+    def matches(self, node):
+        return _get_funcname(node) == self.funcname
+    def get_candidates(self, index):
+        return index.lookup(_get_funcname, self.funcname)
+    def __repr__(self):
+        return ('Within(%r, funcname=%r)'
+                % (self.innerquery, self.funcname))
+    def __str__(self):
+        return '%s within %s' % (self.innerquery, self.funcname)
+
 class Query(BaseQuery):
     def __init__(self, graph):
         self.graph = graph
@@ -134,9 +230,39 @@ class Query(BaseQuery):
         for node in self.graph.nodes:
             yield node
 
+    def iter_filtered(self, filters):
+        """
+        Iterate over the nodes satisfying all of the given filters, starting
+        from the most selective index (if any)
+        """
+        best, nodes = self.get_starting_point(filters)
+        filters = [f for f in filters if f is not best]
+        for node in nodes:
+            for f in filters:
+                if not f.matches(node):
+                    break
+            else:
+                yield node
+
+    def get_starting_point(self, filters):
+        """
+        Get a (filter, nodes) pair: the filter whose index gives the fewest
+        candidate nodes, and those candidates, or (None, all nodes) if none
+        of the filters can use an index
+        """
+        index = get_index(self.graph)
+        nodes = self.graph.nodes
+        best = None
+        for f in filters:
+            candidates = f.get_candidates(index)
+            if candidates is not None:
+                if best is None or len(candidates) < len(nodes):
+                    nodes = candidates
+                    best = f
+        return best, nodes
+
     def __repr__(self):
         return 'Query()'
 
     def __str__(self):
         return 'nodes'
-
@@ -58,10 +58,14 @@ class StmtGraph(Graph):
         self.exit_of_bb = {}
         self.node_for_stmt = {}
 
-        basic_blocks = fun.cfg.basic_blocks
+        # A list of (bb, phi_nodes, gimple, succs) tuples, where succs is
+        # a list of (edge, index of dest within the list) pairs:
+        blockdata = get_stmtgraph_data(fun)
+        cfg_entry = fun.cfg.entry
+        cfg_exit = fun.cfg.exit
 
         # 1st pass: create nodes and edges within BBs:
-        for bb in basic_blocks:
+        for bb, phi_nodes, stmts, succs in blockdata:
             self.__lastnode = None
 
             def add_stmt(stmt):
@@ -73,23 +77,23 @@ class StmtGraph(Graph):
                     self.entry_of_bb[bb] = nextnode
                 self.__lastnode = nextnode
 
-            if bb.phi_nodes and not split_phi_nodes:
+            if phi_nodes and not split_phi_nodes:
                 # If we're not splitting the phi nodes, add them to the top
                 # of each BB:
-                for stmt in bb.phi_nodes:
+                for stmt in phi_nodes:
                     add_stmt(stmt)
                 self.exit_of_bb[bb] = self.__lastnode
-            if bb.gimple:
-                for stmt in bb.gimple:
+            if stmts:
+                for stmt in stmts:
                     add_stmt(stmt)
                 self.exit_of_bb[bb] = self.__lastnode
 
             if self.__lastnode is None:
                 # We have a BB with neither statements nor phis
                 # Create a single node for this BB:
-                if bb == fun.cfg.entry:
+                if bb == cfg_entry:
                     cls = EntryNode
-                elif bb == fun.cfg.exit:
+                elif bb == cfg_exit:
                     cls = ExitNode
                 else:
                     # gcc appears to create empty BBs for functions
@@ -99,17 +103,17 @@ class StmtGraph(Graph):
                 node = self.add_node(cls(fun, bb, None))
                 self.entry_of_bb[bb] = node
                 self.exit_of_bb[bb] = node
-                if bb == fun.cfg.entry:
+                if bb == cfg_entry:
                     self.entry = node
-                elif bb == fun.cfg.exit:
+                elif bb == cfg_exit:
                     self.exit = node
 
             assert self.entry_of_bb[bb] is not None
             assert self.exit_of_bb[bb] is not None
 
         # 2nd pass: wire up the cross-BB edges:
-        for bb in basic_blocks:
-            for edge in bb.succs:
+        for bb, phi_nodes, stmts, succs in blockdata:
+            for edge, destidx in succs:
 
                 # If requested, omit "complex" edges e.g. due to
                 # exception-handling:
@@ -121,8 +125,12 @@ class StmtGraph(Graph):
                 if split_phi_nodes:
                     # add SplitPhiNode instances at the end of each edge
                     # as a copy of each phi node, specialized for this edge
-                    if edge.dest.phi_nodes:
-                        for stmt in edge.dest.phi_nodes:
+                    if destidx >= 0:
+                        dest_phi_nodes = blockdata[destidx][1]
+                    else:
+                        dest_phi_nodes = edge.dest.phi_nodes
+                    if dest_phi_nodes:
+                        for stmt in dest_phi_nodes:
                             split_phi = self.add_node(SplitPhiNode(fun, stmt, edge))
                             self.add_edge(last_node,
                                           split_phi,
@@ -132,11 +140,11 @@ class StmtGraph(Graph):
                 # After optimization, the CFG sometimes contains edges that
                 # point to blocks that are no longer within fun.cfg.basic_blocks
                 # Skip them:
-                if edge.dest not in basic_blocks:
+                if destidx < 0:
                     continue
 
                 self.add_edge(last_node,
-                              self.entry_of_bb[edge.dest],
+                              self.entry_of_bb[blockdata[destidx][0]],
                               edge)
 
         # 3rd pass: set up caselabelexprs for edges within switch statements
@@ -167,6 +175,37 @@ class StmtGraph(Graph):
         bb = self.fun.cfg.get_block_for_label(labeldecl)
         return self.entry_of_bb[bb]
 
+def get_stmtgraph_data(fun):
+    """
+    Get a list of (bb, phi_nodes, gimple, succs) tuples for the basic blocks
+    of the given gcc.Function, in the order of fun.cfg.basic_blocks, where
+    succs is a list of (edge, destidx) pairs, destidx being the index of
+    the edge's destination within the list (or -1 if it isn't within
+    fun.cfg.basic_blocks).
+
+    This uses gcc.Function.get_stmtgraph_data() where available, which
+    gathers all of this in a single call (from the snapshot of the CFG
+    given by gcc.Cfg.export()), rather than going through the attributes of
+    every block and edge as _get_stmtgraph_data_per_block does.
+    """
+    if hasattr(fun, 'get_stmtgraph_data'):
+        return fun.get_stmtgraph_data()
+    return _get_stmtgraph_data_per_block(fun)
+
+def _get_stmtgraph_data_per_block(fun):
+    """
+    The equivalent of get_stmtgraph_data, via the attributes of each
+    gcc.BasicBlock and gcc.Edge
+    """
+    basic_blocks = fun.cfg.basic_blocks
+    idx_for_bb = dict((bb, idx) for idx, bb in enumerate(basic_blocks))
+    result = []
+    for bb in basic_blocks:
+        succs = [(edge, idx_for_bb.get(edge.dest, -1))
+                 for edge in bb.succs]
+        result.append((bb, bb.phi_nodes, bb.gimple, succs))
+    return result
+
 class StmtNode(Node):
     __slots__ = ('fun', 'bb', 'stmt')
 
@@ -27,90 +27,101 @@ class Supergraph(Graph):
                  'stmtg_for_fun',
                  'fake_entry_node')
 
-    def __init__(self, split_phi_nodes, add_fake_entry_node):
+    def __init__(self, split_phi_nodes, add_fake_entry_node,
+                 stmtgraphs=None):
+        """
+        stmtgraphs: if not None, a dict mapping from gcc.Function to the
+        StmtGraph to use for that function (e.g. from a SupergraphCache),
+        rather than building a new one
+        """
         Graph.__init__(self)
         self.supernode_for_stmtnode = {}
+
+        from gcc import get_callgraph_nodes
+        cgnodes = [node for node in get_callgraph_nodes()
+                   if node.decl.function]
+
         # 1st pass: locate interprocedural instances of gcc.GimpleCall
         # i.e. where both caller and callee are within the supergraph
         # (perhaps the same function)
         ipcalls = set()
-        from gcc import get_callgraph_nodes
-        for node in get_callgraph_nodes():
-            fun = node.decl.function
-            if fun:
-                for edge in node.callees:
-                    if edge.callee.decl.function:
-                        ipcalls.add(edge.call_stmt)
+        for node in cgnodes:
+            for edge in node.callees:
+                if edge.callee.decl.function:
+                    ipcalls.add(edge.call_stmt)
 
         # 2nd pass: construct a StmtGraph for each function in the callgraph
         # and add nodes and edges to "self" wrapping the nodes and edges
         # within each StmtGraph:
         self.stmtg_for_fun = {}
-        for node in get_callgraph_nodes():
+        for node in cgnodes:
             fun = node.decl.function
-            if fun:
+            if stmtgraphs is not None:
+                stmtg = stmtgraphs[fun]
+            else:
                 stmtg = StmtGraph(fun, split_phi_nodes)
-                self.stmtg_for_fun[fun] = stmtg
-                # Clone the stmtg nodes and edges into the Supergraph:
-                stmtg.supernode_for_stmtnode = {}
-                for node in stmtg.nodes:
-                    if node.stmt in ipcalls:
-                        # These nodes will have two supernodes, a CallNode
-                        # and a ReturnNode:
-                        callnode = self.add_node(CallNode(node, stmtg))
-                        returnnode = self.add_node(ReturnNode(node, stmtg))
-                        callnode.returnnode = returnnode
-                        returnnode.callnode = callnode
-                        stmtg.supernode_for_stmtnode[node] = (callnode, returnnode)
-                        self.add_edge(
-                            callnode, returnnode,
-                            CallToReturnSiteEdge, None)
-                    else:
-                        stmtg.supernode_for_stmtnode[node] = \
-                            self.add_node(SupergraphNode(node, stmtg))
-                for edge in stmtg.edges:
-                    if edge.srcnode.stmt in ipcalls:
-                        # Begin the superedge from the ReturnNode:
-                        srcsupernode = stmtg.supernode_for_stmtnode[edge.srcnode][1]
-                    else:
-                        srcsupernode = stmtg.supernode_for_stmtnode[edge.srcnode]
-                    if edge.dstnode.stmt in ipcalls:
-                        # End the superedge at the CallNode:
-                        dstsupernode = stmtg.supernode_for_stmtnode[edge.dstnode][0]
-                    else:
-                        dstsupernode = stmtg.supernode_for_stmtnode[edge.dstnode]
-                    superedge = self.add_edge(srcsupernode, dstsupernode,
-                                              SupergraphEdge, edge)
+            self.stmtg_for_fun[fun] = stmtg
+            # Clone the stmtg nodes and edges into the Supergraph
+            # (if the StmtGraph is shared via a cache, this mapping is for
+            # the most recently-built Supergraph):
+            stmtg.supernode_for_stmtnode = {}
+            for node in stmtg.nodes:
+                if node.stmt in ipcalls:
+                    # These nodes will have two supernodes, a CallNode
+                    # and a ReturnNode:
+                    callnode = self.add_node(CallNode(node, stmtg))
+                    returnnode = self.add_node(ReturnNode(node, stmtg))
+                    callnode.returnnode = returnnode
+                    returnnode.callnode = callnode
+                    stmtg.supernode_for_stmtnode[node] = (callnode, returnnode)
+                    self.add_edge(
+                        callnode, returnnode,
+                        CallToReturnSiteEdge, None)
+                else:
+                    stmtg.supernode_for_stmtnode[node] = \
+                        self.add_node(SupergraphNode(node, stmtg))
+            for edge in stmtg.edges:
+                if edge.srcnode.stmt in ipcalls:
+                    # Begin the superedge from the ReturnNode:
+                    srcsupernode = stmtg.supernode_for_stmtnode[edge.srcnode][1]
+                else:
+                    srcsupernode = stmtg.supernode_for_stmtnode[edge.srcnode]
+                if edge.dstnode.stmt in ipcalls:
+                    # End the superedge at the CallNode:
+                    dstsupernode = stmtg.supernode_for_stmtnode[edge.dstnode][0]
+                else:
+                    dstsupernode = stmtg.supernode_for_stmtnode[edge.dstnode]
+                superedge = self.add_edge(srcsupernode, dstsupernode,
+                                          SupergraphEdge, edge)
 
         # 3rd pass: add the interprocedural edges (call and return):
-        for node in get_callgraph_nodes():
+        for node in cgnodes:
             fun = node.decl.function
-            if fun:
-                for edge in node.callees:
-                    if edge.callee.decl.function:
-                        calling_stmtg = self.stmtg_for_fun[fun]
-                        called_stmtg = self.stmtg_for_fun[edge.callee.decl.function]
-
-                        calling_stmtnode = calling_stmtg.node_for_stmt[edge.call_stmt]
-                        assert calling_stmtnode
-
-                        entry_stmtnode = called_stmtg.entry
-                        assert entry_stmtnode
-
-                        exit_stmtnode = called_stmtg.exit
-                        assert exit_stmtnode
-
-                        superedge_call = self.add_edge(
-                            calling_stmtg.supernode_for_stmtnode[calling_stmtnode][0],
-                            called_stmtg.supernode_for_stmtnode[entry_stmtnode],
-                            CallToStart,
-                            None)
-                        superedge_return = self.add_edge(
-                            called_stmtg.supernode_for_stmtnode[exit_stmtnode],
-                            calling_stmtg.supernode_for_stmtnode[calling_stmtnode][1],
-                            ExitToReturnSite,
-                            None)
-                        superedge_return.calling_stmtnode = calling_stmtnode
+            for edge in node.callees:
+                if edge.callee.decl.function:
+                    calling_stmtg = self.stmtg_for_fun[fun]
+                    called_stmtg = self.stmtg_for_fun[edge.callee.decl.function]
+
+                    calling_stmtnode = calling_stmtg.node_for_stmt[edge.call_stmt]
+                    assert calling_stmtnode
+
+                    entry_stmtnode = called_stmtg.entry
+                    assert entry_stmtnode
+
+                    exit_stmtnode = called_stmtg.exit
+                    assert exit_stmtnode
+
+                    superedge_call = self.add_edge(
+                        calling_stmtg.supernode_for_stmtnode[calling_stmtnode][0],
+                        called_stmtg.supernode_for_stmtnode[entry_stmtnode],
+                        CallToStart,
+                        None)
+                    superedge_return = self.add_edge(
+                        called_stmtg.supernode_for_stmtnode[exit_stmtnode],
+                        calling_stmtg.supernode_for_stmtnode[calling_stmtnode][1],
+                        ExitToReturnSite,
+                        None)
+                    superedge_return.calling_stmtnode = calling_stmtnode
 
         # 4th pass: create fake entry node:
         if not add_fake_entry_node:
@@ -156,6 +167,149 @@ class Supergraph(Graph):
         for fun in self.stmtg_for_fun:
             yield fun
 
+    def compact(self):
+        # The per-function StmtGraph instances are kept alive (and can be
+        # walked directly), so compact them too:
+        for stmtg in self.stmtg_for_fun.values():
+            stmtg.compact()
+        return Graph.compact(self)
+
+############################################################################
+# Reuse of Supergraphs (and the StmtGraphs within them) between passes,
+# rebuilding only what's needed for those functions that have changed
+############################################################################
+def get_cfg_signature(fun):
+    """
+    Get a value that changes whenever the structure of the given function's
+    CFG changes: its blocks, the statements within them, and the edges
+    between them.
+
+    This is made up of the gcc wrapper objects themselves (which compare by
+    the address of the underlying object, and which keep that object
+    alive), so that a statement that's been replaced by another one at the
+    same address can't be mistaken for the original.
+
+    Where available, this is the snapshot from gcc.Cfg.export(), which is
+    already immutable, and is rebuilt on each call into Python from GCC (and
+    so reflects any changes that GCC made to the CFG in between).  Within
+    one call into Python, the same snapshot object is returned each time,
+    so that a signature can be compared with an earlier one by identity,
+    without walking it.  The snapshot is shared with the StmtGraph built
+    from it (see get_stmtgraph_data), so getting the signature doesn't
+    walk the CFG a second time when the function has to be rebuilt.
+    """
+    if hasattr(fun.cfg, 'export'):
+        return fun.cfg.export()
+    from gccutils.graph.stmtgraph import get_stmtgraph_data
+    return tuple((bb, tuple(phi_nodes), tuple(stmts), tuple(succs))
+                 for bb, phi_nodes, stmts, succs in get_stmtgraph_data(fun))
+
+def get_callgraph_signature(cgnodes):
+    """
+    Get a value that changes whenever anything other than the CFGs that
+    a Supergraph depends upon changes: the set of functions, the calls
+    between them, and which are entrypoints
+    """
+    result = []
+    for node in cgnodes:
+        fun = node.decl.function
+        result.append((fun,
+                       node.decl.is_public,
+                       tuple((edge.call_stmt, edge.callee.decl.function)
+                             for edge in node.callees
+                             if edge.callee.decl.function)))
+    return tuple(result)
+
+class SupergraphCache(object):
+    """
+    Cache of the StmtGraph for each function, and of the most recent
+    Supergraph built from them
+    """
+    __slots__ = ('stmtgraphs', 'supergraphs', 'hits', 'misses')
+
+    def __init__(self):
+        # dict mapping from (gcc.Function, split_phi_nodes) to
+        # (signature, StmtGraph):
+        self.stmtgraphs = {}
+
+        # dict mapping from (split_phi_nodes, add_fake_entry_node) to
+        # (callgraph signature, tuple of StmtGraph, Supergraph):
+        self.supergraphs = {}
+
+        # Number of StmtGraphs reused/built:
+        self.hits = 0
+        self.misses = 0
+
+    def get_stmtgraph(self, fun, split_phi_nodes):
+        """
+        Get the StmtGraph for the given function, reusing the one from
+        the last call if its CFG hasn't changed since
+        """
+        key = (fun, split_phi_nodes)
+        sig = get_cfg_signature(fun)
+        if key in self.stmtgraphs:
+            oldsig, stmtg = self.stmtgraphs[key]
+            # (the same snapshot if nothing has returned to GCC since the
+            # last lookup, in which case there's no need to compare them):
+            if oldsig is sig:
+                self.hits += 1
+                return stmtg
+            if oldsig == sig:
+                self.hits += 1
+                # Hold on to the new snapshot, so that later lookups within
+                # this pass can compare by identity:
+                self.stmtgraphs[key] = (sig, stmtg)
+                return stmtg
+        self.misses += 1
+        stmtg = StmtGraph(fun, split_phi_nodes)
+        self.stmtgraphs[key] = (sig, stmtg)
+        return stmtg
+
+    def get_supergraph(self, split_phi_nodes, add_fake_entry_node):
+        """
+        Get a Supergraph for the current callgraph, reusing the one from the
+        last call if nothing has changed since, and otherwise building a
+        new one, reusing the StmtGraph of each function that hasn't changed
+        """
+        from gcc import get_callgraph_nodes
+        cgnodes = [node for node in get_callgraph_nodes()
+                   if node.decl.function]
+
+        # Forget about functions that have gone away, so that we don't keep
+        # their GIMPLE alive:
+        funs = set(node.decl.function for node in cgnodes)
+        for key in list(self.stmtgraphs.keys()):
+            if key[0] not in funs:
+                del self.stmtgraphs[key]
+
+        key = (split_phi_nodes, add_fake_entry_node)
+        cgsig = get_callgraph_signature(cgnodes)
+        stmtgs = tuple(self.get_stmtgraph(node.decl.function, split_phi_nodes)
+                       for node in cgnodes)
+        if key in self.supergraphs:
+            oldcgsig, oldstmtgs, sg = self.supergraphs[key]
+            if oldcgsig == cgsig \
+                    and len(oldstmtgs) == len(stmtgs) \
+                    and all(old is new for old, new in zip(oldstmtgs, stmtgs)):
+                return sg
+
+        sg = Supergraph(split_phi_nodes, add_fake_entry_node,
+                        stmtgraphs=dict((node.decl.function, stmtg)
+                                        for node, stmtg in zip(cgnodes,
+                                                               stmtgs)))
+        self.supergraphs[key] = (cgsig, stmtgs, sg)
+        return sg
+
+_cache = SupergraphCache()
+
+def get_supergraph(split_phi_nodes, add_fake_entry_node):
+    """
+    Get a Supergraph for the current callgraph, as per the Supergraph
+    constructor, but reusing as much as possible from previous calls
+    (e.g. within an earlier pass)
+    """
+    return _cache.get_supergraph(split_phi_nodes, add_fake_entry_node)
+
 class SupergraphNode(Node):
     """
     A node in the supergraph, wrapping a StmtNode
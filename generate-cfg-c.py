@@ -176,6 +176,10 @@ def generate_cfg():
                        'PyGccCfg_get_block_for_label',
                        'METH_VARARGS',
                        "Given a gcc.LabelDecl, get the corresponding gcc.BasicBlock")
+    methods.add_method('export',
+                       '(PyCFunction)PyGccCfg_export',
+                       'METH_NOARGS',
+                       "Get an immutable snapshot of the blocks, statements and edges of this CFG")
     cu.add_defn(methods.c_defn())
     pytype.tp_methods = methods.identifier
 
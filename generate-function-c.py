@@ -83,6 +83,18 @@ def generate_function():
                           tp_richcompare = 'PyGccFunction_richcompare',
                           tp_getset = getsettable.identifier,
                                     )
+    methods = PyMethodTable('PyGccFunction_methods', [])
+    methods.add_method('get_stmtgraph_data',
+                       'PyGccFunction_get_stmtgraph_data',
+                       'METH_NOARGS',
+                       "Get the basic blocks, statements and edges of this function's CFG in one call")
+    methods.add_method('find_trees',
+                       'PyGccFunction_find_trees',
+                       'METH_VARARGS',
+                       "Get a list of (gcc.Gimple, gcc.Tree) pairs for the tree nodes of the given type(s) within this function's statements")
+    cu.add_defn(methods.c_defn())
+    pytype.tp_methods = methods.identifier
+
     cu.add_defn(pytype.c_defn())
     modinit_preinit += pytype.c_invoke_type_ready()
     modinit_postinit += pytype.c_invoke_add_to_module()
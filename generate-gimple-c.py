@@ -238,6 +238,10 @@ PyGccGimple_get_block(struct PyGccGimple *self, void *closure)
                        '(PyCFunction)PyGccGimple_walk_tree',
                        'METH_VARARGS | METH_KEYWORDS',
                        "Visit all gcc.Tree nodes associated with this statement")
+    methods.add_method('find_trees',
+                       '(PyCFunction)PyGccGimple_find_trees',
+                       'METH_VARARGS',
+                       "Get the list of gcc.Tree nodes of the given type(s) associated with this statement")
     cu.add_defn(methods.c_defn())
     pytype.tp_methods = methods.identifier
 
@@ -15,6 +15,8 @@
 #   along with this program.  If not, see
 #   <http://www.gnu.org/licenses/>.
 
+import time
+
 import gcc
 from libcpychecker.formatstrings import check_pyargs
 from libcpychecker.utils import log
@@ -22,6 +24,10 @@ from libcpychecker.refcounts import check_refcounts, get_traces
 from libcpychecker.attributes import register_our_attributes
 from libcpychecker.initializers import check_initializers
 from libcpychecker.types import get_PyObject
+from libcpychecker import profiling
+from libcpychecker import tureport
+from libcpychecker import sarif
+from libcpychecker import warningdb
 if hasattr(gcc, 'PLUGIN_FINISH_DECL'):
     from libcpychecker.compat import on_finish_decl
 
@@ -38,7 +44,22 @@ class CpyCheckerGimplePass(gcc.GimplePass):
                  show_possible_null_derefs=False,
                  only_on_python_code=True,
                  maxtrans=256,
-                 dump_json=False):
+                 dump_json=False,
+                 merge_states=False,
+                 widen_loops=False,
+                 cache_dir=None,
+                 jobs=1,
+                 use_summaries=False,
+                 max_seconds=None,
+                 max_tu_seconds=None,
+                 max_mb=None,
+                 profile=False,
+                 tu_report=False,
+                 sarif=False,
+                 sarif_file=None,
+                 warning_db=None,
+                 warning_db_build=None,
+                 warning_db_package=None):
         gcc.GimplePass.__init__(self, 'cpychecker-gimple')
         self.dump_traces = dump_traces
         self.show_traces = show_traces
@@ -48,6 +69,56 @@ class CpyCheckerGimplePass(gcc.GimplePass):
         self.only_on_python_code = only_on_python_code
         self.maxtrans = maxtrans
         self.dump_json = dump_json
+        self.merge_states = merge_states
+        self.widen_loops = widen_loops
+        self.cache_dir = cache_dir
+        self.use_summaries = use_summaries
+
+        # Budgets for the time and memory used by the refcount checker:
+        self.max_seconds = max_seconds
+        self.tu_deadline = None
+        if max_tu_seconds is not None:
+            self.tu_deadline = time.time() + max_tu_seconds
+        self.max_mb = max_mb
+
+        # Should we write out a profile of the refcount checker's work on
+        # each function? (see libcpychecker.profiling)
+        self.profile = profile
+
+        # Should we gather the error reports for the whole translation unit
+        # into one HTML and one JSON file? (see libcpychecker.tureport)
+        self.tu_report = tu_report
+
+        # Should we write out the error reports in SARIF form? (see
+        # libcpychecker.sarif)  If sarif_file is set, they're appended to
+        # that file, rather than to one per translation unit:
+        self.sarif = sarif or bool(sarif_file)
+        self.sarif_file = sarif_file
+
+        # Should we record the warnings into a database, for comparison
+        # between builds? (see libcpychecker.warningdb)
+        self.warning_db = warning_db
+        self.warning_db_build = warning_db_build
+        self.warning_db_package = warning_db_package
+
+        # When using summaries, the refcount checker is run on the functions
+        # bottom-up, once they've all been seen (see check_deferred()):
+        self.deferred = []
+
+        # When analyzing more than one function at once, the refcount checker
+        # runs in worker processes, with the results being emitted at the
+        # end of the translation unit (see finish()):
+        self.pool = None
+        if jobs > 1 and not (dump_traces or show_traces or use_summaries):
+            from libcpychecker.workers import WorkerPool
+            cache = None
+            if cache_dir:
+                from libcpychecker.cache import ResultCache
+                cache = ResultCache(cache_dir)
+            self.pool = WorkerPool(jobs, cache,
+                                   maxseconds=max_seconds,
+                                   deadline=self.tu_deadline,
+                                   maxmb=max_mb)
 
     def execute(self, fun):
         if fun:
@@ -63,26 +134,82 @@ class CpyCheckerGimplePass(gcc.GimplePass):
 
             # The refcount code is too buggy for now to be on by default:
             if self.verify_refcounting:
-                if 0:
-                    # Profiled version:
-                    import cProfile
-                    prof_filename = '%s.%s.refcount-profile' % (gcc.get_dump_base_name(),
-                                                                fun.decl.name)
-                    cProfile.runctx('self._check_refcounts(fun)',
-                                    globals(), locals(),
-                                    filename=prof_filename)
-                    import pstats
-                    prof = pstats.Stats(prof_filename)
-                    prof.sort_stats('cumulative').print_stats(20)
-                else:
-                    # Normal mode (without profiler):
-                    self._check_refcounts(fun)
+                if self.profile and not profiling.enabled:
+                    # (done here rather than in __init__, as the dump base
+                    # name isn't necessarily known until now)
+                    profiling.enable()
+                if self.tu_report and not tureport.enabled:
+                    tureport.enable()
+                if self.sarif and not sarif.enabled:
+                    sarif.enable(self.sarif_file)
+                if self.warning_db and not warningdb.enabled:
+                    warningdb.enable(self.warning_db,
+                                     self.warning_db_build,
+                                     self.warning_db_package)
+                self._check_refcounts(fun)
 
     def _check_refcounts(self, fun):
+        if self.use_summaries:
+            self.deferred.append(fun)
+            return
+        if self.pool:
+            self.pool.submit(fun,
+                             dict(show_possible_null_derefs=self.show_possible_null_derefs,
+                                  maxtrans=self.maxtrans,
+                                  dump_json=self.dump_json,
+                                  merge_states=self.merge_states,
+                                  widen_loops=self.widen_loops))
+            return
         check_refcounts(fun, self.dump_traces, self.show_traces,
                         self.show_possible_null_derefs,
                         maxtrans=self.maxtrans,
-                        dump_json=self.dump_json)
+                        dump_json=self.dump_json,
+                        merge_states=self.merge_states,
+                        widen_loops=self.widen_loops,
+                        cache_dir=self.cache_dir,
+                        maxseconds=self.max_seconds,
+                        deadline=self.tu_deadline,
+                        maxmb=self.max_mb)
+
+    def check_deferred(self):
+        """
+        Run the refcount checker on the functions deferred when using
+        summaries, with callees before their callers, so that each function
+        can use the summaries of the functions it calls.
+
+        The diagnostics are emitted in source order.
+        """
+        from libcpychecker.diagnostics import DiagnosticCapture
+        from libcpychecker.summaries import get_bottom_up_order
+        results = []
+        for fun in get_bottom_up_order(self.deferred):
+            with DiagnosticCapture() as capture:
+                check_refcounts(fun, self.dump_traces, self.show_traces,
+                                self.show_possible_null_derefs,
+                                maxtrans=self.maxtrans,
+                                dump_json=self.dump_json,
+                                merge_states=self.merge_states,
+                                widen_loops=self.widen_loops,
+                                cache_dir=self.cache_dir,
+                                use_summaries=True,
+                                maxseconds=self.max_seconds,
+                                deadline=self.tu_deadline,
+                                maxmb=self.max_mb)
+            results.append((fun.start, capture.diagnostics))
+        self.deferred = []
+        results.sort(key=lambda result: (result[0].file,
+                                         result[0].line,
+                                         result[0].column))
+        for start, saved in results:
+            for d in saved:
+                d.flush()
+
+    def finish(self):
+        """
+        Called at the end of the translation unit
+        """
+        if self.pool:
+            self.pool.finish()
 
 
 class CpyCheckerIpaPass(gcc.SimpleIpaPass):
@@ -90,12 +217,17 @@ class CpyCheckerIpaPass(gcc.SimpleIpaPass):
     The custom pass that implements the whole-program part of
     our extra compile-time checks
     """
-    def __init__(self):
+    def __init__(self, gimple_ps=None):
         gcc.SimpleIpaPass.__init__(self, 'cpychecker-ipa')
+        self.gimple_ps = gimple_ps
 
     def execute(self):
         check_initializers()
 
+        # All of the functions have now been through the gimple pass:
+        if self.gimple_ps:
+            self.gimple_ps.check_deferred()
+
 def main(**kwargs):
     # Register our custom attributes:
     gcc.register_callback(gcc.PLUGIN_ATTRIBUTES,
@@ -115,5 +247,9 @@ def main(**kwargs):
         # SSA version:
         gimple_ps.register_after('ssa')
 
-    ipa_ps = CpyCheckerIpaPass()
+    # Emit any results from worker processes:
+    gcc.register_callback(gcc.PLUGIN_FINISH_UNIT,
+                          gimple_ps.finish)
+
+    ipa_ps = CpyCheckerIpaPass(gimple_ps)
     ipa_ps.register_before('*free_lang_data')
@@ -17,15 +17,19 @@
 
 import gcc
 import gccutils
+import heapq
 import re
 import sys
+import time
 from six import StringIO, integer_types
 
 from gccutils import get_src_for_loc, get_nonnull_arguments, check_isinstance
 from gccutils.graph.stmtgraph import StmtGraph, StmtNode
 
-from collections import OrderedDict
-from libcpychecker.utils import log, logging_enabled
+from collections import OrderedDict, deque
+from libcpychecker.persistent import PersistentOrderedDict
+from libcpychecker.profiling import get_current_profile, call_handler
+from libcpychecker.utils import log, logging_enabled, get_memory_usage_mb
 from libcpychecker.types import *
 from libcpychecker.diagnostics import location_as_json, type_as_json
 
@@ -172,6 +176,42 @@ class FnMeta(object):
 # Various kinds of r-value:
 ############################################################################
 
+# Many of the values generated during the analysis are identical to ones
+# generated earlier (e.g. the NULL exception state, or the refcount of an
+# object after an INCREF).  Those classes whose instances are never modified
+# after construction (and which aren't compared by identity e.g. when
+# splitting an UnknownValue) are "interned": constructing such a value with
+# the same arguments as an existing one gives back the existing instance, so
+# that they share memory, and so that states holding equal values can be
+# compared (and merged) with simple "is" tests.
+#
+# This is a dictionary mapping from (class, key) to the instance; it only
+# lasts for the analysis of one function, since the keys can reference
+# regions:
+_interned_values = {}
+
+def get_interned_value(cls, key):
+    """
+    Get the interned instance of the given AbstractValue subclass for the
+    given key (a tuple of its constructor arguments), creating it if
+    necessary.  For use by __new__; the instance then gets (re)initialized
+    by __init__ as usual.
+    """
+    key = (cls, ) + key
+    try:
+        return _interned_values[key]
+    except KeyError:
+        v = object.__new__(cls)
+        _interned_values[key] = v
+        return v
+
+def clear_interned_values():
+    """
+    Discard all interned values; called at the start of the analysis of each
+    function
+    """
+    _interned_values.clear()
+
 class AbstractValue(object):
     """
     Base class, representing some subset of possible values out of the full
@@ -200,6 +240,18 @@ class AbstractValue(object):
         return ('%s(gcctype=%r, loc=%r)'
                 % (self.__class__.__name__, str(self.gcctype), self.loc))
 
+    def copy(self):
+        """
+        Get a new instance with the same attributes as this one, that isn't
+        interned (and so can be modified e.g. by setting "fromsplit")
+        """
+        result = object.__new__(self.__class__)
+        for cls in self.__class__.__mro__:
+            for attrname in getattr(cls, '__slots__', ()):
+                if hasattr(self, attrname):
+                    setattr(result, attrname, getattr(self, attrname))
+        return result
+
     def as_json(self, state):
         result = dict(kind=self.__class__.__name__,
                       gcctype=type_as_json(self.gcctype),
@@ -293,10 +345,38 @@ class AbstractValue(object):
         raise NotImplementedError('%s.union(%s, %s)'
                                   % (self.__class__.__name__, v_other))
 
+    def merge(self, v_other):
+        """
+        Get an AbstractValue covering both this value and v_other, for use
+        when merging States where control flow joins.
+
+        Return self if v_other adds nothing to this value, or None if the two
+        values differ in a way that the checkers care about (e.g. pointing at
+        different regions), and hence the States shouldn't be merged
+        """
+        check_isinstance(v_other, AbstractValue)
+        if v_other is self:
+            return self
+        # Overridden by subclasses that know how to combine values
+        return None
+
+    def widen(self, v_other):
+        """
+        As per merge, but for use when v_other is the value after another
+        pass around a loop: rather than covering exactly the two values, the
+        result may be larger, so that a sequence of widenings reaches a
+        fixpoint in a bounded number of steps (e.g. a range that keeps
+        growing is widened to the limits of its type)
+        """
+        # By default, only merge values that don't need widening:
+        return self.merge(v_other)
+
 class EmptySet(AbstractValue):
     """
     The empty set: there are no possible values for this variable (yet).
     """
+    __slots__ = ()
+
     def union(self, v_other):
         check_isinstance(v_other, AbstractValue)
         return v_other
@@ -305,6 +385,8 @@ class UnknownValue(AbstractValue):
     """
     A value that we know nothing about: it could be any of the possible values
     """
+    __slots__ = ()
+
     @classmethod
     def make(cls, gcctype, loc):
         """
@@ -355,6 +437,12 @@ class UnknownValue(AbstractValue):
         check_isinstance(v_other, AbstractValue)
         return self
 
+    def merge(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        if isinstance(v_other, UnknownValue):
+            if self.gcctype == v_other.gcctype:
+                return self
+
 def eval_binop(exprcode, a, b, rhsvalue):
     """
     Evaluate a gcc exprcode on a pair of Python values (as opposed to
@@ -414,9 +502,15 @@ def eval_binop(exprcode, a, b, rhsvalue):
 class ConcreteValue(AbstractValue):
     """
     A known, specific value (e.g. 0)
+
+    These are interned (the type of the value is part of the key, so that
+    e.g. 0 and 0.0 remain distinct)
     """
     __slots__ = ('value', )
 
+    def __new__(cls, gcctype, loc, value):
+        return get_interned_value(cls, (gcctype, loc, type(value), value))
+
     def __init__(self, gcctype, loc, value):
         check_isinstance(gcctype, gcc.Type)
         if loc:
@@ -665,6 +759,28 @@ class ConcreteValue(AbstractValue):
         raise NotImplementedError('%s.union(%s)'
                                   % (self.__class__.__name__, v_other))
 
+    def merge(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        if isinstance(v_other, ConcreteValue):
+            if self.value == v_other.value and self.gcctype == v_other.gcctype:
+                return self
+        # Only widen integers into ranges; a NULL vs non-NULL pointer (for
+        # example) is a distinction we need to keep:
+        if isinstance(v_other, (ConcreteValue, WithinRange)):
+            if isinstance(self.gcctype, gcc.IntegerType):
+                if self.gcctype == v_other.gcctype:
+                    return self.union(v_other)
+
+    def widen(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        if isinstance(v_other, ConcreteValue):
+            if self.value == v_other.value and self.gcctype == v_other.gcctype:
+                return self
+        if isinstance(v_other, (ConcreteValue, WithinRange)):
+            if isinstance(self.gcctype, gcc.IntegerType):
+                return WithinRange(self.gcctype, self.loc,
+                                   self.value).widen(v_other)
+
 def value_to_str(value):
     """
     Display large integers/longs in hexadecimal, since it's easier
@@ -895,10 +1011,50 @@ class WithinRange(AbstractValue):
         raise NotImplementedError('%s.union(%s)'
                                   % (self.__class__.__name__, v_other))
 
+    def merge(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        if isinstance(v_other, ConcreteValue):
+            if self.gcctype == v_other.gcctype:
+                if self.contains(v_other.value):
+                    return self
+                return self.union(v_other)
+        if isinstance(v_other, WithinRange):
+            if self.gcctype == v_other.gcctype:
+                if (self.contains(v_other.minvalue)
+                    and self.contains(v_other.maxvalue)):
+                    return self
+                return self.union(v_other)
+
+    def widen(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        if isinstance(v_other, ConcreteValue):
+            minvalue = maxvalue = v_other.value
+        elif isinstance(v_other, WithinRange):
+            minvalue, maxvalue = v_other.minvalue, v_other.maxvalue
+        else:
+            return None
+        if self.gcctype != v_other.gcctype:
+            return None
+        if self.contains(minvalue) and self.contains(maxvalue):
+            return self
+        # Whichever bounds moved, jump straight to the limit of the type:
+        if minvalue < self.minvalue:
+            minvalue = self.gcctype.min_value.constant
+        else:
+            minvalue = self.minvalue
+        if maxvalue > self.maxvalue:
+            maxvalue = self.gcctype.max_value.constant
+        else:
+            maxvalue = self.maxvalue
+        return WithinRange(self.gcctype, self.loc, minvalue, maxvalue)
+
 class PointerToRegion(AbstractValue):
     """A non-NULL pointer value, pointing at a specific Region"""
     __slots__ = ('region', )
 
+    def __new__(cls, gcctype, loc, region):
+        return get_interned_value(cls, (gcctype, loc, region))
+
     def __init__(self, gcctype, loc, region):
         AbstractValue.__init__(self, gcctype, loc)
         check_isinstance(region, Region)
@@ -939,11 +1095,22 @@ class PointerToRegion(AbstractValue):
         # Defer to base class:
         AbstractValue.eval_unary_op(self, exprcode, gcctype, loc)
 
+    def merge(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        if isinstance(v_other, PointerToRegion):
+            if self.region is v_other.region:
+                return self
+
 class DeallocatedMemory(AbstractValue):
     """
     A 'poisoned' r-value: this memory has been deallocated, so the r-value
     is meaningless.
     """
+    __slots__ = ()
+
+    def __new__(cls, gcctype, loc):
+        return get_interned_value(cls, (gcctype, loc))
+
     def __str__(self):
         if self.loc:
             return 'memory deallocated at %s' % self.loc
@@ -953,11 +1120,21 @@ class DeallocatedMemory(AbstractValue):
     def extract_from_parent(self, region, gcctype, loc):
         return DeallocatedMemory(gcctype, self.loc)
 
+    def merge(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        if isinstance(v_other, DeallocatedMemory):
+            return self
+
 class UninitializedData(AbstractValue):
     """
     A 'poisoned' r-value: this memory has not yet been written to, so the
     r-value is meaningless.
     """
+    __slots__ = ()
+
+    def __new__(cls, gcctype, loc):
+        return get_interned_value(cls, (gcctype, loc))
+
     def __str__(self):
         if self.loc:
             return 'uninitialized data at %s' % self.loc
@@ -984,6 +1161,11 @@ class UninitializedData(AbstractValue):
     def extract_from_parent(self, region, gcctype, loc):
         return UninitializedData(gcctype, self.loc)
 
+    def merge(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        if isinstance(v_other, UninitializedData):
+            return self
+
 def make_null_ptr(gcctype, loc):
     return ConcreteValue(gcctype, loc, 0)
 
@@ -1262,6 +1444,8 @@ class SplitValue(Exception):
         result = []
         for altvalue, desc in zip(self.altvalues, self.descriptions):
             log(' creating state for split where %s is %s', self.value, altvalue)
+            # (altvalue may be interned, and thus shared with other states):
+            altvalue = altvalue.copy()
             altvalue.fromsplit = True
 
             newstate = state.copy()
@@ -1299,6 +1483,63 @@ class Facet(object):
         # Concrete subclasses should implement this.
         raise NotImplementedError
 
+    def merge(self, f_other):
+        """
+        Analogous to AbstractValue.merge: get a Facet covering both this one
+        and f_other (for the caller to attach to the merged State), or self
+        if f_other adds nothing, or None if they can't be merged.
+        """
+        # Concrete subclasses can implement this; by default, facets prevent
+        # merging:
+        return None
+
+    def widen(self, f_other):
+        """
+        Analogous to AbstractValue.widen
+        """
+        return self.merge(f_other)
+
+    @classmethod
+    def get_handlers(cls):
+        """
+        Get a dict mapping from the names of the functions that this Facet
+        subclass implements to the (unbound) impl_* methods, built on first
+        use
+        """
+        # (look in the class's own __dict__, so that a subclass doesn't pick
+        # up its base class's table):
+        if '_handlers' not in cls.__dict__:
+            handlers = {}
+            for attrname in dir(cls):
+                if attrname.startswith('impl_'):
+                    handlers[attrname[5:]] = getattr(cls, attrname)
+            cls._handlers = handlers
+        return cls.__dict__['_handlers']
+
+# A dictionary mapping from the (attrname, Facet subclass) pairs of a "facets"
+# dict (see State) to the dispatch table for those facets:
+_dispatch_tables = {}
+
+def get_dispatch_table(facets):
+    """
+    Given a "facets" dict (as per State), get a dict mapping from the name of
+    each function that one of the facets implements to a
+      (facet attribute name, impl_* method name, unbound method)
+    triple, so that calls can be dispatched with a single lookup
+    """
+    key = tuple(facets.items())
+    try:
+        return _dispatch_tables[key]
+    except KeyError:
+        table = {}
+        for attrname, facetcls in key:
+            for fnname, meth in facetcls.get_handlers().items():
+                # The first facet implementing a function handles it:
+                if fnname not in table:
+                    table[fnname] = (attrname, 'impl_%s' % fnname, meth)
+        _dispatch_tables[key] = table
+        return table
+
 class State(object):
     """
     A Location with memory state, and zero or more additional "facets" of
@@ -1327,9 +1568,13 @@ class State(object):
     # We can't use the __slots__ optimization here, as we're adding additional
     # per-facet attributes
 
+    # Total number of instances created (for use when profiling):
+    num_created = 0
+
     def __init__(self, stmtgraph, stmtnode, lastgccloc,
                  facets, region_for_var=None, value_for_region=None,
                  return_rvalue=None, has_returned=False, not_returning=False):
+        State.num_created += 1
         check_isinstance(stmtgraph, StmtGraph)
         check_isinstance(stmtnode, StmtNode)
         check_isinstance(facets, dict)
@@ -1339,19 +1584,29 @@ class State(object):
         self.lastgccloc = lastgccloc
         self.facets = facets
 
+        # The store is held in PersistentOrderedDict instances, so that
+        # copying a State doesn't copy the store (see State.copy); an
+        # OrderedDict is also accepted, and converted.
+
         # Mapping from VarDecl.name to Region:
         if region_for_var:
-            check_isinstance(region_for_var, OrderedDict)
+            check_isinstance(region_for_var, (PersistentOrderedDict,
+                                              OrderedDict))
+            if isinstance(region_for_var, OrderedDict):
+                region_for_var = PersistentOrderedDict(region_for_var)
             self.region_for_var = region_for_var
         else:
-            self.region_for_var = OrderedDict()
+            self.region_for_var = PersistentOrderedDict()
 
         # Mapping from Region to AbstractValue:
         if value_for_region:
-            check_isinstance(value_for_region, OrderedDict)
+            check_isinstance(value_for_region, (PersistentOrderedDict,
+                                                OrderedDict))
+            if isinstance(value_for_region, OrderedDict):
+                value_for_region = PersistentOrderedDict(value_for_region)
             self.value_for_region = value_for_region
         else:
-            self.value_for_region = OrderedDict()
+            self.value_for_region = PersistentOrderedDict()
 
         self.return_rvalue = return_rvalue
         self.has_returned = has_returned
@@ -1409,6 +1664,9 @@ class State(object):
             logger('%s', self.stmtnode.get_stmt().loc)
 
     def copy(self):
+        # This is O(1) in the size of the store: the new State shares the
+        # persistent trees holding the store with this one, until either of
+        # them is modified
         s_new = State(self.stmtgraph,
                       self.stmtnode,
                       self.lastgccloc,
@@ -1426,6 +1684,98 @@ class State(object):
             setattr(s_new, key, f_new)
         return s_new
 
+    def merge(self, s_other):
+        """
+        Try to combine this State with s_other, for use when merging states
+        at a point where control flow joins.
+
+        Returns:
+          - self, if s_other adds nothing to this State
+          - a new State covering both, if they only differ in values that can
+            be combined (e.g. two integer ranges, via AbstractValue.merge)
+          - None, if they differ in a way that the checkers care about (e.g.
+            a different set of regions, or a different reference count)
+        """
+        return self._combine(s_other, 'merge')
+
+    def widen(self, s_other):
+        """
+        As per merge, but for use when s_other is the result of going around
+        a loop starting from this State: values are combined using
+        AbstractValue.widen, so that repeatedly widening converges
+        """
+        return self._combine(s_other, 'widen')
+
+    def _combine(self, s_other, methname):
+        """
+        Implementation of merge and widen: methname is the name of the
+        method to use on each pair of AbstractValue and Facet instances
+        """
+        check_isinstance(s_other, State)
+        if self.stmtnode != s_other.stmtnode:
+            return None
+        if (self.has_returned != s_other.has_returned
+            or self.not_returning != s_other.not_returning
+            or self.return_rvalue is not s_other.return_rvalue):
+            return None
+
+        if len(self.region_for_var) != len(s_other.region_for_var):
+            return None
+        for k, region in self.region_for_var.items():
+            if s_other.region_for_var.get(k, None) is not region:
+                return None
+
+        if len(self.value_for_region) != len(s_other.value_for_region):
+            return None
+        changed = False
+        value_for_region = self.value_for_region.copy()
+        for region, v_self in self.value_for_region.items():
+            if region not in s_other.value_for_region:
+                return None
+            v_other = s_other.value_for_region[region]
+            # Don't lose track of which values are only possible, rather
+            # than definite:
+            if hasattr(v_self, 'fromsplit') != hasattr(v_other, 'fromsplit'):
+                return None
+            v_merged = getattr(v_self, methname)(v_other)
+            if v_merged is None:
+                return None
+            if v_merged is not v_self:
+                changed = True
+                value_for_region[region] = v_merged
+
+        merged_facets = {}
+        for key in self.facets:
+            f_self = getattr(self, key)
+            f_merged = getattr(f_self, methname)(getattr(s_other, key))
+            if f_merged is None:
+                return None
+            if f_merged is not f_self:
+                changed = True
+            merged_facets[key] = f_merged
+
+        if not changed:
+            return self
+
+        s_new = State(self.stmtgraph,
+                      self.stmtnode,
+                      self.lastgccloc,
+                      self.facets,
+                      self.region_for_var.copy(),
+                      value_for_region,
+                      self.return_rvalue,
+                      self.has_returned,
+                      self.not_returning)
+        for key in self.facets:
+            f_merged = merged_facets[key]
+            if f_merged is getattr(self, key):
+                f_new = f_merged.copy(s_new)
+            else:
+                f_new = f_merged
+                f_new.state = s_new
+            setattr(s_new, key, f_new)
+        return s_new
+
     def verify(self):
         """
         Perform self-tests to ensure sanity of this State
@@ -2176,7 +2526,8 @@ class State(object):
     def _get_transitions_for_GimpleCall(self, stmt):
         log('stmt.lhs: %s %r', stmt.lhs, stmt.lhs)
         log('stmt.fn: %s %r', stmt.fn, stmt.fn)
-        log('dir(stmt.fn): %s', dir(stmt.fn))
+        if logging_enabled:
+            log('dir(stmt.fn): %s', dir(stmt.fn))
         if hasattr(stmt.fn, 'operand'):
             log('stmt.fn.operand: %s', stmt.fn.operand)
         returntype = stmt.fn.type.dereference.type
@@ -2210,7 +2561,8 @@ class State(object):
                     raise PassingPointerToDeallocatedMemory(i, 'function', stmt, rvalue)
 
         if isinstance(stmt.fn.operand, gcc.FunctionDecl):
-            log('dir(stmt.fn.operand): %s', dir(stmt.fn.operand))
+            if logging_enabled:
+                log('dir(stmt.fn.operand): %s', dir(stmt.fn.operand))
             log('stmt.fn.operand.name: %r', stmt.fn.operand.name)
             fnname = stmt.fn.operand.name
 
@@ -2222,14 +2574,17 @@ class State(object):
             # for the evaluated arguments (which for some functions will
             # involve varargs, like above).
             # They should return a list of Transition instances.
-            methname = 'impl_%s' % fnname
-            for key in self.facets:
+            handler = get_dispatch_table(self.facets).get(fnname, None)
+            if handler:
+                key, methname, meth = handler
                 facet = getattr(self, key)
-                if hasattr(facet, methname):
-                    meth = getattr(facet, 'impl_%s' % fnname)
 
-                    # Call the facet's method:
-                    return meth(stmt, *args)
+                # Call the facet's method:
+                prof = get_current_profile()
+                if prof:
+                    return call_handler(prof, methname, meth,
+                                        facet, stmt, *args)
+                return meth(facet, stmt, *args)
 
             #from libcpychecker.c_stdio import c_stdio_functions, handle_c_stdio_function
 
@@ -2243,6 +2598,14 @@ class State(object):
                 if fnname.startswith('_Py') or fnname.startswith('Py'):
                     raise NotImplementedError('not yet implemented: %s' % fnname)
 
+            # Function within this translation unit that has already been
+            # analyzed and summarized (see libcpychecker.summaries):
+            from libcpychecker.summaries import get_summary
+            summary = get_summary(fnname)
+            if summary and hasattr(self, 'cpython'):
+                log('Using summary of %r: %s', fnname, summary)
+                return summary.get_transitions(self, stmt)
+
             # Unknown function returning (PyObject*):
             from libcpychecker.refcounts import type_is_pyobjptr_subclass
             if type_is_pyobjptr_subclass(stmt.fn.operand.type.type):
@@ -2696,38 +3059,117 @@ class Transition(object):
         logger('dest:')
         self.dest.log(logger)
 
+class WideningTransition(Transition):
+    """
+    The Transition at the head of a loop, from the State that has just come
+    back around the loop to the widened State with which the next pass of
+    the loop is analyzed (see get_state_for_next_loop_pass)
+    """
+    __slots__ = ()
+
 class Trace(object):
-    __slots__ = ('states', 'transitions', 'err', 'paths_taken')
+    """
+    A sequence of States and Transitions
+
+    Traces are built up one Transition at a time, with each Trace referring
+    to the Trace that it extends (its "parent").  Hence the many traces
+    explored by iter_traces share their common prefixes, rather than each
+    holding a copy of them: extending a Trace is O(1), and the "states"
+    and "transitions" lists are only built when they are asked for (typically
+    just for the complete traces that we report on).
+    """
+    __slots__ = ('parent', 'transition', 'err', 'depth', 'edges_taken')
 
-    """A sequence of States and Transitions"""
-    def __init__(self):
-        self.states = []
-        self.transitions = []
+    def __init__(self, parent=None, transition=None):
+        if parent is not None:
+            check_isinstance(parent, Trace)
+            check_isinstance(transition, Transition)
+        self.parent = parent
+        self.transition = transition
         self.err = None
 
-        # A list of (src gcc.StmtNode, dest gcc.StmtNode) pairs
-        self.paths_taken = []
+        if parent is None:
+            self.depth = 0
+            # A frozenset of (src gcc.BasicBlock, dest gcc.BasicBlock) pairs;
+            # shared with the parent whenever the transition stays within one
+            # block:
+            self.edges_taken = frozenset()
+        else:
+            self.depth = parent.depth + 1
+            edge = self._get_edge()
+            if edge:
+                self.edges_taken = parent.edges_taken | frozenset([edge])
+            else:
+                self.edges_taken = parent.edges_taken
+
+    def _get_edge(self):
+        """
+        Get the (src gcc.BasicBlock, dest gcc.BasicBlock) pair for the final
+        transition, or None if it doesn't change basic block
+        """
+        if self.transition is None:
+            return None
+        src_bb = self.transition.src.stmtnode.bb
+        dest_bb = self.transition.dest.stmtnode.bb
+        if src_bb != dest_bb:
+            return (src_bb, dest_bb)
 
     def add(self, transition):
+        """
+        Get a new Trace, consisting of this one followed by the given
+        Transition.  This Trace is not modified.
+        """
         check_isinstance(transition, Transition)
-        self.states.append(transition.dest)
-        self.transitions.append(transition)
-        if transition.src.stmtnode.bb != transition.dest.stmtnode.bb:
-            self.paths_taken.append( (transition.src.stmtnode.bb,
-                                      transition.dest.stmtnode.bb) )
-        return self
+        return Trace(self, transition)
 
     def add_error(self, err):
         self.err = err
 
     def copy(self):
         t = Trace()
-        t.states = self.states[:]
-        t.transitions = self.transitions[:]
+        t.parent = self.parent
+        t.transition = self.transition
         t.err = self.err # FIXME: should this be a copy?
-        t.paths_taken = self.paths_taken[:]
+        t.depth = self.depth
+        t.edges_taken = self.edges_taken
         return t
 
+    def _iter_transitions_reversed(self):
+        t = self
+        while t.transition is not None:
+            yield t.transition
+            t = t.parent
+
+    @property
+    def transitions(self):
+        result = list(self._iter_transitions_reversed())
+        result.reverse()
+        return result
+
+    @property
+    def states(self):
+        return [t.dest for t in self.transitions]
+
+    @property
+    def paths_taken(self):
+        """
+        A list of (src gcc.BasicBlock, dest gcc.BasicBlock) pairs, in the order
+        in which they were taken
+        """
+        result = []
+        t = self
+        while t is not None:
+            edge = t._get_edge()
+            if edge:
+                result.append(edge)
+            t = t.parent
+        result.reverse()
+        return result
+
+    def get_last_state(self):
+        if self.transition is not None:
+            return self.transition.dest
+
     def log(self, logger, name):
         logger('%s:' % name)
         for i, state in enumerate(self.states):
@@ -2737,16 +3179,18 @@ class Trace(object):
             logger('  Trace ended with error: %s' % self.err)
 
     def get_last_stmt(self):
-        return self.states[-1].stmtnode.get_stmt()
+        return self.get_last_state().stmtnode.get_stmt()
 
     def return_value(self):
-        return self.states[-1].return_rvalue
+        return self.get_last_state().return_rvalue
 
     def has_looped(self):
         """
         Is the tail transition a path we've followed before?
         """
-        endstate = self.states[-1]
+        if self.parent is None:
+            return False
+        endstate = self.get_last_state()
         if hasattr(endstate, 'fromsplit'):
             # We have a state that was created from a SplitValue.  It will have
             # the same location as the state before it (before the split).
@@ -2757,7 +3201,7 @@ class Trace(object):
             # repeated location:
             return False
 
-        endtransition = self.transitions[-1]
+        endtransition = self.transition
         if 0:
             gcc.inform(endstate.get_gcc_loc(endstate.fun),
                        ('paths_taken: %s'
@@ -2766,10 +3210,9 @@ class Trace(object):
                        'src, loc: %s' % ((endtransition.src.loc, endtransition.dest.loc),))
 
         # Is this a path we've followed before?
-        src_bb = endtransition.src.stmtnode.bb
-        dest_bb = endtransition.dest.stmtnode.bb
-        if src_bb != dest_bb:
-            if (src_bb, dest_bb) in self.paths_taken[0:-1]:
+        edge = self._get_edge()
+        if edge:
+            if edge in self.parent.edges_taken:
                 return True
 
     def get_all_var_region_pairs(self):
@@ -2915,14 +3358,40 @@ class TooComplicated(Exception):
         check_isinstance(complete_traces, list)
         self.complete_traces = complete_traces
 
+# Limits.on_transition only checks the memory usage this often, as it's
+# relatively expensive to do so:
+MEMORY_CHECK_INTERVAL = 32
+
 class Limits:
     """
     Resource limits, to avoid an analysis going out of control
+
+    maxtrans: the maximum number of transitions to follow
+
+    maxseconds: if not None, the maximum wall-clock time (in seconds) to
+    spend, measured from when the Limits instance is created
+
+    deadline: if not None, a time.time() value by which to have finished
+    (e.g. for a budget covering the whole translation unit)
+
+    maxmb: if not None, the maximum memory usage of the process (in MB)
     """
-    def __init__(self, maxtrans):
+    def __init__(self, maxtrans, maxseconds=None, deadline=None, maxmb=None):
         self.maxtrans = maxtrans
         self.trans_seen = 0
 
+        if maxseconds is not None:
+            if deadline is None:
+                deadline = time.time() + maxseconds
+            else:
+                deadline = min(deadline, time.time() + maxseconds)
+        self.deadline = deadline
+        self.maxmb = maxmb
+
+        # Which limit was exceeded (if any): one of None, 'transitions',
+        # 'time' or 'memory':
+        self.exceeded = None
+
     def on_transition(self, transition, result):
         """
         result is a list of all *complete* traces so far
@@ -2932,23 +3401,210 @@ class Limits:
                   % (transition.src.stmtnode, transition.dest.stmtnode))
         self.trans_seen += 1
         if self.trans_seen > self.maxtrans:
+            self.exceeded = 'transitions'
             raise TooComplicated(result)
+        if self.deadline is not None:
+            if time.time() > self.deadline:
+                self.exceeded = 'time'
+                raise TooComplicated(result)
+        if self.maxmb is not None:
+            if self.trans_seen % MEMORY_CHECK_INTERVAL == 0:
+                if get_memory_usage_mb() > self.maxmb:
+                    self.exceeded = 'memory'
+                    raise TooComplicated(result)
+
+    def exceeded_resource_budget(self):
+        """
+        Did the analysis give up due to running out of time or memory?
+        (as opposed to the maximum number of transitions, which is
+        deterministic)
+        """
+        return self.exceeded in ('time', 'memory')
+
+class Worklist(object):
+    """
+    The pending work within iter_traces: a collection of (Trace, Transition)
+    pairs, each one an edge of the tree of traces that has not yet been
+    followed.
+
+    Subclasses determine the order in which the tree is explored.
+    """
+    def add_transitions(self, prefix, transitions):
+        raise NotImplementedError
+
+    def pop(self):
+        """
+        Remove and return the next (Trace, Transition) pair to be explored
+        """
+        raise NotImplementedError
 
-def iter_traces(stmtgraph, facets, prefix=None, limits=None, depth=0):
+    def __len__(self):
+        raise NotImplementedError
+
+class DepthFirstWorklist(Worklist):
+    """
+    Explore the tree of traces depth-first, taking the transitions out of
+    each state in the order that they were generated (the default)
+    """
+    def __init__(self):
+        self._stack = []
+
+    def add_transitions(self, prefix, transitions):
+        # Push them in reverse order, so that the first transition is the
+        # first to be popped:
+        for transition in reversed(transitions):
+            self._stack.append( (prefix, transition) )
+
+    def pop(self):
+        return self._stack.pop()
+
+    def __len__(self):
+        return len(self._stack)
+
+class BreadthFirstWorklist(Worklist):
+    """
+    Explore the tree of traces breadth-first: all traces of length N are
+    extended before any trace of length N+1
+    """
+    def __init__(self):
+        self._queue = deque()
+
+    def add_transitions(self, prefix, transitions):
+        for transition in transitions:
+            self._queue.append( (prefix, transition) )
+
+    def pop(self):
+        return self._queue.popleft()
+
+    def __len__(self):
+        return len(self._queue)
+
+class PriorityWorklist(Worklist):
+    """
+    Explore the tree of traces in order of a caller-supplied priority
+
+    key: a callable taking (Trace, Transition) and returning a sortable value;
+    the pairs with the lowest values are explored first, with ties broken in
+    the order that they were added.  For example:
+
+        PriorityWorklist(lambda prefix, transition: prefix.depth)
+
+    gives a breadth-first traversal.
+    """
+    def __init__(self, key):
+        self.key = key
+        self._heap = []
+        self._count = 0
+
+    def add_transitions(self, prefix, transitions):
+        for transition in transitions:
+            heapq.heappush(self._heap,
+                           (self.key(prefix, transition),
+                            self._count,
+                            prefix,
+                            transition))
+            self._count += 1
+
+    def pop(self):
+        _, _, prefix, transition = heapq.heappop(self._heap)
+        return prefix, transition
+
+    def __len__(self):
+        return len(self._heap)
+
+def order_interrupted_traces(complete_traces, prefix):
+    """
+    Given the list of complete traces found so far when the exploration was
+    interrupted at the given prefix, order them so that those which diverge
+    from the prefix most recently come first (in the order they were found),
+    matching the order in which a recursive traversal would have unwound
+    """
+    depth_of_ancestor = {}
+    t = prefix
+    while t is not None:
+        depth_of_ancestor[t] = t.depth
+        t = t.parent
+
+    def get_divergence_depth(trace):
+        t = trace
+        while t is not None:
+            if t in depth_of_ancestor:
+                return depth_of_ancestor[t]
+            t = t.parent
+        return -1
+
+    return sorted(complete_traces, key=get_divergence_depth, reverse=True)
+
+# When widening loops, the maximum number of passes that a trace can make
+# around any one loop before we give up on that trace:
+MAX_LOOP_PASSES = 8
+
+def get_state_for_next_loop_pass(trace, maxpasses=MAX_LOOP_PASSES):
+    """
+    Given a Trace that has just gone around a loop, returning to a statement
+    that it has already reached, get the State with which to analyze another
+    pass of the loop: the State from the previous pass, widened with that
+    from this pass.
+
+    Return None if there's no need for another pass (the previous pass
+    already covered this one, i.e. we've reached a fixpoint), or if the
+    states can't be combined, or after maxpasses passes around the loop.
+    """
+    check_isinstance(trace, Trace)
+    s_cur = trace.get_last_state()
+    s_prev = None
+    # The pass that has just finished, plus one for each earlier pass that
+    # was followed by a WideningTransition back to the head of the loop (the
+    # initial entry to the loop isn't a pass in itself):
+    passes = 1
+    t = trace.parent
+    while t is not None and t.transition is not None:
+        transition = t.transition
+        if transition.dest.stmtnode == s_cur.stmtnode:
+            if s_prev is None:
+                s_prev = transition.dest
+            if isinstance(transition, WideningTransition):
+                passes += 1
+        t = t.parent
+    if s_prev is None or passes >= maxpasses:
+        return None
+    s_widened = s_prev.widen(s_cur)
+    if s_widened is s_prev:
+        log('reached fixpoint for loop')
+        return None
+    return s_widened
+
+def iter_traces(stmtgraph, facets, prefix=None, limits=None, worklist=None,
+                merge_states=False, widen_loops=False):
     """
     Traverse the tree of traces of program state, returning a list
     of Trace instances.
 
-    For now, don't include any traces that contain loops, as a primitive
-    way of ensuring termination of the analysis
-
-    This is recursive, setting up a depth-first traversal of the state tree.
-    If it's interrupted by a TooComplicated exception, we should at least
-    capture an incomplete list of paths down to some of the bottoms of the
-    tree.
+    By default, don't include any traces that contain loops, as a primitive
+    way of ensuring termination of the analysis.  If widen_loops is True,
+    then a trace that goes around a loop continues with the State from its
+    previous pass widened with the new one (see State.widen), until this
+    reaches a fixpoint (see get_state_for_next_loop_pass).
+
+    The traversal uses an explicit Worklist rather than recursion, so that
+    long functions can't exhaust the Python stack; by default it's
+    depth-first (see DepthFirstWorklist).  If it's interrupted by a
+    TooComplicated exception, we should at least capture an incomplete list
+    of paths down to some of the bottoms of the tree.
+
+    If merge_states is True, then at statements where control flow joins,
+    a State that can be merged (see State.merge) with one that has already
+    reached that statement is combined with it, rather than being explored
+    separately.  A State that adds nothing to an earlier one isn't explored
+    any further, so that e.g. a sequence of N if-statements doesn't lead to
+    2^N traces.
     """
     fun = stmtgraph.fun
     log('iter_traces(%r, %r, %r)', fun, facets, prefix)
+    if worklist is None:
+        worklist = DepthFirstWorklist()
+    check_isinstance(worklist, Worklist)
+
     if prefix is None:
         prefix = Trace()
         curstate = State(stmtgraph,
@@ -2965,83 +3621,117 @@ def iter_traces(stmtgraph, facets, prefix=None, limits=None, depth=0):
             f_new.init_for_function(fun)
     else:
         check_isinstance(prefix, Trace)
-        curstate = prefix.states[-1]
+        curstate = prefix.get_last_state()
+
+    result = []
+
+    # When merging, a dict mapping from StmtNode (at points where control
+    # flow joins) to the list of States that have been explored onwards from
+    # there:
+    states_at_join = {}
 
+    def visit(prefix, curstate):
         if curstate.has_returned:
             # This state has returned a value (and hence terminated):
-            return [prefix]
+            result.append(prefix)
+            return
 
         if curstate.not_returning:
             # This state has called "exit" or similar, and thus this
             # trace should terminate:
-            return [prefix]
+            result.append(prefix)
+            return
 
-        # Stop interpreting when you see a loop, to ensure termination:
+        # Stop interpreting when you see a loop, to ensure termination
+        # (or, if widening, when the loop reaches a fixpoint):
         if prefix.has_looped():
-            log('loop detected; stopping iteration')
-            if 0:
-                gcc.inform(curstate.get_gcc_loc(fun),
-                           'loop detected; stopping iteration')
-            # Don't return the prefix so far: it is not a complete trace
-            return []
-
-    # We need the prevstate in order to handle Phi nodes
-    if len(prefix.states) > 1:
-        prevstate = prefix.states[-2]
-    else:
-        prevstate = None
-
-    prefix.log(log, 'PREFIX')
-    log('  %s:%s', fun.decl.name, curstate.stmtnode)
-    try:
-        transitions = curstate.get_transitions()
-        check_isinstance(transitions, list)
-    except PredictedError:
-        # We're at a terminating state:
-        err = sys.exc_info()[1]
-        err.loc = prefix.get_last_stmt().loc
-        trace_with_err = prefix.copy()
-        trace_with_err.add_error(err)
-        trace_with_err.log(log, 'FINISHED TRACE WITH ERROR: %s' % err)
-        return [trace_with_err]
-    except SplitValue:
-        # Split the state up, splitting into parallel worlds with different
-        # values for the given value
-        # FIXME: this doesn't work; it thinks it's a loop :(
-        err = sys.exc_info()[1]
-        transitions = err.split(curstate)
-        check_isinstance(transitions, list)
+            s_widened = None
+            if widen_loops:
+                s_widened = get_state_for_next_loop_pass(prefix)
+            if s_widened is None:
+                log('loop detected; stopping iteration')
+                if 0:
+                    gcc.inform(curstate.get_gcc_loc(fun),
+                               'loop detected; stopping iteration')
+                # Don't return the prefix so far: it is not a complete trace
+                return
+            log('widened state for another pass around loop')
+            prefix = prefix.add(WideningTransition(curstate, s_widened, None))
+            curstate = s_widened
+
+        if merge_states and len(curstate.stmtnode.preds) > 1:
+            if not hasattr(curstate, 'fromsplit'):
+                seen = states_at_join.setdefault(curstate.stmtnode, [])
+                for i, s_old in enumerate(seen):
+                    s_merged = s_old.merge(curstate)
+                    if s_merged is None:
+                        continue
+                    if s_merged is s_old:
+                        # Everything reachable from here has already been
+                        # (or will be) explored from the earlier state:
+                        log('state subsumed by earlier state; stopping iteration')
+                        return
+                    log('merged state with earlier state')
+                    seen[i] = s_merged
+                    prefix = prefix.add(Transition(curstate, s_merged, None))
+                    curstate = s_merged
+                    break
+                else:
+                    seen.append(curstate)
 
-    log('transitions: %s', transitions)
+        if logging_enabled:
+            prefix.log(log, 'PREFIX')
+        log('  %s:%s', fun.decl.name, curstate.stmtnode)
+        try:
+            transitions = curstate.get_transitions()
+            check_isinstance(transitions, list)
+        except PredictedError:
+            # We're at a terminating state:
+            err = sys.exc_info()[1]
+            err.loc = prefix.get_last_stmt().loc
+            trace_with_err = prefix.copy()
+            trace_with_err.add_error(err)
+            if logging_enabled:
+                trace_with_err.log(log, 'FINISHED TRACE WITH ERROR: %s' % err)
+            result.append(trace_with_err)
+            return
+        except SplitValue:
+            # Split the state up, splitting into parallel worlds with different
+            # values for the given value
+            # FIXME: this doesn't work; it thinks it's a loop :(
+            err = sys.exc_info()[1]
+            transitions = err.split(curstate)
+            check_isinstance(transitions, list)
 
-    if len(transitions) > 0:
-        result = []
-        for transition in transitions:
-            check_isinstance(transition, Transition)
-            transition.dest.verify()
+        log('transitions: %s', transitions)
 
-            # Potentially raise a TooComplicated exception:
-            if limits:
-                limits.on_transition(transition, result)
+        if len(transitions) > 0:
+            for transition in transitions:
+                check_isinstance(transition, Transition)
+                transition.dest.verify()
+            worklist.add_transitions(prefix, transitions)
+        else:
+            # We're at a terminating state:
+            if logging_enabled:
+                prefix.log(log, 'FINISHED TRACE')
+            result.append(prefix)
 
-            newprefix = prefix.copy().add(transition)
+    visit(prefix, curstate)
+    while len(worklist) > 0:
+        prefix, transition = worklist.pop()
 
-            # Recurse
-            # This gives us a depth-first traversal of the state tree
+        # Potentially raise a TooComplicated exception:
+        if limits:
             try:
-                for trace in iter_traces(stmtgraph, facets, newprefix, limits,
-                                         depth + 1):
-                    result.append(trace)
+                limits.on_transition(transition, result)
             except TooComplicated:
                 err = sys.exc_info()[1]
-                traces = err.complete_traces
-                traces += result
-                raise TooComplicated(traces)
-        return result
-    else:
-        # We're at a terminating state:
-        prefix.log(log, 'FINISHED TRACE')
-        return [prefix]
+                raise TooComplicated(
+                    order_interrupted_traces(err.complete_traces, prefix))
+
+        visit(prefix.add(transition), transition.dest)
+
+    return result
 
 class StateGraph:
     """
@@ -37,6 +37,8 @@ c_stdio_functions = [
 ]
 
 class NonNullFilePtr(AbstractValue):
+    __slots__ = ('stmt', )
+
     def __init__(self, stmt):
         self.stmt = stmt
 
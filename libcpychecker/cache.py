@@ -0,0 +1,291 @@
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+"""
+On-disk cache of the results of the refcount checker.
+
+Each function is identified by a fingerprint of everything that the
+analysis depends on: its GIMPLE (including source locations), its source
+text (which the HTML reports embed), the layout of the types that it uses
+(including nested structs), the custom attributes seen in the translation
+unit, the checker's settings, and the source code of libcpychecker itself.  If a
+function with the same fingerprint has been analyzed before, its diagnostics
+and error reports can be replayed from the cache, without running the
+abstract interpretation.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import gcc
+
+from gccutils import check_isinstance
+from libcpychecker.utils import log
+
+# Bump this if the format of the cache entries changes:
+CACHE_FORMAT = 3
+
+_source_digest = None
+
+def get_source_digest():
+    """
+    Get a digest of the source code of libcpychecker, so that changes to the
+    checker invalidate the cache
+    """
+    global _source_digest
+    if _source_digest is None:
+        h = hashlib.sha1()
+        pkgdir = os.path.dirname(os.path.abspath(__file__))
+        for filename in sorted(os.listdir(pkgdir)):
+            if filename.endswith('.py'):
+                h.update(filename.encode('utf-8'))
+                with open(os.path.join(pkgdir, filename), 'rb') as f:
+                    h.update(f.read())
+        _source_digest = h.hexdigest()
+    return _source_digest
+
+def _describe_location(loc):
+    if loc:
+        return '%s:%i:%i' % (loc.file, loc.line, loc.column)
+    return 'None'
+
+def _describe_type(t, seen):
+    """
+    Describe a type, including the layout of any struct it refers to
+    """
+    result = str(t)
+    while isinstance(t, (gcc.PointerType, gcc.ArrayType)):
+        t = t.dereference
+    if isinstance(t, gcc.RecordType) and t not in seen:
+        seen.add(t)
+        if t.fields:
+            # (recursing, so that the layout of nested structs is covered;
+            # "seen" stops this at self-referential types)
+            result += ' {%s}' % '; '.join(['%s %s'
+                                           % (_describe_type(field.type, seen),
+                                              field.name)
+                                           for field in t.fields])
+    if isinstance(t, (gcc.FunctionType, gcc.MethodType)):
+        # e.g. "nonnull":
+        if t.attributes:
+            result += ' attributes %s' % sorted([(str(k), str(v))
+                                                 for k, v in t.attributes.items()])
+    return result
+
+def _describe_source(fun):
+    """
+    Get a digest of the source text of the function, as embedded in the HTML
+    reports (comments and whitespace don't otherwise affect the fingerprint)
+    """
+    # (the same range of lines as CollectedReports.to_json)
+    first, last = fun.decl.location.line - 1, fun.end.line + 1
+    h = hashlib.sha1()
+    try:
+        with open(fun.start.file, 'rb') as f:
+            for i, line in enumerate(f, 1):
+                if i > last:
+                    break
+                if i >= first:
+                    h.update(line)
+    except IOError:
+        return 'unreadable'
+    return '%i-%i %s' % (first, last, h.hexdigest())
+
+def get_function_fingerprint(fun, settings):
+    """
+    Get a hex digest identifying everything that the analysis of the given
+    gcc.Function depends on.
+
+    settings: a dict of the checker's options (e.g. maxtrans)
+    """
+    check_isinstance(fun, gcc.Function)
+    check_isinstance(settings, dict)
+
+    from libcpychecker.attributes import fnnames_returning_borrowed_refs, \
+        stolen_refs_by_fnname, fnnames_setting_exception, \
+        fnnames_setting_exception_on_negative_result
+    from libcpychecker.types import get_PyObject, type_dict
+    from libcpychecker.summaries import get_summary
+
+    lines = []
+    lines.append('format: %i' % CACHE_FORMAT)
+    lines.append('libcpychecker: %s' % get_source_digest())
+    for key in sorted(settings):
+        lines.append('setting: %s=%r' % (key, settings[key]))
+    # (the report files differ when gathering per-translation-unit reports)
+    from libcpychecker import tureport, sarif, warningdb
+    lines.append('tu report: %r' % tureport.enabled)
+    lines.append('sarif: %r' % sarif.enabled)
+    lines.append('warning db: %r' % warningdb.enabled)
+
+    # Custom attributes seen within the translation unit:
+    lines.append('borrowed: %r' % sorted(fnnames_returning_borrowed_refs))
+    lines.append('steals: %r' % sorted([(k, sorted(v))
+                                        for k, v in stolen_refs_by_fnname.items()]))
+    lines.append('sets exception: %r' % sorted(fnnames_setting_exception))
+    lines.append('sets exception on negative: %r'
+                 % sorted(fnnames_setting_exception_on_negative_result))
+    lines.append('type objects: %r' % sorted([(k, str(v))
+                                              for k, v in type_dict.items()]))
+
+    # Types:
+    seen = set()
+    if get_PyObject():
+        lines.append('PyObject: %s' % _describe_type(get_PyObject().type, seen))
+    lines.append('fn: %s %s at %s'
+                 % (fun.decl.name,
+                    _describe_type(fun.decl.type, seen),
+                    _describe_location(fun.decl.location)))
+    lines.append('start: %s' % _describe_location(fun.start))
+    lines.append('end: %s' % _describe_location(fun.end))
+    lines.append('source: %s' % _describe_source(fun))
+    for parm in fun.decl.arguments:
+        lines.append('parm: %s %s' % (parm.name, _describe_type(parm.type, seen)))
+    for local in fun.local_decls:
+        lines.append('local: %s %s' % (local.name, _describe_type(local.type, seen)))
+
+    # The GIMPLE itself:
+    for bb in fun.cfg.basic_blocks:
+        lines.append('bb %i' % bb.index)
+        if bb.gimple:
+            for stmt in bb.gimple:
+                lines.append('  %s %s at %s'
+                             % (stmt.__class__.__name__, stmt,
+                                _describe_location(stmt.loc)))
+                if isinstance(stmt, gcc.GimpleCall):
+                    # Function declarations can carry attributes affecting
+                    # the analysis (e.g. nonnull):
+                    lines.append('    calling %s'
+                                 % _describe_type(stmt.fn.type, seen))
+                    # Summaries of callees within this translation unit:
+                    if isinstance(stmt.fn, gcc.AddrExpr) \
+                            and isinstance(stmt.fn.operand, gcc.FunctionDecl):
+                        summary = get_summary(stmt.fn.operand.name)
+                        if summary:
+                            lines.append('    summary %s' % summary)
+        for edge in bb.succs:
+            lines.append('  -> bb %i (%r, %r, %r)'
+                         % (edge.dest.index, edge.true_value,
+                            edge.false_value, edge.complex))
+
+    h = hashlib.sha1()
+    h.update('\n'.join(lines).encode('utf-8'))
+    return h.hexdigest()
+
+def get_locations(fun):
+    """
+    Get a dict mapping (file, line, column) to gcc.Location for all of the
+    locations within the function that diagnostics can refer to
+    """
+    result = {}
+    def add(loc):
+        if loc:
+            result.setdefault((loc.file, loc.line, loc.column), loc)
+    add(fun.start)
+    add(fun.end)
+    add(fun.decl.location)
+    for parm in fun.decl.arguments:
+        add(parm.location)
+    for local in fun.local_decls:
+        add(local.location)
+    for bb in fun.cfg.basic_blocks:
+        if bb.gimple:
+            for stmt in bb.gimple:
+                add(stmt.loc)
+    return result
+
+class ResultCache:
+    """
+    A directory of cached results, one JSON file per function fingerprint
+    """
+    def __init__(self, dirname):
+        self.dirname = dirname
+
+    def _get_path(self, key):
+        return os.path.join(self.dirname, key[:2], '%s.json' % key)
+
+    def lookup(self, key):
+        """
+        Get the cached entry (a dict) for the given fingerprint, or None
+        """
+        path = self._get_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            # Treat a corrupt entry as a miss; it will get overwritten:
+            return None
+        if entry.get('format') != CACHE_FORMAT:
+            return None
+        return entry
+
+    def store(self, key, entry):
+        """
+        Write out an entry, atomically (so that concurrent builds sharing the
+        cache don't see partially-written files)
+        """
+        check_isinstance(entry, dict)
+        path = self._get_path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Possibly created by a concurrent build:
+                if not os.path.isdir(dirname):
+                    raise
+        fd, tmppath = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.rename(tmppath, path)
+        log('stored cache entry %s', path)
+
+def make_entry(diagnostics, reportfiles, summary=None):
+    """
+    Make a cache entry from the result of refcounts.analyze_refcounts, along
+    with the function's FunctionSummary (if any)
+    """
+    check_isinstance(diagnostics, list)
+    check_isinstance(reportfiles, dict)
+    if summary:
+        summary = summary.as_json()
+    return dict(format=CACHE_FORMAT,
+                diagnostics=[d.as_json() for d in diagnostics],
+                reportfiles=reportfiles,
+                summary=summary)
+
+def get_diagnostics(entry, locations, default_loc=None):
+    """
+    Get a list of SavedDiagnostic instances from a cache entry, given the
+    result of get_locations() for the function.
+
+    Any location that can't be found is replaced with default_loc; if that
+    is None, then None is returned (and the entry can't be replayed)
+    """
+    from libcpychecker.diagnostics import saved_diagnostic_from_json
+    result = []
+    for d in entry['diagnostics']:
+        loc = locations.get((d['file'], d['line'], d['column']), default_loc)
+        if loc is None:
+            log('could not find location %r for cached diagnostic', d)
+            return None
+        result.append(saved_diagnostic_from_json(d, loc))
+    return result
@@ -24,7 +24,7 @@ flushed, allowing us to de-duplicate error reports.
 """
 
 import gcc
-from gccutils import get_src_for_loc, check_isinstance
+from gccutils import get_src_for_loc
 from libcpychecker.visualizations import HtmlRenderer
 from libcpychecker.utils import log
 
@@ -95,22 +95,38 @@ class Reporter:
     Error-reporting interface.  Gathers information, sending it to GCC's
     regular diagnostic interface, but also storing it for e.g. HTML dumps
 
-    Error reports can be de-duplicated by finding sufficiently similar Report
-    instances, and only fully flushing one of them within each equivalence
-    class
+    Error reports are de-duplicated as they are made: warnings with the same
+    function, source location, and message are in the same equivalence class,
+    and only the first Report within each class is kept; the others are
+    merely counted
     """
     def __init__(self):
         self.reports = []
         self._got_warnings = False
 
+        # dict from (fun, loc, msg) to the first Report with that key:
+        self._report_for_key = {}
+
+        # Has remove_duplicates() added its notes yet?
+        self._noted_duplicates = False
+
     def make_warning(self, fun, loc, msg):
         assert isinstance(fun, gcc.Function)
         assert isinstance(loc, gcc.Location)
 
         self._got_warnings = True
 
+        key = (fun, loc, msg)
+        if key in self._report_for_key:
+            # A duplicate of an existing report: don't bother gathering any
+            # more information about it:
+            original = self._report_for_key[key]
+            original.num_duplicates += 1
+            return DuplicateReport(original)
+
         w = Report(fun, loc, msg)
         self.reports.append(w)
+        self._report_for_key[key] = w
 
         w.add_warning(loc, msg)
 
@@ -126,7 +142,7 @@ class Reporter:
     def got_warnings(self):
         return self._got_warnings
 
-    def to_json(self, fun):
+    def to_json(self, fun, compact=False):
         result = dict(filename=fun.start.file,
                       function=dict(name=fun.decl.name,
                                     # line number range:
@@ -134,16 +150,29 @@ class Reporter:
                                            fun.end.line + 1)),
                       reports=[])
         for report in self.reports:
-            result['reports'].append(report.to_json(fun))
+            result['reports'].append(report.to_json(fun, compact))
         return result
 
-    def dump_json(self, fun, filename):
-        js = self.to_json(fun)
-        from json import dump, dumps
-        with open(filename, 'w') as f:
-            dump(js, f, sort_keys=True, indent=4)
-        if 0:
-            print(dumps(js, sort_keys=True, indent=4))
+    def dump_json(self, fun, filename, compact=False, compress=False):
+        """
+        Write out the reports as JSON.  If compact, the traces are in the
+        compact encoding (see libcpychecker_html/compact.py), without any
+        indentation; if compress, the file is gzipped.
+        """
+        js = self.to_json(fun, compact)
+        from json import dumps
+        if compact:
+            text = dumps(js, sort_keys=True, separators=(',', ':'))
+        else:
+            text = dumps(js, sort_keys=True, indent=4)
+        if compress:
+            import gzip
+            f = gzip.open(filename, 'wb')
+        else:
+            f = open(filename, 'wb')
+        with f:
+            f.write(text.encode('utf-8'))
+        return text
 
     def to_html(self, fun):
         # (FIXME: eliminate self.fun from HtmlRenderer and the above arg)
@@ -161,30 +190,31 @@ class Reporter:
 
     def remove_duplicates(self):
         """
-        Try to organize Report instances into equivalence classes, and only
-        keep the first Report within each class
+        Add a note to each report about any duplicates of it that were found
+        (the duplicates themselves were discarded by make_warning)
         """
-        for report in self.reports[:]:
-            # The report might have been removed during the iteration:
-            if report.is_duplicate:
-                continue
-            for candidate in self.reports[:]:
-                if report != candidate and not report.is_duplicate:
-                    if candidate.is_duplicate_of(report):
-                        report.add_duplicate(candidate)
-                        self.reports.remove(candidate)
-
-        # Add a note to each report that survived about any duplicates:
+        if self._noted_duplicates:
+            return
+        self._noted_duplicates = True
         for report in self.reports:
-            if report.duplicates:
+            if report.num_duplicates:
                 report.add_note(report.loc,
                                 ('found %i similar trace(s) to this'
-                                 % len(report.duplicates)))
+                                 % report.num_duplicates))
 
     def flush(self):
         for r in self.reports:
             r.flush()
 
+    def get_saved_diagnostics(self):
+        """
+        Get the list of SavedDiagnostic instances that flush() emits
+        """
+        result = []
+        for r in self.reports:
+            result += r.get_saved_diagnostics()
+        return result
+
 class SavedDiagnostic:
     """
     A saved GCC diagnostic, which we can choose to emit or suppress at a later
@@ -196,13 +226,69 @@ class SavedDiagnostic:
         self.loc = loc
         self.msg = msg
 
+    def as_json(self):
+        return dict(kind=self.kind,
+                    file=self.loc.file,
+                    line=self.loc.line,
+                    column=self.loc.column,
+                    message=self.msg)
+
 class SavedWarning(SavedDiagnostic):
+    kind = 'warning'
+
     def flush(self):
-        gcc.warning(self.loc, self.msg)
+        warning(self.loc, self.msg)
 
 class SavedInform(SavedDiagnostic):
+    kind = 'inform'
+
     def flush(self):
-        gcc.inform(self.loc, self.msg)
+        inform(self.loc, self.msg)
+
+def saved_diagnostic_from_json(js, loc):
+    """
+    Recreate a SavedDiagnostic from the result of as_json(), given the
+    gcc.Location that it refers to
+    """
+    if js['kind'] == 'warning':
+        return SavedWarning(loc, str(js['message']))
+    else:
+        return SavedInform(loc, str(js['message']))
+
+# Diagnostics that are emitted directly whilst analyzing a function (rather
+# than being buffered within a Report) go through warning() and inform()
+# below.  These normally pass them straight on to GCC, but within a
+# DiagnosticCapture they are saved instead, so that they can be emitted
+# later, possibly in another process (e.g. when caching results, or when
+# analyzing functions in worker processes)
+_captures = []
+
+class DiagnosticCapture:
+    """
+    Context manager for saving the diagnostics emitted via warning() and
+    inform(), as a list of SavedDiagnostic instances
+    """
+    def __init__(self):
+        self.diagnostics = []
+
+    def __enter__(self):
+        _captures.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _captures.pop()
+
+def warning(loc, msg):
+    if _captures:
+        _captures[-1].diagnostics.append(SavedWarning(loc, msg))
+        return True
+    return gcc.warning(loc, msg)
+
+def inform(loc, msg):
+    if _captures:
+        _captures[-1].diagnostics.append(SavedInform(loc, msg))
+    else:
+        gcc.inform(loc, msg)
 
 class Report:
     """
@@ -215,11 +301,13 @@ class Report:
         self.trace = None
         self._annotators = {}
         self.notes = []
-        self._saved_diagnostics = [] # list of SavedDiagnostic
 
-        # De-duplication handling:
-        self.is_duplicate = False
-        self.duplicates = [] # list of Report
+        # list of SavedDiagnostic, or of PendingTrace for those traces that
+        # haven't yet been described:
+        self._saved_diagnostics = []
+
+        # Number of later reports that were duplicates of this one:
+        self.num_duplicates = 0
 
     def add_warning(self, loc, msg):
         # Add a gcc.warning() to the buffer of GCC diagnostics
@@ -231,13 +319,32 @@ class Report:
 
     def flush(self):
         # Flush the buffer of GCC diagnostics
-        for d in self._saved_diagnostics:
+        for d in self.get_saved_diagnostics():
             d.flush()
 
+    def get_saved_diagnostics(self):
+        """
+        Get the list of SavedDiagnostic for this report, describing any
+        traces that haven't been described yet
+        """
+        if any(isinstance(d, PendingTrace) for d in self._saved_diagnostics):
+            pending = self._saved_diagnostics
+            self._saved_diagnostics = []
+            for d in pending:
+                if isinstance(d, PendingTrace):
+                    # (appends to self._saved_diagnostics)
+                    describe_trace(d.trace, self, d.annotator)
+                else:
+                    self._saved_diagnostics.append(d)
+        return self._saved_diagnostics
+
     def add_trace(self, trace, annotator=None):
         self.trace = trace
         self._annotators[trace] = annotator
-        describe_trace(trace, self, annotator)
+        # Describing the trace is relatively expensive, so only do it when
+        # the diagnostics are needed, whilst preserving their ordering
+        # relative to any notes:
+        self._saved_diagnostics.append(PendingTrace(trace, annotator))
 
     def add_note(self, loc, msg):
         """
@@ -253,30 +360,11 @@ class Report:
     def get_annotator_for_trace(self, trace):
         return self._annotators.get(trace)
 
-    def is_duplicate_of(self, other):
-        check_isinstance(other, Report)
-
-        # Simplistic equivalence classes for now:
-        # the same function, source location, and message; everything
-        # else can be different
-        if self.fun != other.fun:
-            return False
-        if self.loc != other.loc:
-            return False
-        if self.msg != other.msg:
-            return False
-
-        return True
-
-    def add_duplicate(self, other):
-        assert not self.is_duplicate
-        self.duplicates.append(other)
-        other.is_duplicate = True
-
-    def to_json(self, fun):
+    def to_json(self, fun, compact=False):
         assert self.trace
         result = dict(message=self.msg,
                       severity='warning', # FIXME
+                      location=location_as_json(self.loc),
                       states=[])
         # Generate a list of (state, desc) pairs, putting the desc from the
         # transition into source state; the final state will have an empty
@@ -287,12 +375,49 @@ class Report:
         pairs.append( (self.trace.transitions[-1].dest, None) )
         for i, (s_iter, desc) in enumerate(pairs):
             result['states'].append(s_iter.as_json(desc))
+        if compact:
+            from libcpychecker_html.compact import compact_states
+            result['trace'] = compact_states(result.pop('states'))
         result['notes'] = [dict(location=location_as_json(note.loc),
                                 message=note.msg)
                            for note in self.notes]
         return result
 
 
+class PendingTrace:
+    """
+    A trace within a Report that hasn't yet been described as a series of
+    SavedInform
+    """
+    __slots__ = ('trace', 'annotator')
+
+    def __init__(self, trace, annotator):
+        self.trace = trace
+        self.annotator = annotator
+
+class DuplicateReport:
+    """
+    Stand-in for a Report that's a duplicate of an earlier one, as returned
+    by Reporter.make_warning.  It has the same interface as a Report, but
+    everything added to it is discarded.
+    """
+    __slots__ = ('original', )
+
+    def __init__(self, original):
+        self.original = original
+
+    def add_warning(self, loc, msg):
+        pass
+
+    def add_inform(self, loc, msg):
+        pass
+
+    def add_trace(self, trace, annotator=None):
+        pass
+
+    def add_note(self, loc, msg):
+        return Note(loc, msg)
+
 class Note:
     """
     A note within a self
@@ -0,0 +1,305 @@
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Persistent data structures, for use in storing the memory state within
+# each State of the abstract interpreter.
+#
+# Every transition creates a new State from an old one, typically changing
+# just one or two values.  Rather than copying the whole store each time,
+# the store is held in trees that are never modified in place: an update
+# builds new nodes along the path from the root to the changed entry, and
+# shares everything else with the old tree.
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+
+# Python hash values fit within 64 bits; beyond that, entries with equal
+# hashes are held in a list:
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+
+_missing = object()
+
+############################################################################
+# Hash array-mapped trie, mapping keys to values
+#
+# Each node is a dict mapping a 5-bit chunk of the hash to either:
+#   - a tuple (hash, key, value) for a single entry
+#   - a dict, for a child node (using the next 5 bits of the hash)
+#   - a list of (hash, key, value) tuples, for keys with identical hashes
+# Nodes are never modified once built.
+############################################################################
+
+def _keys_equal(a, b):
+    return a is b or a == b
+
+def _hamt_lookup(node, h, key):
+    shift = 0
+    while True:
+        entry = node.get((h >> shift) & _MASK)
+        if entry is None:
+            return _missing
+        if type(entry) is dict:
+            node = entry
+            shift += _BITS
+            continue
+        if type(entry) is tuple:
+            if entry[0] == h and _keys_equal(entry[1], key):
+                return entry[2]
+            return _missing
+        for eh, ekey, evalue in entry:
+            if _keys_equal(ekey, key):
+                return evalue
+        return _missing
+
+def _hamt_pair(shift, e1, e2):
+    """
+    Make a node holding the two entries e1 and e2 (with differing keys)
+    """
+    if shift >= _HASH_BITS:
+        return [e1, e2]
+    idx1 = (e1[0] >> shift) & _MASK
+    idx2 = (e2[0] >> shift) & _MASK
+    if idx1 == idx2:
+        return {idx1: _hamt_pair(shift + _BITS, e1, e2)}
+    return {idx1: e1, idx2: e2}
+
+def _hamt_insert(node, shift, h, key, value):
+    """
+    Get a new node with the key set to the value, and a bool: was the key
+    added (as opposed to replacing an existing entry)?
+    """
+    idx = (h >> shift) & _MASK
+    entry = node.get(idx)
+    node = dict(node)
+    if entry is None:
+        node[idx] = (h, key, value)
+        return node, True
+    if type(entry) is dict:
+        child, added = _hamt_insert(entry, shift + _BITS, h, key, value)
+        node[idx] = child
+        return node, added
+    if type(entry) is tuple:
+        if entry[0] == h and _keys_equal(entry[1], key):
+            node[idx] = (h, key, value)
+            return node, False
+        node[idx] = _hamt_pair(shift + _BITS, entry, (h, key, value))
+        return node, True
+    # A list of entries with identical hashes:
+    bucket = list(entry)
+    for i, (eh, ekey, evalue) in enumerate(bucket):
+        if _keys_equal(ekey, key):
+            bucket[i] = (h, key, value)
+            node[idx] = bucket
+            return node, False
+    bucket.append((h, key, value))
+    node[idx] = bucket
+    return node, True
+
+def _hamt_remove(node, shift, h, key):
+    """
+    Get a new node without the key (which must be present)
+    """
+    idx = (h >> shift) & _MASK
+    entry = node.get(idx)
+    if entry is None:
+        raise KeyError(key)
+    node = dict(node)
+    if type(entry) is dict:
+        child = _hamt_remove(entry, shift + _BITS, h, key)
+        if not child:
+            del node[idx]
+        elif len(child) == 1:
+            # Pull up a lone entry, keeping the trie shallow:
+            (only, ) = child.values()
+            if type(only) is tuple:
+                node[idx] = only
+            else:
+                node[idx] = child
+        else:
+            node[idx] = child
+        return node
+    if type(entry) is tuple:
+        if entry[0] == h and _keys_equal(entry[1], key):
+            del node[idx]
+            return node
+        raise KeyError(key)
+    bucket = [e for e in entry if not _keys_equal(e[1], key)]
+    if len(bucket) == len(entry):
+        raise KeyError(key)
+    if len(bucket) == 1:
+        node[idx] = bucket[0]
+    else:
+        node[idx] = bucket
+    return node
+
+############################################################################
+# Persistent vector, as a trie of lists of up to 32 items, indexed by
+# successive 5-bit chunks of the index (most significant first)
+############################################################################
+
+def _vec_set(node, shift, i, value):
+    node = list(node)
+    if shift == 0:
+        node[i & _MASK] = value
+    else:
+        idx = (i >> shift) & _MASK
+        node[idx] = _vec_set(node[idx], shift - _BITS, i, value)
+    return node
+
+def _vec_append(node, shift, i, value):
+    node = list(node)
+    if shift == 0:
+        node.append(value)
+    else:
+        idx = (i >> shift) & _MASK
+        if idx == len(node):
+            node.append(_vec_append([], shift - _BITS, i, value))
+        else:
+            node[idx] = _vec_append(node[idx], shift - _BITS, i, value)
+    return node
+
+def _vec_iter(node, shift):
+    if shift == 0:
+        for item in node:
+            yield item
+    else:
+        for child in node:
+            for item in _vec_iter(child, shift - _BITS):
+                yield item
+
+# Placeholder within the vector of keys for a key that has been deleted:
+_deleted = object()
+
+class PersistentOrderedDict(object):
+    """
+    A mapping that remembers insertion order, with the subset of the
+    OrderedDict interface used by the abstract interpreter, but which is
+    backed by persistent trees with structural sharing.
+
+    copy() is O(1), and lookups and updates are O(log n); an update only
+    ever affects this instance, not any copies made of it (or that it was
+    copied from).
+    """
+    __slots__ = ('_index',     # HAMT, mapping key -> (seq, value)
+                 '_order',     # vector, mapping seq -> key (or _deleted)
+                 '_shift',     # depth of the vector's trie, in bits
+                 '_nextseq',   # number of slots used within the vector
+                 '_len',       # number of live entries
+                 )
+
+    def __init__(self, items=None):
+        self._index = {}
+        self._order = []
+        self._shift = 0
+        self._nextseq = 0
+        self._len = 0
+        if items is not None:
+            if hasattr(items, 'items'):
+                items = items.items()
+            for key, value in items:
+                self[key] = value
+
+    def copy(self):
+        result = PersistentOrderedDict()
+        result._index = self._index
+        result._order = self._order
+        result._shift = self._shift
+        result._nextseq = self._nextseq
+        result._len = self._len
+        return result
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, key):
+        return _hamt_lookup(self._index, hash(key) & _HASH_MASK, key) is not _missing
+
+    def __getitem__(self, key):
+        entry = _hamt_lookup(self._index, hash(key) & _HASH_MASK, key)
+        if entry is _missing:
+            raise KeyError(key)
+        return entry[1]
+
+    def get(self, key, default=None):
+        entry = _hamt_lookup(self._index, hash(key) & _HASH_MASK, key)
+        if entry is _missing:
+            return default
+        return entry[1]
+
+    def __setitem__(self, key, value):
+        h = hash(key) & _HASH_MASK
+        entry = _hamt_lookup(self._index, h, key)
+        if entry is not _missing:
+            # Replace the value, keeping the key's position:
+            self._index, _ = _hamt_insert(self._index, 0, h, key,
+                                          (entry[0], value))
+            return
+        seq = self._nextseq
+        if seq == 1 << (self._shift + _BITS):
+            # The vector is full; add a level:
+            self._order = [self._order]
+            self._shift += _BITS
+        self._order = _vec_append(self._order, self._shift, seq, key)
+        self._nextseq += 1
+        self._index, _ = _hamt_insert(self._index, 0, h, key, (seq, value))
+        self._len += 1
+
+    def __delitem__(self, key):
+        h = hash(key) & _HASH_MASK
+        entry = _hamt_lookup(self._index, h, key)
+        if entry is _missing:
+            raise KeyError(key)
+        self._index = _hamt_remove(self._index, 0, h, key)
+        self._order = _vec_set(self._order, self._shift, entry[0], _deleted)
+        self._len -= 1
+        # Rebuild if the vector is mostly placeholders:
+        if self._nextseq > _WIDTH and self._nextseq > 2 * self._len:
+            self._compact()
+
+    def _compact(self):
+        items = self.items()
+        self._index = {}
+        self._order = []
+        self._shift = 0
+        self._nextseq = 0
+        self._len = 0
+        for key, value in items:
+            self[key] = value
+
+    def __iter__(self):
+        # Iterate over a snapshot, so that values can be updated (or keys
+        # deleted) during iteration:
+        for key in _vec_iter(self._order, self._shift):
+            if key is not _deleted:
+                yield key
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def __repr__(self):
+        return 'PersistentOrderedDict(%r)' % self.items()
+
+    def __str__(self):
+        return repr(self)
@@ -0,0 +1,164 @@
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+"""
+Instrumentation of the refcount checker, for finding out where the time
+goes when it runs on a build.
+
+When enabled, one line of JSON is appended for each function analyzed to
+a file named after the translation unit:
+   <dump base name>.cpychecker-profile.jsonl
+
+Each line is a dict giving the name and location of the function, the
+numbers of transitions explored, traces completed and State instances
+created, the wall-clock time spent in each phase of the analysis (building
+the StmtGraph, exploring traces, and reporting), and the calls to and time
+spent within each impl_* handler (i.e. in modelling each API entrypoint).
+"""
+
+import json
+import time
+
+import gcc
+
+from gccutils import check_isinstance
+from libcpychecker.utils import log
+
+try:
+    # Python 3.3 onwards:
+    get_cpu_time = time.process_time
+except AttributeError:
+    get_cpu_time = time.clock
+
+# Set by the gimple pass if profiling has been requested:
+enabled = False
+
+# The FunctionProfile for the function currently being analyzed (if any):
+_current = None
+
+def get_profile_filename():
+    return '%s.cpychecker-profile.jsonl' % gcc.get_dump_base_name()
+
+def enable():
+    """
+    Turn on profiling, starting a new file for this translation unit
+    """
+    global enabled
+    enabled = True
+    open(get_profile_filename(), 'w').close()
+
+class FunctionProfile(object):
+    """
+    Measurements of the refcount checker's work on one function
+    """
+    def __init__(self, fun):
+        check_isinstance(fun, gcc.Function)
+        self.funcname = fun.decl.name
+        self.loc = fun.start
+        self.start_time = time.time()
+
+        # Counts, filled in by the analysis:
+        self.transitions = 0
+        self.traces = 0
+        self.states = 0
+
+        # Mapping from the name of a phase to the time spent in it:
+        self.phases = {}
+
+        # Mapping from the name of an impl_* method to [calls, seconds]:
+        self.handlers = {}
+
+    def add_phase_time(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_handler_time(self, name, seconds):
+        entry = self.handlers.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def as_json(self):
+        if self.loc:
+            loc = dict(file=self.loc.file, line=self.loc.line)
+        else:
+            loc = None
+        return dict(function=self.funcname,
+                    location=loc,
+                    transitions=self.transitions,
+                    traces=self.traces,
+                    states=self.states,
+                    total_seconds=time.time() - self.start_time,
+                    phases=self.phases,
+                    handlers=dict((name, dict(calls=calls, seconds=seconds))
+                                  for name, (calls, seconds)
+                                  in self.handlers.items()))
+
+def begin_function(fun):
+    """
+    Start profiling the analysis of a function, returning the
+    FunctionProfile (or None if profiling is disabled)
+    """
+    global _current
+    if not enabled:
+        return None
+    _current = FunctionProfile(fun)
+    return _current
+
+def end_function(prof):
+    """
+    Finish profiling the analysis of a function, writing out its results
+    """
+    global _current
+    if prof is None:
+        return
+    _current = None
+    # (opened for each function, so that worker processes can safely append
+    # their own lines)
+    with open(get_profile_filename(), 'a') as f:
+        f.write(json.dumps(prof.as_json(), sort_keys=True) + '\n')
+    log('wrote profile for %s', prof.funcname)
+
+def get_current_profile():
+    return _current
+
+class Phase(object):
+    """
+    Context manager for measuring the time spent within one phase of the
+    analysis of the current function (if profiling)
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if _current:
+            self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if _current:
+            _current.add_phase_time(self.name, time.time() - self.start)
+
+def call_handler(prof, methname, meth, *args):
+    """
+    Call an impl_* method, recording the time spent in it
+    """
+    start = time.time()
+    try:
+        return meth(*args)
+    finally:
+        prof.add_handler_time(methname, time.time() - start)
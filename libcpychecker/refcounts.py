@@ -29,7 +29,9 @@ from libcpychecker.absinterp import *
 from libcpychecker.attributes import fnnames_returning_borrowed_refs, \
     stolen_refs_by_fnname, fnnames_setting_exception, \
     fnnames_setting_exception_on_negative_result
-from libcpychecker.diagnostics import Reporter, Annotator, Note
+from libcpychecker.diagnostics import Reporter, Annotator, Note, \
+    DiagnosticCapture
+from libcpychecker import diagnostics
 from libcpychecker.PyArg_ParseTuple import PyArgParseFmt, FormatStringWarning,\
     TypeCheckCheckerType, TypeCheckResultType, \
     ConverterCallbackType, ConverterResultType
@@ -38,7 +40,12 @@ from libcpychecker.Py_BuildValue import PyBuildValueFmt, ObjectFormatUnit, \
 from libcpychecker.types import is_py3k, is_debug_build, get_PyObjectPtr, \
     get_Py_ssize_t
 from libcpychecker.utils import log
+from libcpychecker.profiling import Phase, get_current_profile, \
+    begin_function, end_function, get_cpu_time
 from libcpychecker import compat
+from libcpychecker.tureport import get_report as get_tu_report
+from libcpychecker.sarif import get_writer as get_sarif_writer
+from libcpychecker.warningdb import get_recorder as get_warning_recorder
 
 def stmt_is_assignment_to_count(stmt):
     if hasattr(stmt, 'lhs'):
@@ -294,6 +301,15 @@ class RefcountValue(AbstractValue):
     """
     __slots__ = ('r_obj', 'relvalue', 'external')
 
+    def __new__(cls, loc, r_obj, relvalue, external):
+        # Values that don't have a Region yet get one assigned later (see
+        # make_sane_object), so can't be interned:
+        if r_obj is None:
+            return AbstractValue.__new__(cls)
+        return get_interned_value(cls, (loc, r_obj, relvalue,
+                                        external.gcctype, external.loc,
+                                        external.minvalue, external.maxvalue))
+
     def __init__(self, loc, r_obj, relvalue, external):
         if loc:
             check_isinstance(loc, gcc.Location)
@@ -418,12 +434,50 @@ class RefcountValue(AbstractValue):
                 if self.get_min_value() > rhs.value:
                     return True
 
+    def merge(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        # As with widen, the references owned by this function must match
+        # exactly; the bounds on the external references are combined (e.g.
+        # where a reference was stolen on only one of the paths):
+        if isinstance(v_other, RefcountValue):
+            if (self.r_obj is v_other.r_obj
+                and self.relvalue == v_other.relvalue):
+                minvalue = min(self.external.minvalue,
+                               v_other.external.minvalue)
+                maxvalue = max(self.external.maxvalue,
+                               v_other.external.maxvalue)
+                if (minvalue == self.external.minvalue
+                    and maxvalue == self.external.maxvalue):
+                    return self
+                return RefcountValue(self.loc, self.r_obj, self.relvalue,
+                                     WithinRange(self.external.gcctype,
+                                                 self.loc,
+                                                 minvalue, maxvalue))
+
+    def widen(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        # The references owned by this function must match exactly, or we'd
+        # lose track of leaks; only the bound on the external references can
+        # be widened:
+        if isinstance(v_other, RefcountValue):
+            if (self.r_obj is v_other.r_obj
+                and self.relvalue == v_other.relvalue):
+                external = self.external.widen(v_other.external)
+                if external is None:
+                    return None
+                if external is self.external:
+                    return self
+                return RefcountValue(self.loc, self.r_obj,
+                                     self.relvalue, external)
+
 
 class GenericTpDealloc(AbstractValue):
     """
     A function pointer that points to a "typical" tp_dealloc callback
     i.e. one that frees up the underlying memory
     """
+    __slots__ = ()
+
     def get_transitions_for_function_call(self, state, stmt):
         check_isinstance(state, State)
         check_isinstance(stmt, gcc.GimpleCall)
@@ -455,6 +509,11 @@ class GenericTpDealloc(AbstractValue):
 
         return [Transition(state, s_new, desc)]
 
+    def merge(self, v_other):
+        check_isinstance(v_other, AbstractValue)
+        if isinstance(v_other, GenericTpDealloc):
+            return self
+
 
 ########################################################################
 # Helper functions to generate meaningful explanations of why a NULL
@@ -508,6 +567,17 @@ class CPython(Facet):
                         self.has_gil)
         return f_new
 
+    def merge(self, f_other):
+        check_isinstance(f_other, CPython)
+        if self.has_gil != f_other.has_gil:
+            return None
+        v_exception = self.exception_rvalue.merge(f_other.exception_rvalue)
+        if v_exception is None:
+            return None
+        if v_exception is self.exception_rvalue:
+            return self
+        return CPython(self.state, v_exception, self.has_gil)
+
     def init_for_function(self, fun):
         log('CPython.init_for_function(%r)', fun)
 
@@ -1573,14 +1643,6 @@ class CPython(Facet):
                 t_notfound]
                 #t_memoryexc]
 
-    def impl_PyDict_New(self, stmt):
-        fnmeta = FnMeta(name='PyDict_New',
-                        docurl='http://docs.python.org/c-api/dict.html#PyDict_New')
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyDictObject',
-                                                          'PyDict_Type')
-        return [t_success, t_failure]
-
     def _handle_PyDict_SetItem(self, stmt, fnmeta,
                                v_dp, v_key, v_item):
         s_success = self.state.mkstate_concrete_return_of(stmt, 0)
@@ -1682,20 +1744,6 @@ class CPython(Facet):
         t_next.dest.cpython.exception_rvalue = v_exc
         return [t_next]
 
-    def impl_PyErr_NewException(self, stmt, v_name, v_base, v_dict):
-        fnmeta = FnMeta(name='PyErr_NewException',
-                        docurl='http://docs.python.org/c-api/exceptions.html#PyErr_NewException',
-                        prototype=('PyObject*\n'
-                                   'Err_NewException(char *name, PyObject *base, PyObject *dict)'),
-                        defined_in='Python/errors.c',
-                        notes='Return value: New reference (or NULL e.g. MemoryError)')
-
-        self.state.raise_any_null_ptr_func_arg(stmt, 0, v_name)
-        # "base" and "dict" may be NULL
-
-        return self.make_transitions_for_new_ref_or_fail(stmt, fnmeta,
-                        objname='new exception object from %s' % fnmeta.name)
-
     def impl_PyErr_NoMemory(self, stmt):
         fnmeta = FnMeta(name='PyErr_NoMemory',
                         docurl='http://docs.python.org/c-api/exceptions.html#PyErr_NoMemory',
@@ -2077,34 +2125,6 @@ class CPython(Facet):
         # For now, treat it as a no-op:
         return [self.state.mktrans_nop(stmt, 'PyGILState_Release')]
 
-    ########################################################################
-    # PyImport_*
-    ########################################################################
-    def impl_PyImport_AddModule(self, stmt, v_name):
-        fnmeta = FnMeta(name='PyImport_AddModule',
-                        docurl='http://docs.python.org/c-api/import.html#PyImport_AddModule')
-        # used by cython-generated modules
-        # returns a borrowed ref (or NULL+exc)
-        return self.make_transitions_for_borrowed_ref_or_fail(stmt, fnmeta)
-
-    def impl_PyImport_AppendInittab(self, stmt, v_name, v_initfunc):
-        fnmeta = FnMeta(name='PyImport_AppendInittab',
-                        docurl='http://docs.python.org/c-api/import.html#PyImport_AppendInittab')
-        s_success = self.state.mkstate_concrete_return_of(stmt, 0)
-        s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        # (doesn't set an exception on failure, and Py_Initialize shouldn't
-        # have been called yet, in any case)
-        return self.state.make_transitions_for_fncall(stmt, fnmeta,
-                                                      s_success, s_failure)
-
-    def impl_PyImport_ImportModule(self, stmt, v_name):
-        fnmeta = FnMeta(name='PyImport_ImportModule',
-                        docurl='http://docs.python.org/c-api/import.html#PyImport_ImportModule')
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyModuleObject',
-                                                          'PyModule_Type')
-        return [t_success, t_failure]
-
     ########################################################################
     # Py_Initialize*
     ########################################################################
@@ -2301,23 +2321,6 @@ class CPython(Facet):
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
 
-    def impl_PyList_GetItem(self, stmt, v_list, v_index):
-        fnmeta = FnMeta(name='PyList_GetItem',
-                        docurl='http://docs.python.org/c-api/list.html#PyList_GetItem',
-                        prototype='PyObject* PyList_GetItem(PyObject *list, Py_ssize_t index)',
-                        defined_in='Objects/listobject.c',
-                        notes='Returns a borrowed reference, or raises an IndexError')
-
-        self.state.raise_any_null_ptr_func_arg(stmt, 0, v_list,
-                                               why=invokes_Py_TYPE_via_macro(fnmeta,
-                                                                             'PyList_Check'))
-
-        # FIXME: for now, simply return a borrowed ref, rather than
-        # trying to track indices and the array:
-        s_success = self.mkstate_borrowed_ref(stmt,
-                                              fnmeta)
-        return [Transition(self.state, s_success, None)]
-
     def impl_PyList_New(self, stmt, v_len):
         fnmeta = FnMeta(name='PyList_New',
                         docurl='http://docs.python.org/c-api/list.html#PyList_New',
@@ -2409,45 +2412,6 @@ class CPython(Facet):
                                        fnmeta.desc_when_call_returns_value('ob_size'))
         return [t_return]
 
-    ########################################################################
-    # PyLong_*
-    ########################################################################
-    def impl_PyLong_FromLong(self, stmt, v_long):
-        fnmeta = FnMeta(name='PyLong_FromLong',
-                        docurl='http://docs.python.org/c-api/long.html#PyLong_FromLong')
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyLongObject',
-                                                          'PyLong_Type')
-        return [t_success, t_failure]
-
-    def impl_PyLong_FromLongLong(self, stmt, v_v):
-        fnmeta = FnMeta(name='PyLong_FromLongLong',
-                        docurl='http://docs.python.org/c-api/long.html#PyLong_FromLongLong',
-                        prototype='PyObject* PyLong_FromLongLong(PY_LONG_LONG v)')
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyLongObject',
-                                                          'PyLong_Type')
-        return [t_success, t_failure]
-
-    def impl_PyLong_FromString(self, stmt, v_str, v_pend, v_base):
-        fnmeta = FnMeta(name='PyLong_FromString',
-                        declared_in='longobject.h',
-                        prototype='PyAPI_FUNC(PyObject *) PyLong_FromString(char *, char **, int);',
-                        defined_in='Objects/longobject.c',
-                        docurl='http://docs.python.org/c-api/long.html#PyLong_FromString')
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyLongObject',
-                                                          'PyLong_Type')
-        return [t_success, t_failure]
-
-    def impl_PyLong_FromVoidPtr(self, stmt, v_p):
-        fnmeta = FnMeta(name='PyLong_FromVoidPtr',
-                        docurl='http://docs.python.org/c-api/long.html#PyLong_FromVoidPtr')
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyLongObject',
-                                                          'PyLong_Type')
-        return [t_success, t_failure]
-
     ########################################################################
     # PyMapping_*
     ########################################################################
@@ -2530,20 +2494,6 @@ class CPython(Facet):
     ########################################################################
     # PyModule_*
     ########################################################################
-    def impl_PyModule_AddIntConstant(self, stmt, v_module, v_name, v_value):
-        fnmeta = FnMeta(name='PyModule_AddIntConstant',
-                        docurl='http://docs.python.org/c-api/module.html#PyModule_AddIntConstant')
-
-        # (No externally-visible refcount changes)
-        s_success = self.state.mkstate_concrete_return_of(stmt, 0)
-
-        # Can fail with memory error, overflow error:
-        s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc)
-
-        return self.state.make_transitions_for_fncall(stmt, fnmeta,
-                                                      s_success, s_failure)
-
     def impl_PyModule_AddObject(self, stmt, v_module, v_name, v_value):
         fnmeta = FnMeta(name='PyModule_AddObject',
                         docurl='http://docs.python.org/c-api/module.html#PyModule_AddObject',
@@ -2573,29 +2523,6 @@ class CPython(Facet):
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
 
-    def impl_PyModule_AddStringConstant(self, stmt, v_module, v_name, v_value):
-        fnmeta = FnMeta(name='PyModule_AddStringConstant',
-                        docurl='http://docs.python.org/c-api/module.html#PyModule_AddStringConstant',)
-
-        # (No externally-visible refcount changes)
-        s_success = self.state.mkstate_concrete_return_of(stmt, 0)
-
-        # Can fail with memory error, overflow error:
-        s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc)
-
-        return self.state.make_transitions_for_fncall(stmt, fnmeta,
-                                                      s_success, s_failure)
-
-    def impl_PyModule_GetDict(self, stmt, v_module):
-        fnmeta = FnMeta(name='PyModule_GetDict',
-                        docurl='http://docs.python.org/c-api/module.html#PyModule_GetDict',
-                        prototype='PyObject* PyModule_GetDict(PyObject *module)',
-                        notes='Returns a borrowed reference.  Always succeeds')
-
-        s_success = self.mkstate_borrowed_ref(stmt, fnmeta)
-        return [Transition(self.state, s_success, None)]
-
     ########################################################################
     # PyNumber_*
     ########################################################################
@@ -2689,18 +2616,6 @@ class CPython(Facet):
                                        'when %s() returns' % fnmeta.name)
         return [t_return]
 
-    def impl_PyObject_Call(self, stmt, v_o, v_args, v_kw):
-        fnmeta = FnMeta(name='PyObject_Call',
-                        docurl='http://docs.python.org/c-api/object.html#PyObject_Call',
-                        defined_in='Objects/abstract.c',
-                        prototype=('PyObject *\n'
-                                   'PyObject_Call(PyObject *func, PyObject *arg, PyObject *kw)'))
-        # "func" and "args" must not be NULL, but "kw" can be:
-        self.state.raise_any_null_ptr_func_arg(stmt, 0, v_o,
-                                               why='looks up func->ob_type')
-        self.state.raise_any_null_ptr_func_arg(stmt, 1, v_args)
-        return self.make_transitions_for_new_ref_or_fail(stmt, fnmeta)
-
     def impl_PyObject_CallFunction(self, stmt, v_callable, v_format, *args):
         fnmeta = FnMeta(name='PyObject_CallFunction',
                         docurl='http://docs.python.org/c-api/object.html#PyObject_CallFunction',
@@ -2739,15 +2654,15 @@ class CPython(Facet):
                 loc = v_arg.loc
                 if not loc:
                     loc = stmt.loc
-                gcc.warning(loc,
-                            ('argument %i had type %s but was expecting a PyObject* (or subclass)'
-                             % (i + base_idx + 1, v_arg.gcctype)))
+                diagnostics.warning(loc,
+                                    ('argument %i had type %s but was expecting a PyObject* (or subclass)'
+                                     % (i + base_idx + 1, v_arg.gcctype)))
 
         # check NULL-termination:
         if not args or not args[-1].is_null_ptr():
-            gcc.warning(stmt.loc,
-                        ('arguments to %s were not NULL-terminated'
-                         % fnmeta.name))
+            diagnostics.warning(stmt.loc,
+                                ('arguments to %s were not NULL-terminated'
+                                 % fnmeta.name))
 
     def impl_PyObject_CallFunctionObjArgs(self, stmt, v_callable, *args):
         fnmeta = FnMeta(name='PyObject_CallFunctionObjArgs',
@@ -2804,46 +2719,6 @@ class CPython(Facet):
 
         return self.make_transitions_for_new_ref_or_fail(stmt, fnmeta)
 
-    def impl_PyObject_CallObject(self, stmt, v_o, v_args):
-        fnmeta = FnMeta(name='PyObject_CallObject',
-                        docurl='http://docs.python.org/c-api/object.html#PyObject_CallObject',
-                        defined_in='Objects/abstract.c',
-                        prototype=('PyAPI_FUNC(PyObject *) PyObject_CallObject(PyObject *callable_object,\n'
-                                   '                                           PyObject *args);'))
-        # internally, is just:
-        #    return PyEval_CallObjectWithKeywords(o, a, NULL);
-
-        # args can be NULL, but the callable obj can't be:
-        self.state.raise_any_null_ptr_func_arg(stmt, 0, v_o,
-                                               why=('%s() looks up func->ob_type (within PyObject_Call'
-                                                    ' within PyEval_CallObjectWithKeywords)'
-                                                    % fnmeta.name))
-        return self.make_transitions_for_new_ref_or_fail(stmt, fnmeta)
-
-    def impl_PyObject_GetAttr(self, stmt, v_v, v_name):
-        fnmeta = FnMeta(name='PyObject_GetAttr',
-                        docurl='http://docs.python.org/c-api/object.html#PyObject_GetAttr',
-                        defined_in='Objects/object.c',
-                        prototype='PyObject* PyObject_GetAttr(PyObject *o, PyObject *attr_name)')
-        self.state.raise_any_null_ptr_func_arg(stmt, 0, v_v,
-               why=invokes_Py_TYPE(fnmeta))
-        self.state.raise_any_null_ptr_func_arg(stmt, 1, v_name,
-               why=invokes_Py_TYPE_via_macro(fnmeta, 'PyString_Check'))
-        return self.make_transitions_for_new_ref_or_fail(stmt, fnmeta)
-
-    def impl_PyObject_GetAttrString(self, stmt, v_v, v_name):
-        fnmeta = FnMeta(name='PyObject_GetAttrString',
-                        docurl='http://docs.python.org/c-api/object.html#PyObject_GetAttrString',
-                        defined_in='Objects/object.c',
-                        prototype='PyObject* PyObject_GetAttrString(PyObject *v, const char *name)')
-        self.state.raise_any_null_ptr_func_arg(stmt, 0, v_v,
-               why=invokes_Py_TYPE(fnmeta))
-        self.state.raise_any_null_ptr_func_arg(stmt, 1, v_name,
-                                               why=('%s() can call PyString_InternFromString(), '
-                                                    'which calls PyString_FromString(), '
-                                                    'which requires a non-NULL pointer' % fnmeta.name))
-        return self.make_transitions_for_new_ref_or_fail(stmt, fnmeta)
-
     def impl_PyObject_GetItem(self, stmt, v_o, v_key):
         fnmeta = FnMeta(name='PyObject_GetItem',
                         docurl='http://docs.python.org/c-api/object.html#PyObject_GetItem',
@@ -2975,16 +2850,6 @@ class CPython(Facet):
         t_failure.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
         return [t_success, t_failure]
 
-    def impl_PyObject_Repr(self, stmt, v_o):
-        fnmeta = FnMeta(name='PyObject_Repr',
-                        declared_in='object.h',
-                        prototype='PyAPI_FUNC(PyObject *) PyObject_Repr(PyObject *);',
-                        docurl='http://docs.python.org/c-api/object.html#PyObject_Repr')
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyStringObject',
-                                                          'PyString_Type')
-        return [t_success, t_failure]
-
     def impl_PyObject_SetAttr(self, stmt,
                               v_o, v_attr_name, v_v):
         fnmeta = FnMeta(name='PyObject_SetAttr',
@@ -3032,18 +2897,6 @@ class CPython(Facet):
 
         return fncall.get_transitions()
 
-    def impl_PyObject_Str(self, stmt, v_o):
-        fnmeta = FnMeta(name='PyObject_Str',
-                        docurl='http://docs.python.org/c-api/object.html#PyObject_Str',
-                        declared_in='object.h')
-        #  PyAPI_FUNC(PyObject *) PyObject_Str(PyObject *);
-        # also with:
-        #  #define PyObject_Bytes PyObject_Str
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyStringObject',
-                                                          'PyString_Type')
-        return [t_success, t_failure]
-
     ########################################################################
     # PyOS_*
     ########################################################################
@@ -3130,27 +2983,6 @@ class CPython(Facet):
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
 
-    def impl_PySequence_GetItem(self, stmt, v_o, v_i):
-        fnmeta = FnMeta(name='PySequence_GetItem',
-                        docurl='http://docs.python.org/c-api/sequence.html#PySequence_GetItem',
-                        declared_in='abstract.h',
-                        prototype='PyAPI_FUNC(PyObject *) PySequence_GetItem(PyObject *o, Py_ssize_t i);',
-                        defined_in='Objects/abstract.c')
-        #   PyObject *
-        #   PySequence_GetItem(PyObject *s, Py_ssize_t i)
-        #   {
-        #      [... setup and error handling ...]
-        #      return m->sq_item(s, i);
-        #   }
-        #
-        # When it succeeds, it returns a new reference; see e.g.
-        # Objects/listobject.c: list_item (the sq_item callback for
-        # PyList_Type): it Py_INCREFs the returned item.
-
-        return self.make_transitions_for_new_ref_or_fail(stmt,
-                                                         fnmeta,
-                                                         'new ref from %s' % fnmeta.name)
-
     def impl_PySequence_GetSlice(self, stmt, v_o, v_i1, v_i2):
         fnmeta = FnMeta(name='PySequence_GetSlice',
                         docurl='http://docs.python.org/c-api/sequence.html#PySequence_GetSlice',
@@ -3372,50 +3204,6 @@ class CPython(Facet):
                                                           'PyString_Type')
         return [t_success, t_failure]
 
-    def impl_PyString_FromString(self, stmt, v_str):
-        fnmeta = FnMeta(name='PyString_FromString',
-                        declared_in='stringobject.h',
-                        prototype='PyAPI_FUNC(PyObject *) PyString_FromString(const char *);',
-                        docurl='http://docs.python.org/c-api/string.html#PyString_FromString')
-        # The input _must_ be non-NULL; it is not checked:
-        self.state.raise_any_null_ptr_func_arg(stmt, 0, v_str)
-
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyStringObject',
-                                                          'PyString_Type')
-        return [t_success, t_failure]
-
-    def impl_PyString_FromStringAndSize(self, stmt, v_str, v_size):
-        fnmeta = FnMeta(name='PyString_FromStringAndSize',
-                        declared_in='stringobject.h',
-                        prototype='PyAPI_FUNC(PyObject *) PyString_FromStringAndSize(const char *, Py_ssize_t);',
-                        docurl='http://docs.python.org/c-api/string.html#PyString_FromStringAndSize',
-                        defined_in='Objects/stringobject.c')
-        #   # PyObject *
-        #   PyString_FromStringAndSize(const char *str, Py_ssize_t size)
-
-        # v_str, v_size = self.state.eval_stmt_args(stmt)
-        # (the input can legitimately be NULL)
-
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyStringObject',
-                                                          'PyString_Type')
-        return [t_success, t_failure]
-
-    def impl_PyString_InternFromString(self, stmt, v_v):
-        fnmeta = FnMeta(name='PyString_InternFromString',
-                        declared_in='stringobject.h',
-                        prototype='PyObject* PyString_InternFromString(const char *v)',
-                        defined_in='Objects/stringobject.c',
-                        docurl='http://docs.python.org/c-api/string.html#PyString_InternFromString')
-        self.state.raise_any_null_ptr_func_arg(stmt, 0, v_v,
-               why=('%s() calls PyString_FromString(), '
-                    'which requires a non-NULL pointer' % fnmeta.name))
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyStringObject',
-                                                          'PyString_Type')
-        return [t_success, t_failure]
-
     def impl_PyString_Size(self, stmt, v_string):
         fnmeta = FnMeta(name='PyString_Size',
                         docurl='http://docs.python.org/c-api/string.html#PyString_Size',
@@ -3545,19 +3333,6 @@ class CPython(Facet):
     ########################################################################
     # PyTuple_*
     ########################################################################
-    def impl_PyTuple_GetItem(self, stmt, v_op, v_i):
-        fnmeta = FnMeta(name='PyTuple_GetItem',
-                        docurl='http://docs.python.org/c-api/tuple.html#PyTuple_GetItem',
-                        defined_in='Objects/tupleobject.c')
-        self.state.raise_any_null_ptr_func_arg(stmt, 0, v_op,
-                   why=invokes_Py_TYPE_via_macro(fnmeta,
-                                                 'PyTuple_Check'))
-        # FIXME: for now, simply return a borrowed ref, rather than
-        # trying to track indices and the array:
-        s_success = self.mkstate_borrowed_ref(stmt,
-                                              fnmeta)
-        return [Transition(self.state, s_success, None)]
-
     def impl_PyTuple_New(self, stmt, v_len):
         fnmeta = FnMeta(name='PyTuple_New',
                         docurl='http://docs.python.org/c-api/tuple.html#PyTuple_New')
@@ -3723,17 +3498,6 @@ class CPython(Facet):
                                         UnknownValue.make(returntype, stmt.loc),
                                         None)]
 
-    def impl_PyType_Ready(self, stmt, v_type):
-        fnmeta = FnMeta(name='PyType_Ready',
-                        docurl='http://docs.python.org/dev/c-api/type.html#PyType_Ready')
-        s_success = self.state.mkstate_concrete_return_of(stmt, 0)
-
-        s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc) # various possible errors
-
-        return self.state.make_transitions_for_fncall(stmt, fnmeta,
-                                                      s_success, s_failure)
-
     ########################################################################
     # PyUnicode_*
     ########################################################################
@@ -3752,19 +3516,6 @@ class CPython(Facet):
     def impl_PyUnicodeUCS4_AsUTF8String(self, stmt, v_unicode):
         return self.impl_PyUnicode_AsUTF8String(stmt, v_unicode)
 
-    def impl_PyUnicode_DecodeUTF8(self, stmt, v_s, v_size, v_errors):
-        fnmeta = FnMeta(name='PyUnicode_DecodeUTF8',
-                        docurl='http://docs.python.org/c-api/unicode.html#PyUnicode_DecodeUTF8',
-                        prototype=('PyObject *\n'
-                                   'PyUnicode_DecodeUTF8(const char *s,\n'
-                                   '                     Py_ssize_t size,\n'
-                                   '                     const char *errors)'),
-                        defined_in='Objects/unicodeobject.c')
-        r_newobj, t_success, t_failure = self.object_ctor(stmt,
-                                                          'PyUnicodeObject',
-                                                          'PyUnicode_Type')
-        return [t_success, t_failure]
-
     def impl_PyUnicodeUCS4_DecodeUTF8(self, stmt, v_s, v_size, v_errors):
         return self.impl_PyUnicode_DecodeUTF8(stmt, v_s, v_size, v_errors)
 
@@ -3821,6 +3572,344 @@ class CPython(Facet):
         return result
 
 
+############################################################################
+# "Simple" API entrypoints
+############################################################################
+# Many of the entrypoints of the CPython API follow one of a few common
+# patterns.  Rather than hand-writing an impl_* method for each of these,
+# they are described by the table below, and the corresponding impl_*
+# methods of the CPython facet are generated from it.
+
+# The possible return behaviors of a simple entrypoint:
+
+# Returns a new reference, or NULL with an exception set:
+RETURNS_NEW_REF = 'new-ref'
+
+# As above, where the new reference is to a newly-created object of a known
+# type ("objtype"):
+RETURNS_NEW_OBJECT = 'new-object'
+
+# Returns a borrowed reference, or NULL with an exception set:
+RETURNS_BORROWED_REF_OR_NULL = 'borrowed-ref-or-null'
+
+# Returns a borrowed reference; can't fail:
+RETURNS_BORROWED_REF = 'borrowed-ref'
+
+# Returns 0 on success, or -1 on failure (setting "exception", if given):
+RETURNS_INT_WITH_ERROR = 'int-with-error'
+
+class SimpleFunction(object):
+    """
+    A description of an API entrypoint that's simple enough to be modelled
+    from data alone
+    """
+    __slots__ = ('fnmeta',
+                 'returns', # one of the RETURNS_* values above
+                 'nonnull_args', # list of (idx, why) pairs for arguments
+                                 # that must not be NULL, where idx is the
+                                 # 0-based index of the argument, and "why" is
+                                 # None, a string, or a function taking the
+                                 # FnMeta and returning a string
+                 'steals', # list of 0-based indices of arguments that the
+                           # entrypoint steals a reference to
+                 'objtype', # (typename, typeobjname) for RETURNS_NEW_OBJECT
+                 'objname', # optional name for the object, for
+                            # RETURNS_NEW_REF
+                 'exception', # name of the exception set on failure, for
+                              # RETURNS_INT_WITH_ERROR
+                 )
+
+    def __init__(self, fnmeta, returns, nonnull_args=(), steals=(),
+                 objtype=None, objname=None, exception=None):
+        check_isinstance(fnmeta, FnMeta)
+        assert returns in (RETURNS_NEW_REF, RETURNS_NEW_OBJECT,
+                           RETURNS_BORROWED_REF_OR_NULL, RETURNS_BORROWED_REF,
+                           RETURNS_INT_WITH_ERROR)
+        if returns == RETURNS_NEW_OBJECT:
+            check_isinstance(objtype, tuple)
+        self.fnmeta = fnmeta
+        self.returns = returns
+        self.nonnull_args = nonnull_args
+        self.steals = steals
+        self.objtype = objtype
+        self.objname = objname
+        self.exception = exception
+
+    def get_transitions(self, cpython, stmt, *args):
+        """
+        Implementation of the generated impl_* method, for the given CPython
+        facet
+        """
+        check_isinstance(cpython, CPython)
+        fnmeta = self.fnmeta
+        state = cpython.state
+
+        for idx, why in self.nonnull_args:
+            if callable(why):
+                why = why(fnmeta)
+            state.raise_any_null_ptr_func_arg(stmt, idx, args[idx], why=why)
+
+        if self.returns == RETURNS_NEW_REF:
+            result = cpython.make_transitions_for_new_ref_or_fail(stmt, fnmeta,
+                                                                  self.objname)
+        elif self.returns == RETURNS_NEW_OBJECT:
+            typename, typeobjname = self.objtype
+            r_newobj, t_success, t_failure = cpython.object_ctor(stmt,
+                                                                 typename,
+                                                                 typeobjname)
+            result = [t_success, t_failure]
+        elif self.returns == RETURNS_BORROWED_REF_OR_NULL:
+            result = cpython.make_transitions_for_borrowed_ref_or_fail(stmt,
+                                                                       fnmeta)
+        elif self.returns == RETURNS_BORROWED_REF:
+            s_success = cpython.mkstate_borrowed_ref(stmt, fnmeta)
+            result = [Transition(state, s_success, None)]
+        else:
+            s_success = state.mkstate_concrete_return_of(stmt, 0)
+            s_failure = state.mkstate_concrete_return_of(stmt, -1)
+            if self.exception:
+                s_failure.cpython.set_exception(self.exception, stmt.loc)
+            result = state.make_transitions_for_fncall(stmt, fnmeta,
+                                                       s_success, s_failure)
+
+        for idx in self.steals:
+            v_arg = args[idx]
+            if isinstance(v_arg, PointerToRegion):
+                for t_iter in result:
+                    t_iter.dest.cpython.steal_reference(v_arg, stmt.loc)
+
+        return result
+
+simple_functions = [
+    # PyDict_*
+    SimpleFunction(FnMeta(name='PyDict_New',
+                          docurl='http://docs.python.org/c-api/dict.html#PyDict_New'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyDictObject', 'PyDict_Type')),
+
+    # PyErr_*
+    SimpleFunction(FnMeta(name='PyErr_NewException',
+                          docurl='http://docs.python.org/c-api/exceptions.html#PyErr_NewException',
+                          prototype=('PyObject*\n'
+                                     'Err_NewException(char *name, PyObject *base, PyObject *dict)'),
+                          defined_in='Python/errors.c',
+                          notes='Return value: New reference (or NULL e.g. MemoryError)'),
+                   RETURNS_NEW_REF,
+                   # "base" and "dict" may be NULL:
+                   nonnull_args=[(0, None)],
+                   objname='new exception object from PyErr_NewException'),
+
+    # PyImport_*
+    # (PyImport_AddModule is used by cython-generated modules)
+    SimpleFunction(FnMeta(name='PyImport_AddModule',
+                          docurl='http://docs.python.org/c-api/import.html#PyImport_AddModule'),
+                   RETURNS_BORROWED_REF_OR_NULL),
+    # (PyImport_AppendInittab doesn't set an exception on failure, and
+    # Py_Initialize shouldn't have been called yet, in any case)
+    SimpleFunction(FnMeta(name='PyImport_AppendInittab',
+                          docurl='http://docs.python.org/c-api/import.html#PyImport_AppendInittab'),
+                   RETURNS_INT_WITH_ERROR),
+    SimpleFunction(FnMeta(name='PyImport_ImportModule',
+                          docurl='http://docs.python.org/c-api/import.html#PyImport_ImportModule'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyModuleObject', 'PyModule_Type')),
+
+    # PyList_*
+    # FIXME: for now, PyList_GetItem simply returns a borrowed ref, rather
+    # than trying to track indices and the array:
+    SimpleFunction(FnMeta(name='PyList_GetItem',
+                          docurl='http://docs.python.org/c-api/list.html#PyList_GetItem',
+                          prototype='PyObject* PyList_GetItem(PyObject *list, Py_ssize_t index)',
+                          defined_in='Objects/listobject.c',
+                          notes='Returns a borrowed reference, or raises an IndexError'),
+                   RETURNS_BORROWED_REF,
+                   nonnull_args=[(0, lambda fnmeta:
+                                      invokes_Py_TYPE_via_macro(fnmeta,
+                                                                'PyList_Check'))]),
+
+    # PyLong_*
+    SimpleFunction(FnMeta(name='PyLong_FromLong',
+                          docurl='http://docs.python.org/c-api/long.html#PyLong_FromLong'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyLongObject', 'PyLong_Type')),
+    SimpleFunction(FnMeta(name='PyLong_FromLongLong',
+                          docurl='http://docs.python.org/c-api/long.html#PyLong_FromLongLong',
+                          prototype='PyObject* PyLong_FromLongLong(PY_LONG_LONG v)'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyLongObject', 'PyLong_Type')),
+    SimpleFunction(FnMeta(name='PyLong_FromString',
+                          declared_in='longobject.h',
+                          prototype='PyAPI_FUNC(PyObject *) PyLong_FromString(char *, char **, int);',
+                          defined_in='Objects/longobject.c',
+                          docurl='http://docs.python.org/c-api/long.html#PyLong_FromString'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyLongObject', 'PyLong_Type')),
+    SimpleFunction(FnMeta(name='PyLong_FromVoidPtr',
+                          docurl='http://docs.python.org/c-api/long.html#PyLong_FromVoidPtr'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyLongObject', 'PyLong_Type')),
+
+    # PyModule_*
+    # (no externally-visible refcount changes; can fail with memory error,
+    # overflow error):
+    SimpleFunction(FnMeta(name='PyModule_AddIntConstant',
+                          docurl='http://docs.python.org/c-api/module.html#PyModule_AddIntConstant'),
+                   RETURNS_INT_WITH_ERROR,
+                   exception='PyExc_MemoryError'),
+    SimpleFunction(FnMeta(name='PyModule_AddStringConstant',
+                          docurl='http://docs.python.org/c-api/module.html#PyModule_AddStringConstant',),
+                   RETURNS_INT_WITH_ERROR,
+                   exception='PyExc_MemoryError'),
+    SimpleFunction(FnMeta(name='PyModule_GetDict',
+                          docurl='http://docs.python.org/c-api/module.html#PyModule_GetDict',
+                          prototype='PyObject* PyModule_GetDict(PyObject *module)',
+                          notes='Returns a borrowed reference.  Always succeeds'),
+                   RETURNS_BORROWED_REF),
+
+    # PyObject_*
+    # ("func" and "args" must not be NULL, but "kw" can be):
+    SimpleFunction(FnMeta(name='PyObject_Call',
+                          docurl='http://docs.python.org/c-api/object.html#PyObject_Call',
+                          defined_in='Objects/abstract.c',
+                          prototype=('PyObject *\n'
+                                     'PyObject_Call(PyObject *func, PyObject *arg, PyObject *kw)')),
+                   RETURNS_NEW_REF,
+                   nonnull_args=[(0, 'looks up func->ob_type'),
+                                 (1, None)]),
+    # (internally, this is just:
+    #    return PyEval_CallObjectWithKeywords(o, a, NULL);
+    # args can be NULL, but the callable obj can't be):
+    SimpleFunction(FnMeta(name='PyObject_CallObject',
+                          docurl='http://docs.python.org/c-api/object.html#PyObject_CallObject',
+                          defined_in='Objects/abstract.c',
+                          prototype=('PyAPI_FUNC(PyObject *) PyObject_CallObject(PyObject *callable_object,\n'
+                                     '                                           PyObject *args);')),
+                   RETURNS_NEW_REF,
+                   nonnull_args=[(0, lambda fnmeta:
+                                      ('%s() looks up func->ob_type (within PyObject_Call'
+                                       ' within PyEval_CallObjectWithKeywords)'
+                                       % fnmeta.name))]),
+    SimpleFunction(FnMeta(name='PyObject_GetAttr',
+                          docurl='http://docs.python.org/c-api/object.html#PyObject_GetAttr',
+                          defined_in='Objects/object.c',
+                          prototype='PyObject* PyObject_GetAttr(PyObject *o, PyObject *attr_name)'),
+                   RETURNS_NEW_REF,
+                   nonnull_args=[(0, invokes_Py_TYPE),
+                                 (1, lambda fnmeta:
+                                      invokes_Py_TYPE_via_macro(fnmeta,
+                                                                'PyString_Check'))]),
+    SimpleFunction(FnMeta(name='PyObject_GetAttrString',
+                          docurl='http://docs.python.org/c-api/object.html#PyObject_GetAttrString',
+                          defined_in='Objects/object.c',
+                          prototype='PyObject* PyObject_GetAttrString(PyObject *v, const char *name)'),
+                   RETURNS_NEW_REF,
+                   nonnull_args=[(0, invokes_Py_TYPE),
+                                 (1, lambda fnmeta:
+                                      ('%s() can call PyString_InternFromString(), '
+                                       'which calls PyString_FromString(), '
+                                       'which requires a non-NULL pointer' % fnmeta.name))]),
+    SimpleFunction(FnMeta(name='PyObject_Repr',
+                          declared_in='object.h',
+                          prototype='PyAPI_FUNC(PyObject *) PyObject_Repr(PyObject *);',
+                          docurl='http://docs.python.org/c-api/object.html#PyObject_Repr'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyStringObject', 'PyString_Type')),
+    #  PyAPI_FUNC(PyObject *) PyObject_Str(PyObject *);
+    # also with:
+    #  #define PyObject_Bytes PyObject_Str
+    SimpleFunction(FnMeta(name='PyObject_Str',
+                          docurl='http://docs.python.org/c-api/object.html#PyObject_Str',
+                          declared_in='object.h'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyStringObject', 'PyString_Type')),
+
+    # PySequence_*
+    #   PyObject *
+    #   PySequence_GetItem(PyObject *s, Py_ssize_t i)
+    #   {
+    #      [... setup and error handling ...]
+    #      return m->sq_item(s, i);
+    #   }
+    #
+    # When it succeeds, it returns a new reference; see e.g.
+    # Objects/listobject.c: list_item (the sq_item callback for
+    # PyList_Type): it Py_INCREFs the returned item.
+    SimpleFunction(FnMeta(name='PySequence_GetItem',
+                          docurl='http://docs.python.org/c-api/sequence.html#PySequence_GetItem',
+                          declared_in='abstract.h',
+                          prototype='PyAPI_FUNC(PyObject *) PySequence_GetItem(PyObject *o, Py_ssize_t i);',
+                          defined_in='Objects/abstract.c'),
+                   RETURNS_NEW_REF,
+                   objname='new ref from PySequence_GetItem'),
+
+    # PyString_*
+    # (the input to PyString_FromString _must_ be non-NULL; it is not
+    # checked):
+    SimpleFunction(FnMeta(name='PyString_FromString',
+                          declared_in='stringobject.h',
+                          prototype='PyAPI_FUNC(PyObject *) PyString_FromString(const char *);',
+                          docurl='http://docs.python.org/c-api/string.html#PyString_FromString'),
+                   RETURNS_NEW_OBJECT,
+                   nonnull_args=[(0, None)],
+                   objtype=('PyStringObject', 'PyString_Type')),
+    # (the input to PyString_FromStringAndSize can legitimately be NULL)
+    SimpleFunction(FnMeta(name='PyString_FromStringAndSize',
+                          declared_in='stringobject.h',
+                          prototype='PyAPI_FUNC(PyObject *) PyString_FromStringAndSize(const char *, Py_ssize_t);',
+                          docurl='http://docs.python.org/c-api/string.html#PyString_FromStringAndSize',
+                          defined_in='Objects/stringobject.c'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyStringObject', 'PyString_Type')),
+    SimpleFunction(FnMeta(name='PyString_InternFromString',
+                          declared_in='stringobject.h',
+                          prototype='PyObject* PyString_InternFromString(const char *v)',
+                          defined_in='Objects/stringobject.c',
+                          docurl='http://docs.python.org/c-api/string.html#PyString_InternFromString'),
+                   RETURNS_NEW_OBJECT,
+                   nonnull_args=[(0, lambda fnmeta:
+                                      ('%s() calls PyString_FromString(), '
+                                       'which requires a non-NULL pointer' % fnmeta.name))],
+                   objtype=('PyStringObject', 'PyString_Type')),
+
+    # PyTuple_*
+    # FIXME: for now, PyTuple_GetItem simply returns a borrowed ref, rather
+    # than trying to track indices and the array:
+    SimpleFunction(FnMeta(name='PyTuple_GetItem',
+                          docurl='http://docs.python.org/c-api/tuple.html#PyTuple_GetItem',
+                          defined_in='Objects/tupleobject.c'),
+                   RETURNS_BORROWED_REF,
+                   nonnull_args=[(0, lambda fnmeta:
+                                      invokes_Py_TYPE_via_macro(fnmeta,
+                                                                'PyTuple_Check'))]),
+
+    # PyType_*
+    SimpleFunction(FnMeta(name='PyType_Ready',
+                          docurl='http://docs.python.org/dev/c-api/type.html#PyType_Ready'),
+                   RETURNS_INT_WITH_ERROR,
+                   exception='PyExc_MemoryError'), # various possible errors
+
+    # PyUnicode_*
+    SimpleFunction(FnMeta(name='PyUnicode_DecodeUTF8',
+                          docurl='http://docs.python.org/c-api/unicode.html#PyUnicode_DecodeUTF8',
+                          prototype=('PyObject *\n'
+                                     'PyUnicode_DecodeUTF8(const char *s,\n'
+                                     '                     Py_ssize_t size,\n'
+                                     '                     const char *errors)'),
+                          defined_in='Objects/unicodeobject.c'),
+                   RETURNS_NEW_OBJECT,
+                   objtype=('PyUnicodeObject', 'PyUnicode_Type')),
+]
+
+def _make_impl(simplefn):
+    def impl(self, stmt, *args):
+        return simplefn.get_transitions(self, stmt, *args)
+    impl.__name__ = 'impl_%s' % simplefn.fnmeta.name
+    return impl
+
+for simplefn in simple_functions:
+    assert not hasattr(CPython, 'impl_%s' % simplefn.fnmeta.name)
+    setattr(CPython, 'impl_%s' % simplefn.fnmeta.name, _make_impl(simplefn))
+
 def get_traces(fun):
     stmtgraph = make_stmt_graph(fun)
     return list(iter_traces(stmtgraph,
@@ -4207,7 +4296,11 @@ def make_stmt_graph(fun):
 
 def impl_check_refcounts(fun, dump_traces=False,
                          show_possible_null_derefs=False,
-                         maxtrans=256):
+                         maxtrans=256,
+                         merge_states=False,
+                         widen_loops=False,
+                         use_summaries=False,
+                         limits=None):
     """
     Inner implementation of the refcount checker, checking the refcounting
     behavior of a function, returning a Reporter instance.
@@ -4219,6 +4312,19 @@ def impl_check_refcounts(fun, dump_traces=False,
 
     dump_traces: bool: if True, dump information about the traces through
     the function to stdout (for self tests)
+
+    merge_states: bool: if True, merge compatible states where control flow
+    joins, rather than exploring every path separately
+
+    widen_loops: bool: if True, analyze loops by widening the states until
+    they reach a fixpoint, rather than stopping at the first repetition
+
+    use_summaries: bool: if True, record a summary of the function's
+    behavior, for use when analyzing its callers (see
+    libcpychecker.summaries)
+
+    limits: a Limits instance, giving the budget for the analysis (if None,
+    then just maxtrans is used)
     """
     # Abstract interpretation:
     # Walk the CFG, gathering the information we're interested in
@@ -4234,23 +4340,53 @@ def impl_check_refcounts(fun, dump_traces=False,
     if get_PyObject():
         facets['cpython'] = CPython
 
-    limits=Limits(maxtrans=maxtrans)
+    if limits is None:
+        limits = Limits(maxtrans=maxtrans)
 
-    stmtgraph = make_stmt_graph(fun)
+    # Don't share values with the analysis of any previous function:
+    clear_interned_values()
+
+    with Phase('stmtgraph'):
+        stmtgraph = make_stmt_graph(fun)
     if 0:
         dot = stmtgraph.to_dot('foo')
         from gccutils import invoke_dot
         invoke_dot(dot)
 
-    try:
-        traces = iter_traces(stmtgraph,
-                             facets,
-                             limits=limits)
-    except TooComplicated:
-        err = sys.exc_info()[1]
-        gcc.inform(fun.start,
-                   'this function is too complicated for the reference-count checker to fully analyze: not all paths were analyzed')
-        traces = err.complete_traces
+    num_states = State.num_created
+    complete = True
+    with Phase('traces'):
+        try:
+            traces = iter_traces(stmtgraph,
+                                 facets,
+                                 limits=limits,
+                                 merge_states=merge_states,
+                                 widen_loops=widen_loops)
+        except TooComplicated:
+            err = sys.exc_info()[1]
+            if limits.exceeded == 'time':
+                msg = 'the reference-count checker ran out of time analyzing this function: not all paths were analyzed'
+            elif limits.exceeded == 'memory':
+                msg = 'the reference-count checker ran out of memory analyzing this function: not all paths were analyzed'
+            else:
+                msg = 'this function is too complicated for the reference-count checker to fully analyze: not all paths were analyzed'
+            diagnostics.inform(fun.start, msg)
+            traces = err.complete_traces
+            complete = False
+
+    prof = get_current_profile()
+    if prof:
+        prof.transitions = limits.trans_seen
+        prof.traces = len(traces)
+        prof.states = State.num_created - num_states
+
+    if use_summaries and complete:
+        # (an incomplete set of traces could miss some of the outcomes, so
+        # don't summarize it; callers will treat this as an unknown function)
+        from libcpychecker.summaries import summarize_traces, record_summary
+        summary = summarize_traces(fun, traces)
+        if summary:
+            record_summary(summary)
 
     if dump_traces:
         traces = list(traces)
@@ -4350,11 +4486,181 @@ def impl_check_refcounts(fun, dump_traces=False,
     return rep
 
 
+def get_report_filename(funcname, suffix):
+    return '%s.%s%s' % (gcc.get_dump_base_name(), funcname, suffix)
+
+def is_compact_json(dump_json):
+    return dump_json in ('compact', 'compact.gz')
+
+def get_json_suffix(dump_json):
+    if dump_json == 'compact.gz':
+        return '.json.gz'
+    return '.json'
+
+def write_report_files(fun, rep, dump_json):
+    """
+    Write out the error reports for a function that got warnings, returning
+    a dict mapping from filename suffix to the content of each file (so that
+    they can be written out again by write_saved_report_files; gzipped
+    files are held uncompressed)
+
+    dump_json is one of 'full' (or True), 'compact' or 'compact.gz' (see
+    libcpychecker_html/compact.py), or False to not write out the reports as
+    JSON.
+
+    If the reports are being gathered for the whole translation unit (see
+    get_report_data_consumers), the function's reports are added to those,
+    and the dict also holds them as JSON under REPORT_DATA_KEY.  A
+    per-translation-unit report replaces the files for each function.
+    """
+    tureport = get_tu_report()
+    consumers = get_report_data_consumers()
+    compact = is_compact_json(dump_json)
+    data = None
+    if consumers:
+        data = rep.to_json(fun, compact)
+        for consumer in consumers:
+            consumer.add_function(data)
+
+    if tureport:
+        diagnostics.inform(fun.start,
+                           ('graphical error report for function %r will be written out to %r'
+                            % (fun.decl.name, tureport.get_html_filename())))
+        from json import dumps
+        return {REPORT_DATA_KEY: dumps(data)}
+
+    result = {}
+    if dump_json:
+        # JSON output:
+        suffix = get_json_suffix(dump_json)
+        result[suffix] = rep.dump_json(fun,
+                                       get_report_filename(fun.decl.name,
+                                                           suffix),
+                                       compact=compact,
+                                       compress=suffix.endswith('.gz'))
+
+    filename = get_report_filename(fun.decl.name, '-refcount-errors.html')
+    rep.dump_html(fun, filename)
+    diagnostics.inform(fun.start,
+                       ('graphical error report for function %r written out to %r'
+                        % (fun.decl.name, filename)))
+
+    filename_v2 = get_report_filename(fun.decl.name, '-refcount-errors.v2.html')
+
+    from libcpychecker_html.make_html import HtmlPage
+    if data is None:
+        data = rep.to_json(fun, compact)
+    srcfile = open(fun.start.file)
+    htmlfile = open(filename_v2, 'w')
+    htmlfile.write(str(HtmlPage(srcfile, data)))
+    htmlfile.close()
+    srcfile.close()
+
+    for suffix in ['-refcount-errors.html', '-refcount-errors.v2.html']:
+        with open(get_report_filename(fun.decl.name, suffix)) as f:
+            result[suffix] = f.read()
+    if consumers:
+        from json import dumps
+        result[REPORT_DATA_KEY] = dumps(data)
+    return result
+
+# Key within the result of write_report_files for the data to be added to the
+# per-translation-unit reports (rather than being a file to write out):
+REPORT_DATA_KEY = 'report-data'
+
+def write_saved_report_files(funcname, reportfiles):
+    """
+    Write out the error reports for a function, from the result of an
+    earlier call to write_report_files
+    """
+    for suffix in sorted(reportfiles):
+        if suffix == REPORT_DATA_KEY:
+            continue
+        filename = get_report_filename(funcname, suffix)
+        if suffix.endswith('.gz'):
+            import gzip
+            with gzip.open(filename, 'wb') as f:
+                f.write(reportfiles[suffix].encode('utf-8'))
+        else:
+            with open(filename, 'w') as f:
+                f.write(reportfiles[suffix])
+    add_saved_report_data(reportfiles)
+
+def add_saved_report_data(reportfiles):
+    """
+    Add the reports for a function to the per-translation-unit reports (if
+    any), from the result of an earlier call to write_report_files
+    (e.g. in a worker process)
+    """
+    if REPORT_DATA_KEY not in reportfiles:
+        return
+    from json import loads
+    data = loads(reportfiles[REPORT_DATA_KEY])
+    for consumer in get_report_data_consumers():
+        consumer.add_function(data)
+
+def get_report_data_consumers():
+    """
+    Get the list of objects gathering up the reports for the whole
+    translation unit (see libcpychecker.tureport, libcpychecker.sarif and
+    libcpychecker.warningdb), each having an add_function(data) method,
+    taking the data for a function as per Reporter.to_json
+    """
+    return [consumer
+            for consumer in (get_tu_report(),
+                             get_sarif_writer(),
+                             get_warning_recorder())
+            if consumer]
+
+def analyze_refcounts(fun,
+                      show_possible_null_derefs=False,
+                      maxtrans=256,
+                      dump_json=False,
+                      merge_states=False,
+                      widen_loops=False,
+                      use_summaries=False,
+                      limits=None):
+    """
+    Run the refcount checker on a function, without emitting anything to
+    GCC's diagnostics (so that this can be run in a worker process, or
+    have its results cached).
+
+    Returns a (diagnostics, reportfiles) pair: the list of SavedDiagnostic
+    instances to be emitted (in order), and the result of
+    write_report_files (if any warnings were found)
+
+    limits: as per impl_check_refcounts
+    """
+    with DiagnosticCapture() as capture:
+        with Phase('analysis'):
+            rep = impl_check_refcounts(fun,
+                                       False,
+                                       show_possible_null_derefs,
+                                       maxtrans,
+                                       merge_states,
+                                       widen_loops,
+                                       use_summaries,
+                                       limits)
+        with Phase('reporting'):
+            rep.remove_duplicates()
+            capture.diagnostics += rep.get_saved_diagnostics()
+            reportfiles = {}
+            if rep.got_warnings():
+                reportfiles = write_report_files(fun, rep, dump_json)
+    return capture.diagnostics, reportfiles
+
 def check_refcounts(fun, dump_traces=False, show_traces=False,
                     show_possible_null_derefs=False,
                     show_timings=False,
                     maxtrans=256,
-                    dump_json=False):
+                    dump_json=False,
+                    merge_states=False,
+                    widen_loops=False,
+                    cache_dir=None,
+                    use_summaries=False,
+                    maxseconds=None,
+                    deadline=None,
+                    maxmb=None):
     """
     The top-level function of the refcount checker, checking the refcounting
     behavior of a function
@@ -4367,6 +4673,24 @@ def check_refcounts(fun, dump_traces=False, show_traces=False,
     show_traces: bool: if True, display a diagram of the state transition graph
 
     show_timings: bool: if True, add timing information to stderr
+
+    merge_states: bool: if True, merge compatible states where control flow
+    joins (see iter_traces)
+
+    widen_loops: bool: if True, iterate loops to a fixpoint using widening
+    (see iter_traces)
+
+    cache_dir: str: if set, the path of a directory in which to cache the
+    results of the analysis, keyed by a fingerprint of the function (see
+    libcpychecker.cache); functions that haven't changed since a previous
+    run have their diagnostics and reports replayed from there
+
+    use_summaries: bool: if True, use the summaries of any functions that
+    have already been analyzed when analyzing calls to them, and record a
+    summary of this function (see libcpychecker.summaries)
+
+    maxseconds, deadline, maxmb: budgets for the time taken and memory used,
+    as per the Limits class
     """
 
     log('check_refcounts(%r, %r, %r)', fun, dump_traces, show_traces)
@@ -4374,8 +4698,7 @@ def check_refcounts(fun, dump_traces=False, show_traces=False,
     # show_timings = 1
 
     if show_timings:
-        import time
-        start_cpusecs = time.clock()
+        start_cpusecs = get_cpu_time()
         gcc.inform(fun.start, 'Analyzing reference-counting within %s' % fun.decl.name)
 
     if show_traces:
@@ -4387,48 +4710,75 @@ def check_refcounts(fun, dump_traces=False, show_traces=False,
         # print(dot)
         invoke_dot(dot)
 
-    rep = impl_check_refcounts(fun,
-                               dump_traces,
-                               show_possible_null_derefs,
-                               maxtrans)
-
-    # Organize the Report instances into equivalence classes, simplifying
-    # the list of reports:
-    rep.remove_duplicates()
-
-    # Flush the reporter's messages, which will actually emit gcc errors and
-    # warnings (if any), for those Report instances that survived
-    # de-duplication
-    rep.flush()
-
-    if rep.got_warnings():
-        if dump_json:
-            # JSON output:
-            filename = ('%s.%s.json'
-                    % (gcc.get_dump_base_name(), fun.decl.name))
-            rep.dump_json(fun, filename)
-
-        filename = ('%s.%s-refcount-errors.html'
-                    % (gcc.get_dump_base_name(), fun.decl.name))
-        rep.dump_html(fun, filename)
-        gcc.inform(fun.start,
-                   ('graphical error report for function %r written out to %r'
-                    % (fun.decl.name, filename)))
-
-        filename_v2 = ('%s.%s-refcount-errors.v2.html'
-                       % (gcc.get_dump_base_name(), fun.decl.name))
-
-        from libcpychecker_html.make_html import HtmlPage
-        data = rep.to_json(fun)
-        srcfile = open(fun.start.file)
-        htmlfile = open(filename_v2, 'w')
-        htmlfile.write(str(HtmlPage(srcfile, data)))
-        htmlfile.close()
-        srcfile.close()
-
+    settings = dict(show_possible_null_derefs=show_possible_null_derefs,
+                    maxtrans=maxtrans,
+                    dump_json=dump_json,
+                    merge_states=merge_states,
+                    widen_loops=widen_loops,
+                    use_summaries=use_summaries)
+    limits = Limits(maxtrans=maxtrans,
+                    maxseconds=maxseconds,
+                    deadline=deadline,
+                    maxmb=maxmb)
+
+    prof = begin_function(fun)
+    rep = None
+    if cache_dir and not (dump_traces or show_traces):
+        from libcpychecker.cache import ResultCache, get_function_fingerprint, \
+            get_locations, get_diagnostics, make_entry
+        cache = ResultCache(cache_dir)
+        key = get_function_fingerprint(fun, settings)
+        entry = cache.lookup(key)
+        saved = None
+        if entry:
+            saved = get_diagnostics(entry, get_locations(fun))
+        if saved is not None:
+            log('replaying cached results for %s', fun.decl.name)
+            write_saved_report_files(fun.decl.name, entry['reportfiles'])
+            if use_summaries and entry['summary']:
+                from libcpychecker.summaries import FunctionSummary, \
+                    record_summary
+                record_summary(FunctionSummary.from_json(entry['summary']))
+        else:
+            saved, reportfiles = analyze_refcounts(fun, limits=limits,
+                                                   **settings)
+            summary = None
+            if use_summaries:
+                from libcpychecker.summaries import get_summary
+                summary = get_summary(fun.decl.name)
+            # Running out of time or memory depends on more than just the
+            # function, so don't cache such results:
+            if not limits.exceeded_resource_budget():
+                cache.store(key, make_entry(saved, reportfiles, summary))
+        for d in saved:
+            d.flush()
+    else:
+        with Phase('analysis'):
+            rep = impl_check_refcounts(fun,
+                                       dump_traces,
+                                       show_possible_null_derefs,
+                                       maxtrans,
+                                       merge_states,
+                                       widen_loops,
+                                       use_summaries,
+                                       limits)
+
+        with Phase('reporting'):
+            # Organize the Report instances into equivalence classes,
+            # simplifying the list of reports:
+            rep.remove_duplicates()
+
+            # Flush the reporter's messages, which will actually emit gcc
+            # errors and warnings (if any), for those Report instances that
+            # survived de-duplication
+            rep.flush()
+
+            if rep.got_warnings():
+                write_report_files(fun, rep, dump_json)
+    end_function(prof)
 
     if show_timings:
-        end_cpusecs = time.clock()
+        end_cpusecs = get_cpu_time()
         gcc.inform(fun.start, 'Finished analyzing reference-counting within %s' % fun.decl.name)
         gcc.inform(fun.start,
                    ('%i transitions, %fs CPU'
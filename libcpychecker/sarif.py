@@ -0,0 +1,264 @@
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+"""
+Output of the refcount checker's error reports in SARIF (the OASIS "Static
+Analysis Results Interchange Format", version 2.1.0), for consumption by
+other tools.
+
+Each translation unit is one SARIF "run", and each Report is one "result",
+with the trace becoming a "codeFlow", and the notes becoming
+"relatedLocations".
+
+The results are written out as each function is analyzed, rather than being
+gathered up in memory.  Either:
+
+  * each translation unit gets its own file, named after it:
+       <dump base name>.cpychecker.sarif
+    and completed when GCC exits, or
+
+  * the run is written to a temporary file, and when GCC exits, appended
+    to a shared file (e.g. for a whole build), whilst holding a lock on it.
+    The shared file is a valid SARIF log after each append, with one run
+    per translation unit.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+
+from six.moves.urllib.parse import quote
+
+import gcc
+
+from gccutils import check_isinstance
+from libcpychecker.utils import log
+from libcpychecker_html.compact import expand_report
+
+SARIF_VERSION = '2.1.0'
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+# The text before and after the runs within a SARIF log written by us:
+LOG_HEADER = ('{"$schema": %s, "version": %s, "runs": [\n'
+              % (json.dumps(SARIF_SCHEMA), json.dumps(SARIF_VERSION)))
+LOG_FOOTER = '\n]}\n'
+
+# The text before and after the results within a run:
+RUN_HEADER = ('{"tool": {"driver": %s}, "results": ['
+              % json.dumps(dict(name='cpychecker',
+                                informationUri='http://gcc-python-plugin.readthedocs.org/'),
+                           sort_keys=True))
+RUN_FOOTER = '\n]}'
+
+# Set by the gimple pass if SARIF output has been requested:
+enabled = False
+
+# The SarifWriter being written to (if any):
+_writer = None
+
+def enable(shared_filename=None):
+    """
+    Turn on SARIF output, to a file named after the translation unit, or (if
+    shared_filename is given) appended to that file when GCC exits
+    """
+    global enabled
+    global _writer
+    enabled = True
+    if shared_filename:
+        fd, path = tempfile.mkstemp(prefix='cpychecker-', suffix='.sarif-run',
+                                    dir=os.path.dirname(shared_filename))
+        _writer = SarifWriter(os.fdopen(fd, 'w'), path,
+                              shared_filename=shared_filename)
+    else:
+        filename = get_sarif_filename()
+        _writer = SarifWriter(open(filename, 'w'), filename)
+    gcc.register_callback(gcc.PLUGIN_FINISH, on_finish)
+
+def get_sarif_filename():
+    return '%s.cpychecker.sarif' % gcc.get_dump_base_name()
+
+def get_writer():
+    """
+    Get the SarifWriter being written to, or None if SARIF output isn't
+    enabled
+    """
+    return _writer
+
+def on_finish():
+    if _writer:
+        _writer.close()
+
+class SarifWriter(object):
+    """
+    Incremental writer of a SARIF run, with one result per Report
+    """
+    def __init__(self, f, filename, shared_filename=None):
+        self.f = f
+        self.filename = filename
+        self.shared_filename = shared_filename
+        self.num_results = 0
+
+        # Worker processes are forked with a copy of this object, but their
+        # results are added by the parent process (see
+        # refcounts.add_saved_report_data), so only write from this one:
+        self.pid = os.getpid()
+
+        if not shared_filename:
+            self.f.write(LOG_HEADER)
+        self.f.write(RUN_HEADER)
+
+    def add_function(self, data):
+        """
+        Add a result for each of the reports within a function, given its
+        data as per Reporter.to_json
+        """
+        check_isinstance(data, dict)
+        if os.getpid() != self.pid:
+            return
+        for report in data['reports']:
+            result = report_to_sarif(data, report)
+            if self.num_results:
+                self.f.write(',')
+            self.f.write('\n')
+            self.f.write(json.dumps(result, sort_keys=True))
+            self.num_results += 1
+
+    def close(self):
+        self.f.write(RUN_FOOTER)
+        if not self.shared_filename:
+            self.f.write(LOG_FOOTER)
+        self.f.close()
+        log('wrote %i SARIF result(s) to %s', self.num_results, self.filename)
+
+        if self.shared_filename:
+            append_run(self.shared_filename, self.filename)
+            os.unlink(self.filename)
+
+def append_run(shared_filename, run_filename):
+    """
+    Append the run within the given file to the SARIF log in the shared file,
+    creating it if need be.
+
+    An exclusive lock is held on the shared file whilst doing so, so that
+    many compilations can append to the same file at once.
+    """
+    fd = os.open(shared_filename, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        footer = LOG_FOOTER.encode('utf-8')
+        size = os.fstat(fd).st_size
+        if size == 0:
+            os.write(fd, LOG_HEADER.encode('utf-8'))
+        else:
+            # Overwrite the footer of the log:
+            os.lseek(fd, size - len(footer), os.SEEK_SET)
+            if os.read(fd, len(footer)) != footer:
+                raise ValueError('%s is not a SARIF log written by cpychecker'
+                                 % shared_filename)
+            os.lseek(fd, size - len(footer), os.SEEK_SET)
+            os.write(fd, b',\n')
+        with open(run_filename, 'rb') as f:
+            while True:
+                chunk = f.read(65536)
+                if not chunk:
+                    break
+                os.write(fd, chunk)
+        os.write(fd, footer)
+    finally:
+        # (closing the file releases the lock)
+        os.close(fd)
+
+def filename_to_uri(filename):
+    """
+    Convert a filename into the "uri" of a SARIF artifactLocation: a
+    "file:" URI for an absolute path, or a relative reference otherwise,
+    percent-encoding any characters that can't appear within a URI
+    """
+    uri = quote(filename.replace(os.sep, '/').encode('utf-8'))
+    if os.path.isabs(filename):
+        return 'file://' + uri
+    return uri
+
+def location_to_sarif(filename, location, message=None):
+    """
+    Convert a location, as per diagnostics.location_as_json, into a SARIF
+    location
+    """
+    start, end = location
+    region = dict(startLine=start['line'])
+    # GCC uses 0 for an unknown column; SARIF columns are 1-based:
+    if start['column'] > 0:
+        region['startColumn'] = start['column']
+    if end['line'] != start['line']:
+        region['endLine'] = end['line']
+    if end['column'] > 0 and end != start:
+        region['endColumn'] = end['column']
+    result = dict(physicalLocation=dict(
+            artifactLocation=dict(uri=filename_to_uri(filename)),
+            region=region))
+    if message:
+        result['message'] = dict(text=message)
+    return result
+
+def report_to_sarif(data, report):
+    """
+    Convert a report, as per Report.to_json, into a SARIF result, given the
+    data for the function it's within, as per Reporter.to_json
+    """
+    filename = data['filename']
+    funcname = data['function']['name']
+    report = expand_report(report)
+
+    # The trace:
+    flowlocations = []
+    for state in report['states']:
+        if state['location']:
+            flowlocations.append(
+                dict(location=location_to_sarif(filename,
+                                                state['location'],
+                                                state['message'])))
+
+    # Where the problem is:
+    location = report.get('location')
+    if not location:
+        # (the last states of a trace don't necessarily have a location):
+        for state in reversed(report['states']):
+            if state['location']:
+                location = state['location']
+                break
+    if location:
+        primary = location_to_sarif(filename, location)
+    else:
+        primary = dict(physicalLocation=dict(
+                artifactLocation=dict(uri=filename_to_uri(filename))))
+    primary['logicalLocations'] = [dict(name=funcname, kind='function')]
+
+    result = dict(level='error' if report['severity'] == 'error' else 'warning',
+                  message=dict(text=report['message']),
+                  locations=[primary])
+    if flowlocations:
+        result['codeFlows'] = [dict(threadFlows=[dict(locations=flowlocations)])]
+    related = []
+    for i, note in enumerate(report['notes']):
+        if note['location']:
+            loc = location_to_sarif(filename, note['location'], note['message'])
+            loc['id'] = i
+            related.append(loc)
+    if related:
+        result['relatedLocations'] = related
+    return result
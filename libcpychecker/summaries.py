@@ -0,0 +1,274 @@
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+"""
+Summaries of the refcounting behavior of functions defined within the
+translation unit.
+
+By default, a call to a function that isn't part of the CPython API is
+treated as a call to an unknown function: if it returns a PyObject*, it's
+assumed to either return a new reference, or to return NULL with an
+exception set.
+
+If the functions are instead analyzed bottom-up (callees before callers),
+the traces through each function can be summarized, recording what its
+return value can be, and which of its arguments it steals references to.
+Calls to it from functions analyzed later then use the summary instead.
+"""
+
+import gcc
+
+from gccutils import check_isinstance, sorted_callgraph
+from libcpychecker.absinterp import FnMeta, Transition, PointerToRegion, \
+    ConcreteValue, UnknownValue
+from libcpychecker.utils import log
+
+# The possible outcomes of a call to a function returning PyObject*:
+OUTCOME_NEW_REF = 'new-ref'
+OUTCOME_BORROWED_REF = 'borrowed-ref'
+OUTCOME_NULL_WITH_EXCEPTION = 'null-with-exception'
+OUTCOME_NULL_WITHOUT_EXCEPTION = 'null-without-exception'
+
+# (in the order in which the transitions are generated):
+OUTCOMES = (OUTCOME_NEW_REF,
+            OUTCOME_BORROWED_REF,
+            OUTCOME_NULL_WITH_EXCEPTION,
+            OUTCOME_NULL_WITHOUT_EXCEPTION)
+
+# A dictionary mapping from fnname to FunctionSummary, for the functions
+# analyzed so far within this translation unit:
+summaries_by_fnname = {}
+
+class FunctionSummary(object):
+    """
+    What callers of a function need to know about its refcounting behavior
+    """
+    __slots__ = ('fnname',
+                 'outcomes', # frozenset of OUTCOME_*; empty if the function
+                             # doesn't return a PyObject*
+                 'stolen_args', # frozenset of 1-based argument indices
+                 )
+
+    def __init__(self, fnname, outcomes, stolen_args):
+        check_isinstance(fnname, str)
+        self.fnname = fnname
+        self.outcomes = frozenset(outcomes)
+        self.stolen_args = frozenset(stolen_args)
+
+    def __str__(self):
+        return ('%s: returns %s, steals %s'
+                % (self.fnname,
+                   sorted(self.outcomes),
+                   sorted(self.stolen_args)))
+
+    def __repr__(self):
+        return ('FunctionSummary(%r, %r, %r)'
+                % (self.fnname,
+                   sorted(self.outcomes),
+                   sorted(self.stolen_args)))
+
+    def as_json(self):
+        return dict(fnname=self.fnname,
+                    outcomes=sorted(self.outcomes),
+                    stolen_args=sorted(self.stolen_args))
+
+    @classmethod
+    def from_json(cls, js):
+        return FunctionSummary(str(js['fnname']),
+                               [str(outcome) for outcome in js['outcomes']],
+                               js['stolen_args'])
+
+    def get_transitions(self, state, stmt):
+        """
+        Get the list of Transitions for a call to this function from the
+        given State
+        """
+        from libcpychecker.attributes import stolen_refs_by_fnname
+        check_isinstance(stmt, gcc.GimpleCall)
+        fnmeta = FnMeta(name=self.fnname)
+        returntype = stmt.fn.type.dereference.type
+
+        transitions = []
+        for outcome in OUTCOMES:
+            if outcome not in self.outcomes:
+                continue
+            if outcome == OUTCOME_NEW_REF:
+                s_new, r_nonnull = state.cpython.mkstate_new_ref(
+                    stmt, 'new ref from call to %s' % self.fnname)
+                desc = 'when %s() returns a new reference' % self.fnname
+            elif outcome == OUTCOME_BORROWED_REF:
+                s_new = state.cpython.mkstate_borrowed_ref(stmt, fnmeta)
+                desc = 'when %s() returns a borrowed reference' % self.fnname
+            elif outcome == OUTCOME_NULL_WITH_EXCEPTION:
+                s_new = state.cpython.mkstate_exception(stmt)
+                desc = fnmeta.desc_when_call_fails()
+            else:
+                if stmt.lhs:
+                    v_null = ConcreteValue(stmt.lhs.type, stmt.loc, 0)
+                else:
+                    v_null = None
+                s_new = state.mktrans_assignment(stmt.lhs, v_null, None).dest
+                desc = ('when %s() returns NULL without setting an exception'
+                        % self.fnname)
+            transitions.append(Transition(state, s_new, desc))
+
+        if not transitions:
+            # Not returning a PyObject*:
+            transitions = [state.mktrans_assignment(stmt.lhs,
+                                                    UnknownValue.make(returntype,
+                                                                      stmt.loc),
+                                                    None)]
+
+        transitions = state.apply_fncall_side_effects(transitions, stmt)
+
+        # (references stolen due to attributes have already been handled by
+        # apply_fncall_side_effects)
+        if self.fnname not in stolen_refs_by_fnname:
+            args = state.eval_stmt_args(stmt)
+            for t_iter in transitions:
+                for argindex in self.stolen_args:
+                    if argindex > len(args):
+                        continue
+                    v_arg = args[argindex - 1]
+                    if isinstance(v_arg, PointerToRegion):
+                        t_iter.dest.cpython.steal_reference(v_arg, stmt.loc)
+
+        return transitions
+
+def get_summary(fnname):
+    """
+    Get the FunctionSummary for the function of the given name, or None
+    """
+    return summaries_by_fnname.get(fnname, None)
+
+def record_summary(summary):
+    check_isinstance(summary, FunctionSummary)
+    log('recording summary: %s', summary)
+    summaries_by_fnname[summary.fnname] = summary
+
+def _get_initial_pointee(trace, region):
+    """
+    Get the Region that a pointer parameter pointed to, within the given
+    trace, or None if it was NULL (or its value never became known).
+
+    Parameters start off as UnknownValue, and are split into concrete values
+    when first used; find the first such value.
+    """
+    for state in trace.states:
+        v_parm = state.value_for_region.get(region, None)
+        if isinstance(v_parm, PointerToRegion):
+            return v_parm.region
+        if v_parm is not None and v_parm.is_null_ptr():
+            return None
+    return None
+
+def _get_relvalue(state, r_obj):
+    """
+    Get the number of references owned by the function on the object at the
+    given region (0 if it never touched its ob_refcnt)
+    """
+    from libcpychecker.refcounts import RefcountValue
+    v_ob_refcnt = state.get_value_of_field_by_region(r_obj, 'ob_refcnt')
+    if isinstance(v_ob_refcnt, RefcountValue):
+        return v_ob_refcnt.relvalue
+    return 0
+
+def _get_outcome(endstate, v_return):
+    if v_return is None:
+        return None
+    if v_return.is_null_ptr():
+        if endstate.cpython.exception_rvalue.is_null_ptr():
+            return OUTCOME_NULL_WITHOUT_EXCEPTION
+        return OUTCOME_NULL_WITH_EXCEPTION
+    if isinstance(v_return, PointerToRegion):
+        if _get_relvalue(endstate, v_return.region) > 0:
+            return OUTCOME_NEW_REF
+        return OUTCOME_BORROWED_REF
+    # Some other value; we don't know what's being returned:
+    return None
+
+def summarize_traces(fun, traces):
+    """
+    Given a gcc.Function and the list of all of the traces through it,
+    generate a FunctionSummary for it, or None if it can't be summarized
+    (or there's nothing worth summarizing)
+    """
+    check_isinstance(fun, gcc.Function)
+    from libcpychecker.refcounts import type_is_pyobjptr_subclass
+
+    returns_pyobject = type_is_pyobjptr_subclass(fun.decl.type.type)
+    pyobject_parms = [(idx + 1, parm)
+                      for idx, parm in enumerate(fun.decl.arguments)
+                      if type_is_pyobjptr_subclass(parm.type)]
+    outcomes = set()
+    # An argument's reference is stolen if on every path where it's non-NULL,
+    # the function ends up owning one less reference on it:
+    stolen_args = set([argindex for argindex, parm in pyobject_parms])
+    nonnull_args = set()
+    num_traces = 0
+    for trace in traces:
+        if trace.err:
+            # This trace bails early with a fatal error (which will be
+            # reported for the function itself):
+            continue
+        endstate = trace.get_last_state()
+        if endstate.not_returning:
+            continue
+        if not hasattr(endstate, 'cpython'):
+            return None
+        num_traces += 1
+
+        if returns_pyobject:
+            outcome = _get_outcome(endstate, trace.return_value())
+            if outcome is None:
+                return None
+            outcomes.add(outcome)
+
+        for argindex, parm in pyobject_parms:
+            r_obj = _get_initial_pointee(trace, endstate.region_for_var[parm])
+            if r_obj is None:
+                continue
+            nonnull_args.add(argindex)
+            if _get_relvalue(endstate, r_obj) != -1:
+                stolen_args.discard(argindex)
+
+    if num_traces == 0:
+        return None
+    stolen_args &= nonnull_args
+    if not outcomes and not stolen_args:
+        return None
+    return FunctionSummary(fun.decl.name, outcomes, stolen_args)
+
+def get_bottom_up_order(funs):
+    """
+    Given a list of gcc.Function, sort them so that where possible, each
+    function comes after the functions that it calls (ignoring recursion)
+    """
+    fun_for_decl = dict((fun.decl, fun) for fun in funs)
+    result = []
+    # sorted_callgraph() puts callers before callees:
+    for node in reversed(sorted_callgraph()):
+        fun = fun_for_decl.pop(node.decl, None)
+        if fun:
+            result.append(fun)
+    # Anything left over (e.g. within a cycle of calls), in the original
+    # order, skipping any functions that have since been removed from the
+    # callgraph (and thus may no longer have a body):
+    decls = set([node.decl for node in gcc.get_callgraph_nodes()])
+    result += [fun for fun in funs
+               if fun.decl in fun_for_decl and fun.decl in decls]
+    return result
@@ -0,0 +1,118 @@
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+"""
+Aggregation of the error reports for a whole translation unit.
+
+By default, the refcount checker writes out several report files for each
+function that it finds problems in, highlighting the source code again for
+each one.
+
+When enabled, the reports are instead gathered up as each function is
+analyzed, and written out at the end of the compilation (from the
+PLUGIN_FINISH callback) as just two files, named after the translation unit:
+   <dump base name>-refcount-errors.tu.html
+   <dump base name>-refcount-errors.tu.json
+(with a different suffix to the per-function reports, so that the tools in
+misc/fedora that scrape those don't mistake these for them).
+
+The HTML is a single page covering all of the functions, with each source
+file highlighted once.  The JSON is a dict with a "functions" list, each
+entry being as per Reporter.to_json.
+"""
+
+import json
+
+import gcc
+
+from gccutils import check_isinstance
+from libcpychecker.utils import log
+
+# Set by the gimple pass if a per-translation-unit report has been requested:
+enabled = False
+
+# The TranslationUnitReport being gathered (if any):
+_report = None
+
+def enable():
+    """
+    Turn on per-translation-unit reports, to be written out when GCC exits
+    """
+    global enabled
+    global _report
+    enabled = True
+    _report = TranslationUnitReport(gcc.get_dump_base_name())
+    gcc.register_callback(gcc.PLUGIN_FINISH, on_finish)
+
+def get_report():
+    """
+    Get the TranslationUnitReport being gathered, or None if they aren't
+    enabled
+    """
+    return _report
+
+def on_finish():
+    if _report:
+        _report.write()
+
+class TranslationUnitReport(object):
+    """
+    The error reports for all of the functions within a translation unit
+    """
+    def __init__(self, basename):
+        self.basename = basename
+
+        # list of the data for each function, as per Reporter.to_json:
+        self.functions = []
+
+    def get_html_filename(self):
+        return '%s-refcount-errors.tu.html' % self.basename
+
+    def get_json_filename(self):
+        return '%s-refcount-errors.tu.json' % self.basename
+
+    def add_function(self, data):
+        check_isinstance(data, dict)
+        # Functions without reports don't get an entry:
+        if data['reports']:
+            self.functions.append(data)
+
+    def get_functions(self):
+        """
+        Get the data for each function, in source order
+        """
+        return sorted(self.functions,
+                      key=lambda data: (data['filename'],
+                                        data['function']['lines']))
+
+    def to_json(self):
+        return dict(filename=self.basename,
+                    functions=self.get_functions())
+
+    def write(self):
+        if not self.functions:
+            return
+        log('writing report for %i function(s) to %s',
+            len(self.functions), self.get_html_filename())
+
+        with open(self.get_json_filename(), 'w') as f:
+            json.dump(self.to_json(), f, sort_keys=True, indent=4)
+
+        from libcpychecker_html.make_html import TranslationUnitPage
+        page = TranslationUnitPage(self.basename, self.get_functions())
+        with open(self.get_html_filename(), 'w') as f:
+            f.write(str(page))
@@ -30,12 +30,20 @@ def is_py3k():
     else:
         return True
 
+# Results derived from the typedefs, keyed by the gcc.TypeDecl they were
+# derived from (so that they don't go stale if the typedefs change):
+_is_debug_build_for_typedef = {}
+_pointer_for_typedef = {}
+
 def is_debug_build():
     """
     Is the Python.h we're compiling against configured --with-pydebug ?
     """
     obj = get_global_typedef('PyObject')
-    return obj.type.fields[0].name == '_ob_next'
+    if obj not in _is_debug_build_for_typedef:
+        _is_debug_build_for_typedef[obj] = \
+            (obj.type.fields[0].name == '_ob_next')
+    return _is_debug_build_for_typedef[obj]
 
 def get_Py_ssize_t():
     return get_global_typedef('Py_ssize_t')
@@ -57,7 +65,10 @@ def get_PyObject():
     return get_global_typedef('PyObject')
 
 def get_PyObjectPtr():
-    return get_global_typedef('PyObject').pointer
+    obj = get_global_typedef('PyObject')
+    if obj not in _pointer_for_typedef:
+        _pointer_for_typedef[obj] = obj.pointer
+    return _pointer_for_typedef[obj]
 
 def get_PyTypeObject():
     return get_global_typedef('PyTypeObject')
@@ -16,6 +16,7 @@
 #   <http://www.gnu.org/licenses/>.
 
 # Logging
+import resource
 import sys
 
 import gcc
@@ -38,3 +39,16 @@ def log(msg, *args):
         if 0:
             sys.stderr.write(expanded_msg)
             sys.stderr.write('\n')
+
+def get_memory_usage_mb():
+    """
+    Get the memory usage of this process, in megabytes
+    """
+    try:
+        # Current resident set size (Linux):
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024.0 * 1024.0)
+    except (IOError, OSError):
+        # Fall back to the peak resident set size (in kilobytes):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
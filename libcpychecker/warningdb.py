@@ -0,0 +1,145 @@
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+"""
+Recording of the refcount checker's warnings into a database shared between
+builds (see libcpychecker_html/warningstore.py), so that the warnings of two
+builds can be compared without scraping the HTML reports.
+
+The warnings for the translation unit are gathered up as each function is
+analyzed, and written to the database in a single transaction when GCC exits,
+so that many compilations can share the database.
+
+Within an RPM build, the package name defaults to that of the package being
+built, and source files within the build directory are recorded relative to
+the top-level directory of the package's sources (so that they can be matched
+up between different versions of the package).
+"""
+
+import os
+
+import gcc
+
+from gccutils import check_isinstance
+from libcpychecker.utils import log
+from libcpychecker_html.warningstore import WarningDb, warnings_from_report_data
+
+# Set by the gimple pass if recording to a warning database has been
+# requested:
+enabled = False
+
+# The WarningRecorder being gathered (if any):
+_recorder = None
+
+def enable(filename, build=None, package=None):
+    """
+    Turn on recording of warnings to the database in the given file, to be
+    written out when GCC exits
+    """
+    global enabled
+    global _recorder
+    enabled = True
+    if build is None:
+        build = 'default'
+    if package is None:
+        package = os.environ.get('RPM_PACKAGE_NAME', '')
+    _recorder = WarningRecorder(filename, build, package, get_unit_name())
+    gcc.register_callback(gcc.PLUGIN_FINISH, on_finish)
+
+def get_recorder():
+    """
+    Get the WarningRecorder being gathered, or None if recording isn't enabled
+    """
+    return _recorder
+
+def on_finish():
+    if _recorder:
+        _recorder.write()
+
+def get_source_name(filename):
+    """
+    Get the name to record for a source file: relative to the top-level
+    directory of the sources when within an RPM build (e.g.
+    "/builddir/build/BUILD/foo-1.0/src/foo.c" becomes "src/foo.c"), or as an
+    absolute path otherwise (so that it doesn't depend on the directory that
+    the compiler happened to be invoked from)
+    """
+    builddir = os.environ.get('RPM_BUILD_DIR')
+    if builddir:
+        path = os.path.relpath(os.path.abspath(filename), builddir)
+        components = path.split(os.sep)
+        if len(components) > 1 and components[0] != os.pardir:
+            return os.path.join(*components[1:])
+    return os.path.abspath(filename)
+
+def get_unit_name():
+    """
+    Get the name to record for the translation unit being compiled: that of
+    its main input file.  (The dump base name isn't suitable, as it lacks the
+    directory of the source file, so that e.g. "src/a/util.c" and
+    "src/b/util.c" would both be recorded as "util.c")
+
+    Returns None if the plugin doesn't provide gcc.get_main_input_filename()
+    """
+    if hasattr(gcc, 'get_main_input_filename'):
+        filename = gcc.get_main_input_filename()
+        if filename:
+            return get_source_name(filename)
+    return None
+
+class WarningRecorder(object):
+    """
+    The warnings for a translation unit, to be added to a WarningDb
+    """
+    def __init__(self, filename, build, package, unit=None):
+        """
+        unit: the name of the translation unit, as per get_unit_name(); if
+        None, the source file of the first function added is used instead
+        """
+        self.filename = filename
+        self.build = build
+        self.package = package
+        self.unit = unit
+
+        # list of WarningRecord:
+        self.warnings = []
+
+    def add_function(self, data):
+        """
+        Add the warnings for a function, given its data as per
+        Reporter.to_json
+        """
+        check_isinstance(data, dict)
+        filename = get_source_name(data['filename'])
+        if self.unit is None:
+            self.unit = filename
+        self.warnings.extend(
+            warnings_from_report_data(self.package, data, filename))
+
+    def write(self):
+        if self.unit is None:
+            # No functions were analyzed, and the unit can't be identified:
+            log('not recording any warnings to %s: unknown unit',
+                self.filename)
+            return
+        log('recording %i warning(s) for %s to %s',
+            len(self.warnings), self.unit, self.filename)
+        db = WarningDb(self.filename)
+        try:
+            db.add_unit(self.build, self.package, self.unit, self.warnings)
+        finally:
+            db.close()
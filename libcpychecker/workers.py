@@ -0,0 +1,211 @@
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+"""
+Running the refcount checker on several functions at once, in a pool of
+worker processes.
+
+Each worker is a fork of the compiler, and so it sees a copy-on-write
+snapshot of the GIMPLE (and everything else) as it was when the function
+was submitted; it can thus use the gcc module as normal, and carry on
+analyzing a function after the compiler has moved on to the next one.
+
+The workers don't emit any diagnostics themselves: they send them back in
+the JSON form used by the cache (see libcpychecker.cache), and these are
+emitted by the compiler process at the end of the translation unit, in
+source order.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import traceback
+
+import gcc
+
+from gccutils import check_isinstance
+from libcpychecker.cache import get_function_fingerprint, get_locations, \
+    get_diagnostics, make_entry
+from libcpychecker.utils import log
+
+# How long to sleep (in seconds) between checks for a finished worker:
+POLL_INTERVAL = 0.01
+
+class Result:
+    """
+    The outcome of analyzing one function
+    """
+    def __init__(self, funcname, start, locations, key):
+        self.funcname = funcname
+        self.start = start
+
+        # dict mapping from (file, line, column) to gcc.Location, so that
+        # the diagnostics can be recreated after the function has gone:
+        self.locations = locations
+
+        # Fingerprint for storing the result in the cache (or None):
+        self.key = key
+
+        # The cache entry (None if the analysis failed):
+        self.entry = None
+
+        # Can the entry be stored in the cache?
+        self.cacheable = True
+
+        # Have the report files been written out yet?
+        self.wrote_reportfiles = False
+
+    def get_sort_key(self):
+        return (self.start.file, self.start.line, self.start.column)
+
+class WorkerPool:
+    """
+    A pool of up to "jobs" worker processes
+
+    maxseconds, deadline, maxmb: budgets for each function, as per the
+    Limits class
+    """
+    def __init__(self, jobs, cache=None,
+                 maxseconds=None, deadline=None, maxmb=None):
+        check_isinstance(jobs, int)
+        self.jobs = jobs
+        self.cache = cache
+        self.maxseconds = maxseconds
+        self.deadline = deadline
+        self.maxmb = maxmb
+
+        # dict mapping from pid to (Result, path of file for the entry):
+        self.running = {}
+
+        # list of Result instances:
+        self.finished = []
+
+    def submit(self, fun, settings):
+        """
+        Analyze the given function in a worker process, using
+        refcounts.analyze_refcounts, with the given dict as its keyword
+        arguments
+        """
+        check_isinstance(fun, gcc.Function)
+        from libcpychecker.refcounts import analyze_refcounts, Limits
+        from libcpychecker.profiling import begin_function, end_function
+
+        result = Result(fun.decl.name, fun.start, get_locations(fun), None)
+        if self.cache:
+            result.key = get_function_fingerprint(fun, settings)
+            entry = self.cache.lookup(result.key)
+            if entry:
+                if get_diagnostics(entry, result.locations) is not None:
+                    log('using cached results for %s', fun.decl.name)
+                    result.entry = entry
+                    result.key = None
+                    self.finished.append(result)
+                    return
+
+        while len(self.running) >= self.jobs:
+            self._wait_for_one()
+
+        fd, path = tempfile.mkstemp(prefix='cpychecker-', suffix='.json')
+        os.close(fd)
+
+        # Don't let the worker inherit any buffered output:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        pid = os.fork()
+        if pid == 0:
+            # Worker process; this must never return into the compiler:
+            status = 1
+            try:
+                limits = Limits(maxtrans=settings['maxtrans'],
+                                maxseconds=self.maxseconds,
+                                deadline=self.deadline,
+                                maxmb=self.maxmb)
+                prof = begin_function(fun)
+                saved, reportfiles = analyze_refcounts(fun, limits=limits,
+                                                       **settings)
+                end_function(prof)
+                with open(path, 'w') as f:
+                    json.dump(dict(entry=make_entry(saved, reportfiles),
+                                   cacheable=not limits.exceeded_resource_budget()),
+                              f)
+                status = 0
+            except:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(status)
+
+        log('analyzing %s in worker process %i', fun.decl.name, pid)
+        self.running[pid] = (result, path)
+
+    def _wait_for_one(self):
+        # Only wait for our own workers, rather than using waitpid(-1), which
+        # would reap (and discard) any other child of the compiler:
+        while True:
+            for pid in sorted(self.running):
+                finished, status = os.waitpid(pid, os.WNOHANG)
+                if finished:
+                    self._on_worker_exit(pid, status)
+                    return
+            time.sleep(POLL_INTERVAL)
+
+    def _on_worker_exit(self, pid, status):
+        result, path = self.running.pop(pid)
+        log('worker process %i finished with status %i', pid, status)
+        if status == 0:
+            with open(path) as f:
+                js = json.load(f)
+            result.entry = js['entry']
+            result.cacheable = js['cacheable']
+            # (the worker has already written out any report files)
+            result.wrote_reportfiles = True
+        os.unlink(path)
+        self.finished.append(result)
+
+    def finish(self):
+        """
+        Wait for all of the workers, then emit the diagnostics for all of
+        the functions, in source order
+        """
+        from libcpychecker.refcounts import write_saved_report_files, \
+            add_saved_report_data
+
+        while self.running:
+            self._wait_for_one()
+
+        for result in sorted(self.finished, key=Result.get_sort_key):
+            if result.entry is None:
+                gcc.error(result.start,
+                          ('the reference-count checker failed to analyze'
+                           ' function %r' % result.funcname))
+                continue
+            if not result.wrote_reportfiles:
+                write_saved_report_files(result.funcname,
+                                         result.entry['reportfiles'])
+            else:
+                # The worker couldn't add to our per-translation-unit reports:
+                add_saved_report_data(result.entry['reportfiles'])
+            for d in get_diagnostics(result.entry, result.locations,
+                                     result.start):
+                d.flush()
+            if self.cache and result.key and result.cacheable:
+                self.cache.store(result.key, result.entry)
+        self.finished = []
@@ -0,0 +1,156 @@
+"""Compact encoding of the states within an error report.
+
+A trace through a function can have hundreds of states, each of which lists
+the values of all of the variables, most of which are the same as in the
+previous state.  The compact encoding (see json.rst) stores each distinct
+location, variable name and value once, in tables, and each state as the
+changes to the variables since the previous state.
+
+This module doesn't depend on GCC, so that the reports can be expanded
+again outside of the compiler.
+"""
+from __future__ import unicode_literals
+
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+from json import dumps
+
+
+class Interner(object):
+    """A table of distinct items, each referred to by its index."""
+    def __init__(self, getkey=None):
+        self.items = []
+        self.index_for_key = {}
+        self.getkey = getkey
+
+    def __call__(self, item):
+        """Get the index of the item, adding it to the table if need be."""
+        key = self.getkey(item) if self.getkey else item
+        index = self.index_for_key.get(key)
+        if index is None:
+            index = len(self.items)
+            self.items.append(item)
+            self.index_for_key[key] = index
+        return index
+
+
+def location_key(location):
+    """Convert a location (a pair of dicts) into a flat list."""
+    start, end = location
+    return (start['line'], start['column'], end['line'], end['column'])
+
+
+def location_from_key(key):
+    """The inverse of location_key."""
+    return [dict(line=key[0], column=key[1]),
+            dict(line=key[2], column=key[3])]
+
+
+def compact_states(states):
+    """Encode a list of states, as per State.as_json, into the compact form.
+    """
+    locations = Interner()
+    names = Interner()
+    values = Interner(getkey=lambda value: dumps(value, sort_keys=True))
+
+    def intern_location(location):
+        if location:
+            return locations(location_key(location))
+        return None
+
+    def intern_value(value):
+        if 'value_comes_from' in value:
+            value = dict(value)
+            value['value_comes_from'] = intern_location(
+                value['value_comes_from'])
+        return values(value)
+
+    result = []
+    prev = {}
+    for state in states:
+        variables = state['variables']
+        cur = {}
+        changes = []
+        for name in variables:
+            value = intern_value(variables[name])
+            cur[name] = value
+            if prev.get(name) != value:
+                changes.append([names(name), value])
+        for name in prev:
+            if name not in cur:
+                changes.append([names(name), None])
+        result.append([intern_location(state['location']),
+                       state['message'],
+                       changes])
+        prev = cur
+
+    return dict(locations=[list(key) for key in locations.items],
+                names=names.items,
+                values=values.items,
+                states=result)
+
+
+def expand_states(trace):
+    """Decode the result of compact_states, giving a list of states, as per
+    State.as_json."""
+    locations = [location_from_key(key) for key in trace['locations']]
+    names = trace['names']
+
+    values = []
+    for value in trace['values']:
+        if 'value_comes_from' in value:
+            value = dict(value)
+            index = value['value_comes_from']
+            if index is not None:
+                value['value_comes_from'] = locations[index]
+        values.append(value)
+
+    result = []
+    variables = {}
+    for location, message, changes in trace['states']:
+        variables = dict(variables)
+        for name, value in changes:
+            if value is None:
+                del variables[names[name]]
+            else:
+                variables[names[name]] = values[value]
+        result.append(dict(
+            location=locations[location] if location is not None else None,
+            message=message,
+            variables=variables,
+        ))
+    return result
+
+
+def expand_report(report):
+    """Get a report, as per Report.to_json, with its states expanded if they
+    were in the compact form."""
+    if 'trace' not in report:
+        return report
+    report = dict(report)
+    report['states'] = expand_states(report.pop('trace'))
+    return report
+
+
+def expand_function(data):
+    """As per expand_report, but for all of the reports within a function.
+    """
+    if not any('trace' in report for report in data['reports']):
+        return data
+    data = dict(data)
+    data['reports'] = [expand_report(report) for report in data['reports']]
+    return data
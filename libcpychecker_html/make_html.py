@@ -28,6 +28,7 @@ from os.path import realpath, dirname, join
 HERE = dirname(realpath(__file__))
 
 from . import capi
+from .compact import expand_report
 
 from lxml.html import (
     tostring, fragment_fromstring as parse, builder as E
@@ -66,22 +67,7 @@ class HtmlPage(object):
 
     def head(self):
         """The HEAD of the html document"""
-        head = E.HEAD(
-            E.META({
-                'http-equiv': 'Content-Type',
-                'content': 'text/html; charset=utf-8'
-            }),
-            E.TITLE('%s -- GCC Python Plugin' % self.data['filename']),
-        )
-        head.extend(
-            E.STYLE(
-                file_contents(css + '.css'),
-                media='screen',
-                type='text/css'
-            )
-            for css in ('extlib/reset-20110126.min', 'pygments_c', 'style')
-        )
-        return head
+        return make_head(self.data['filename'])
 
     def raw_code(self):
         """Get the correct lines from the code file"""
@@ -103,15 +89,7 @@ class HtmlPage(object):
 
         # Use pygments to convert it all to HTML:
         code = parse(highlight(self.raw_code(), CLexer(), formatter))
-
-        # linkify the python C-API functions
-        for name in code.xpath('//span[@class="n"]'):
-            url = capi.get_url(name.text)
-            if url is not None:
-                link = E.A(name.text, href=url)
-                name.text = None
-                name.append(link)
-
+        linkify_capi(code)
         return code
 
     def header(self):
@@ -188,48 +166,7 @@ class HtmlPage(object):
     def states(self):
         """Return an ordered-list of states, for each report."""
         for report in self.data['reports']:
-            annotations = E.OL({'class': 'states'})
-
-            prevline = None
-            lineno_to_index = {}
-            index = -1
-            for state in report['states']:
-                if not state['location'] or not state['message']:
-                    continue
-
-                line = state['location'][0]['line']
-                state = E.P(state['message'])
-
-                # We try to combine with the previous state.
-                if line != prevline:
-                    child = E.LI({'data-line': str(line)})
-                    annotations.append(child)
-                    index += 1
-
-                child.append(state)
-
-                lineno_to_index[line] = (index, child)
-                prevline = line
-
-            for note in report['notes']:
-                line = note['location'][0]['line']
-                note = E.P({'class': 'note'}, note['message'])
-
-                # Put this note on the last matching state, if possible
-                for ann in reversed(tuple(annotations)):
-                    annline = int(ann.attrib['data-line'])
-                    if line == annline:
-                        ann.append(note)
-                        break
-                    elif line > annline:
-                        ann.addnext(
-                            E.LI({'data-line': str(line)}, note)
-                        )
-                        break
-                else:
-                    annotations.insert(0, E.LI({'data-line': str(line)}, note))
-
-            yield annotations, report['message']
+            yield report_states(report)
 
     def body(self):
         """The BODY of the html document"""
@@ -237,36 +174,247 @@ class HtmlPage(object):
         code = self.code()
 
         for i, (state_html, state_problem) in enumerate(self.states(), 1):
-            reports.append(
-                E.LI(
-                    E.ATTR(id="state{0}".format(i)),
-                    E.E.header(
-                        E.DIV(
-                            E.CLASS('error'),
-                            state_problem,
-                        ),
-                        E.DIV(
-                            E.CLASS('report-count'),
-                            E.H3('Report'),
-                            str(i),
-                        ),
+            reports.append(make_report_item(i, state_html, state_problem, code))
+
+        return E.BODY(
+            self.header(),
+            reports,
+            self.footer(),
+        )
+
+
+class HighlightedSource(object):
+    """A whole source file, highlighted once, so that the code of each of the
+    functions within it can be extracted without highlighting it again."""
+    def __init__(self, codefile):
+        formatter = CodeHtmlFormatter(
+            style='default',
+            cssclass='source',
+            linenostart=1,
+        )
+        # (don't strip leading newlines, so that rows match line numbers)
+        code = parse(highlight(codefile.read(), CLexer(stripnl=False),
+                               formatter))
+        linkify_capi(code)
+        if code.tag != 'table':
+            code = code.find('.//table')
+        self.rows = list(code)
+
+    def code(self, first, last):
+        """Get a table of the given lines, as per HtmlPage.code()"""
+        # Line numbers are ONE-based
+        return E.TABLE(
+            {'data-first-line': str(first)},
+            *(deepcopy(row) for row in self.rows[first - 1:last])
+        )
+
+
+class TranslationUnitPage(object):
+    """Represent one html page, covering all of the functions with reports
+    within a translation unit.
+
+    functions: a list of the data for each function, as per HtmlPage
+    """
+    def __init__(self, title, functions):
+        self.title = title
+        self.functions = functions
+        # Mapping from filename to HighlightedSource (or None if the file
+        # couldn't be read):
+        self.sources = {}
+
+    def __str__(self):
+        html = tostring(self.__html__())
+        return '<!DOCTYPE html>\n' + html.decode('utf-8')
+
+    def __html__(self):
+        return E.HTML(make_head(self.title), self.body())
+
+    def get_source(self, filename):
+        """Get the HighlightedSource for the given file, highlighting each
+        file at most once."""
+        if filename not in self.sources:
+            try:
+                with open(filename) as codefile:
+                    self.sources[filename] = HighlightedSource(codefile)
+            except IOError:
+                self.sources[filename] = None
+        return self.sources[filename]
+
+    def code(self, data):
+        """generate the contents of the #code section for one function"""
+        first, last = data['function']['lines']
+        source = self.get_source(data['filename'])
+        if source is None:
+            return E.TABLE({'data-first-line': str(first)})
+        return source.code(first, last)
+
+    def header(self, index):
+        """Make the header bar of the webpage"""
+        return E.E.header(
+            E.ATTR(id='header'),
+            E.DIV(
+                E.ATTR(id='title'),
+                E.H1(
+                    E.A(
+                        'GCC Python Plugin',
+                        href='http://gcc-python-plugin.readthedocs.org/',
                     ),
-                    E.DIV(
-                        E.CLASS('body'),
-                        E.DIV(
-                            E.CLASS('source'),
-                            deepcopy(code),
-                        ),
-                        state_html,
+                ),
+                E.DIV(
+                    E.ATTR(id='info'),
+                    E.SPAN(
+                        E.CLASS('label'),
+                        'Translation unit: ',
+                    ),
+                    self.title,
+                ),
+                E.DIV(
+                    E.ATTR(id='report-pagination'),
+                    E.SPAN(
+                        E.CLASS('label'),
+                        'Function: ',
                     ),
+                    *(
+                        E.A(name, href="#state{0}".format(i))
+                        for name, i in index
+                    )
                 ),
-            )
+            ),
+        )
+
+    def body(self):
+        """The BODY of the html document"""
+        reports = E.OL(id='reports')
+        index = []
+        i = 0
+        for data in self.functions:
+            # (don't list functions without any reports in the index)
+            if not data['reports']:
+                continue
+            code = self.code(data)
+            index.append((data['function']['name'], i + 1))
+            for report in data['reports']:
+                i += 1
+                state_html, state_problem = report_states(report)
+                item = make_report_item(i, state_html, state_problem, code)
+                item.find('header').insert(
+                    0,
+                    E.DIV(
+                        E.CLASS('function'),
+                        '%s: %s' % (data['filename'],
+                                    data['function']['name']),
+                    )
+                )
+                reports.append(item)
 
         return E.BODY(
-            self.header(),
+            self.header(index),
             reports,
-            self.footer(),
+            HtmlPage.footer(),
+        )
+
+
+def make_head(title):
+    """The HEAD of an html document"""
+    head = E.HEAD(
+        E.META({
+            'http-equiv': 'Content-Type',
+            'content': 'text/html; charset=utf-8'
+        }),
+        E.TITLE('%s -- GCC Python Plugin' % title),
+    )
+    head.extend(
+        E.STYLE(
+            file_contents(css + '.css'),
+            media='screen',
+            type='text/css'
         )
+        for css in ('extlib/reset-20110126.min', 'pygments_c', 'style')
+    )
+    return head
+
+
+def linkify_capi(code):
+    """linkify the python C-API functions"""
+    for name in code.xpath('//span[@class="n"]'):
+        url = capi.get_url(name.text)
+        if url is not None:
+            link = E.A(name.text, href=url)
+            name.text = None
+            name.append(link)
+
+
+def make_report_item(i, state_html, state_problem, code):
+    """Make the list item for the i-th report (ONE-based)"""
+    return E.LI(
+        E.ATTR(id="state{0}".format(i)),
+        E.E.header(
+            E.DIV(
+                E.CLASS('error'),
+                state_problem,
+            ),
+            E.DIV(
+                E.CLASS('report-count'),
+                E.H3('Report'),
+                str(i),
+            ),
+        ),
+        E.DIV(
+            E.CLASS('body'),
+            E.DIV(
+                E.CLASS('source'),
+                deepcopy(code),
+            ),
+            state_html,
+        ),
+    )
+
+
+def report_states(report):
+    """Return an ordered-list of states for a report, and its message."""
+    report = expand_report(report)
+    annotations = E.OL({'class': 'states'})
+
+    prevline = None
+    lineno_to_index = {}
+    index = -1
+    for state in report['states']:
+        if not state['location'] or not state['message']:
+            continue
+
+        line = state['location'][0]['line']
+        state = E.P(state['message'])
+
+        # We try to combine with the previous state.
+        if line != prevline:
+            child = E.LI({'data-line': str(line)})
+            annotations.append(child)
+            index += 1
+
+        child.append(state)
+
+        lineno_to_index[line] = (index, child)
+        prevline = line
+
+    for note in report['notes']:
+        line = note['location'][0]['line']
+        note = E.P({'class': 'note'}, note['message'])
+
+        # Put this note on the last matching state, if possible
+        for ann in reversed(tuple(annotations)):
+            annline = int(ann.attrib['data-line'])
+            if line == annline:
+                ann.append(note)
+                break
+            elif line > annline:
+                ann.addnext(
+                    E.LI({'data-line': str(line)}, note)
+                )
+                break
+        else:
+            annotations.insert(0, E.LI({'data-line': str(line)}, note))
+
+    return annotations, report['message']
 
 
 def data_uri(mimetype, filename):
@@ -280,7 +428,8 @@ def data_uri(mimetype, filename):
 def file_contents(filename):
     """Add a leading newline to make the first line show up in the right spot.
     """
-    return '\n' + open(join(HERE, filename)).read()
+    with open(join(HERE, filename)) as f:
+        return '\n' + f.read()
 
 
 class CodeHtmlFormatter(HtmlFormatter):
@@ -308,7 +457,13 @@ def main(argv):
 
     from json import load
     codefile = open(argv[1])
-    data = load(open(argv[2]))
+    if argv[2].endswith('.gz'):
+        import gzip
+        import io
+        jsonfile = io.TextIOWrapper(gzip.open(argv[2]), encoding='UTF-8')
+    else:
+        jsonfile = open(argv[2])
+    data = load(jsonfile)
     print(HtmlPage(codefile, data))
 
 if __name__ == '__main__':
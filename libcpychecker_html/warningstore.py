@@ -0,0 +1,271 @@
+"""A persistent store of the refcount checker's warnings, across builds.
+
+Each compilation run with --warning-db records the warnings for its
+translation unit into an SQLite database, keyed by build, package, source
+file, function, and a fingerprint of the warning.  Comparing two builds
+(e.g. two mass rebuilds of a distribution, or two versions of a package)
+is then a query on the database, rather than needing the HTML reports for
+each build to be scraped again.
+
+Each translation unit is recorded even if it has no warnings, so that a
+warning is only reported as "fixed" if its package was built both times.
+
+This module doesn't depend on GCC, so that the database can be queried
+outside of the compiler:
+
+    python -m libcpychecker_html.warningstore builds DB
+    python -m libcpychecker_html.warningstore diff DB OLD NEW [--package P]
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+from collections import namedtuple
+import hashlib
+import re
+import sqlite3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS units (
+    build TEXT NOT NULL,
+    package TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    PRIMARY KEY (build, package, unit)
+);
+CREATE TABLE IF NOT EXISTS warnings (
+    build TEXT NOT NULL,
+    package TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    file TEXT NOT NULL,
+    function TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    message TEXT NOT NULL,
+    line INTEGER,
+    PRIMARY KEY (build, package, unit, file, function, fingerprint)
+);
+CREATE INDEX IF NOT EXISTS warnings_by_key
+    ON warnings (package, file, function, fingerprint, build);
+'''
+
+# How long to wait for other compilations to finish writing to the database
+# (in seconds):
+TIMEOUT = 600
+
+
+class WarningRecord(namedtuple('WarningRecord',
+                               ('package', 'file', 'function', 'fingerprint',
+                                'message', 'line'))):
+    """One warning, as stored in the database."""
+    def __str__(self):
+        if self.line is not None:
+            where = '%s:%i' % (self.file, self.line)
+        else:
+            where = self.file
+        if self.package:
+            where = '%s: %s' % (self.package, where)
+        return '%s: %s: %s' % (where, self.function, self.message)
+
+
+class BuildDiff(namedtuple('BuildDiff',
+                           ('new', 'fixed', 'persisting',
+                            'only_in_old', 'only_in_new'))):
+    """The result of WarningDb.diff.
+
+    new, fixed, persisting: lists of WarningRecord (from the newer build,
+    except for the fixed ones)
+    only_in_old, only_in_new: the names of the packages only built once, whose
+    warnings aren't in the above
+    """
+
+
+def get_fingerprint(message):
+    """Get a fingerprint for a warning, given its message.
+
+    Line numbers within the message (e.g. "at foo.c:523") are ignored, so
+    that the warning keeps its fingerprint if the code around it changes.
+    """
+    message = re.sub(r'(\S+\.\w+):\d+', r'\1', message)
+    return hashlib.sha1(message.encode('utf-8')).hexdigest()
+
+
+def warnings_from_report_data(package, data, filename=None):
+    """Get a WarningRecord for each report within a function's data, as per
+    Reporter.to_json (either in the full or compact form).
+
+    filename: the name to record for the source file (if not that within the
+    data)"""
+    if filename is None:
+        filename = data['filename']
+    function = data['function']['name']
+    for report in data['reports']:
+        location = report.get('location')
+        yield WarningRecord(package=package,
+                            file=filename,
+                            function=function,
+                            fingerprint=get_fingerprint(report['message']),
+                            message=report['message'],
+                            line=location[0]['line'] if location else None)
+
+
+class WarningDb(object):
+    """A connection to a database of warnings."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename, timeout=TIMEOUT)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def add_unit(self, build, package, unit, warnings):
+        """Record the warnings for a translation unit within a build,
+        replacing any from an earlier compilation of it."""
+        rows = [(build, package, unit,
+                 w.file, w.function, w.fingerprint, w.message, w.line)
+                for w in warnings]
+        with self.conn:
+            self.conn.execute('DELETE FROM warnings'
+                              ' WHERE build = ? AND package = ? AND unit = ?',
+                              (build, package, unit))
+            self.conn.execute('INSERT OR REPLACE INTO units VALUES (?, ?, ?)',
+                              (build, package, unit))
+            # (several reports within a function can have the same
+            # fingerprint; only the first is kept)
+            self.conn.executemany('INSERT OR IGNORE INTO warnings'
+                                  ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                  rows)
+
+    def get_builds(self):
+        """Get a list of (build, number of packages, number of units, number
+        of warnings) tuples, for each of the builds in the database."""
+        cursor = self.conn.execute('''
+            SELECT build, COUNT(DISTINCT package), COUNT(*),
+                   (SELECT COUNT(*) FROM warnings
+                    WHERE warnings.build = units.build)
+            FROM units
+            GROUP BY build
+            ORDER BY build''')
+        return cursor.fetchall()
+
+    def get_packages(self, build):
+        cursor = self.conn.execute('SELECT DISTINCT package FROM units'
+                                   ' WHERE build = ?', (build, ))
+        return set(row[0] for row in cursor)
+
+    def get_warnings(self, build, other=None, in_other=False, package=None):
+        """Get the warnings within a build, as a list of WarningRecord.
+
+        If other is given, only get those from packages that are also in the
+        other build, and which are (if in_other) or aren't (if not in_other)
+        also in the other build."""
+        # Warnings from a source file that's shared between translation
+        # units (e.g. a header) appear once per unit; only list them once:
+        sql = '''
+            SELECT package, file, function, fingerprint, MIN(message), MIN(line)
+            FROM warnings AS w
+            WHERE build = :build'''
+        if package is not None:
+            sql += ' AND package = :package'
+        if other is not None:
+            sql += '''
+              AND package IN (SELECT package FROM units WHERE build = :other)
+              AND %s EXISTS (SELECT 1 FROM warnings AS o
+                             WHERE o.package = w.package
+                               AND o.file = w.file
+                               AND o.function = w.function
+                               AND o.fingerprint = w.fingerprint
+                               AND o.build = :other)''' % (
+                '' if in_other else 'NOT')
+        sql += '''
+            GROUP BY package, file, function, fingerprint
+            ORDER BY package, file, MIN(line), function'''
+        cursor = self.conn.execute(sql, dict(build=build, other=other,
+                                             package=package))
+        return [WarningRecord(*row) for row in cursor]
+
+    def diff(self, old, new, package=None):
+        """Compare the warnings of two builds, giving a BuildDiff."""
+        oldpackages = self.get_packages(old)
+        newpackages = self.get_packages(new)
+        only_in_old = oldpackages - newpackages
+        only_in_new = newpackages - oldpackages
+        if package is not None:
+            only_in_old &= set([package])
+            only_in_new &= set([package])
+        return BuildDiff(
+            new=self.get_warnings(new, old, False, package),
+            fixed=self.get_warnings(old, new, False, package),
+            persisting=self.get_warnings(new, old, True, package),
+            only_in_old=sorted(only_in_old),
+            only_in_new=sorted(only_in_new))
+
+
+def main(argv):
+    """our entry point"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='warningstore',
+        description='Query a database of warnings written by'
+                    ' gcc-with-cpychecker --warning-db')
+    subparsers = parser.add_subparsers(dest='command')
+
+    builds = subparsers.add_parser('builds',
+                                   help='List the builds in the database')
+    builds.add_argument('db')
+
+    diff = subparsers.add_parser('diff',
+                                 help=('List the new, fixed and persisting'
+                                       ' warnings between two builds'))
+    diff.add_argument('db')
+    diff.add_argument('old')
+    diff.add_argument('new')
+    diff.add_argument('--package',
+                      help='Only compare the given package')
+    diff.add_argument('--show',
+                      default='new,fixed',
+                      help=('Comma-separated list of which warnings to list:'
+                            ' new, fixed, persisting (default: new,fixed)'))
+
+    ns = parser.parse_args(argv[1:])
+    if ns.command is None:
+        parser.error('a command is required')
+    db = WarningDb(ns.db)
+    try:
+        if ns.command == 'builds':
+            for build, packages, units, warnings in db.get_builds():
+                print('%s: %i package(s), %i unit(s), %i warning(s)'
+                      % (build, packages, units, warnings))
+        else:
+            result = db.diff(ns.old, ns.new, ns.package)
+            show = ns.show.split(',')
+            for kind in ('new', 'fixed', 'persisting'):
+                warnings = getattr(result, kind)
+                print('%s: %i warning(s)' % (kind, len(warnings)))
+                if kind in show:
+                    for w in warnings:
+                        print('  %s' % w)
+            for name in result.only_in_old:
+                print('not in %s: %s' % (ns.new, name))
+            for name in result.only_in_new:
+                print('not in %s: %s' % (ns.old, name))
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    from sys import argv as ARGV
+    exit(main(ARGV))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify the per-Facet registry of impl_* handlers, and the dispatch tables
+# built from them
+
+import unittest
+
+from libcpychecker.absinterp import Facet, get_dispatch_table
+
+class BaseFacet(Facet):
+    __slots__ = ()
+
+    def impl_foo(self, stmt):
+        return 'BaseFacet.foo'
+
+    def impl_bar(self, stmt):
+        return 'BaseFacet.bar'
+
+class DerivedFacet(BaseFacet):
+    __slots__ = ()
+
+    # Overrides that of the base class:
+    def impl_foo(self, stmt):
+        return 'DerivedFacet.foo'
+
+    def impl_baz(self, stmt):
+        return 'DerivedFacet.baz'
+
+class OtherFacet(Facet):
+    __slots__ = ()
+
+    def impl_foo(self, stmt):
+        return 'OtherFacet.foo'
+
+    def impl_other(self, stmt):
+        return 'OtherFacet.other'
+
+def make_facet(cls):
+    # (the handlers don't need a State)
+    return cls.__new__(cls)
+
+def call(table, fnname, facets):
+    attrname, methname, meth = table[fnname]
+    return meth(facets[attrname], None)
+
+class HandlerTests(unittest.TestCase):
+    def test_base_handlers(self):
+        handlers = BaseFacet.get_handlers()
+        self.assertEqual(sorted(handlers.keys()), ['bar', 'foo'])
+        self.assertEqual(handlers['foo'](make_facet(BaseFacet), None),
+                         'BaseFacet.foo')
+
+    def test_derived_handlers(self):
+        handlers = DerivedFacet.get_handlers()
+        # Both the inherited and the new handlers are present:
+        self.assertEqual(sorted(handlers.keys()), ['bar', 'baz', 'foo'])
+        facet = make_facet(DerivedFacet)
+        # The most-derived handler is used:
+        self.assertEqual(handlers['foo'](facet, None), 'DerivedFacet.foo')
+        self.assertEqual(handlers['bar'](facet, None), 'BaseFacet.bar')
+        self.assertEqual(handlers['baz'](facet, None), 'DerivedFacet.baz')
+
+    def test_tables_are_per_class(self):
+        # Building the subclass's table doesn't affect the base class's:
+        DerivedFacet.get_handlers()
+        self.assertNotIn('baz', BaseFacet.get_handlers())
+        self.assertIsNot(BaseFacet.get_handlers(),
+                         DerivedFacet.get_handlers())
+        # ...and each is only built once:
+        self.assertIs(DerivedFacet.get_handlers(),
+                      DerivedFacet.get_handlers())
+
+    def test_dispatch_table(self):
+        facets = {'api': make_facet(DerivedFacet)}
+        table = get_dispatch_table({'api': DerivedFacet})
+        self.assertEqual(sorted(table.keys()), ['bar', 'baz', 'foo'])
+        self.assertEqual(table['foo'][:2], ('api', 'impl_foo'))
+        self.assertEqual(call(table, 'foo', facets), 'DerivedFacet.foo')
+        self.assertEqual(call(table, 'bar', facets), 'BaseFacet.bar')
+        # The same table is reused for the same facets:
+        self.assertIs(get_dispatch_table({'api': DerivedFacet}), table)
+
+    def test_several_facets(self):
+        facets = {'api': make_facet(DerivedFacet),
+                  'other': make_facet(OtherFacet)}
+        table = get_dispatch_table({'api': DerivedFacet,
+                                    'other': OtherFacet})
+        self.assertEqual(call(table, 'baz', facets), 'DerivedFacet.baz')
+        self.assertEqual(call(table, 'other', facets), 'OtherFacet.other')
+        # "foo" is handled by exactly one of them:
+        self.assertIn(call(table, 'foo', facets),
+                      ['DerivedFacet.foo', 'OtherFacet.foo'])
+
+    def test_unknown_function(self):
+        # A function that no facet implements has no entry, so that
+        # State.eval_stmt falls through to its default handling (summaries,
+        # or the generic treatment of unknown functions):
+        table = get_dispatch_table({'api': DerivedFacet})
+        self.assertEqual(table.get('PyUnknown_Function', None), None)
+        self.assertNotIn('impl_foo', table)
+
+import sys
+sys.argv = ['foo', '-v']
+
+unittest.main()
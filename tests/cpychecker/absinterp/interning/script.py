@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify the interning of the immutable abstract values: equal values are
+# shared, the table is emptied between functions, and values that can be
+# modified are never shared
+
+import unittest
+
+import gcc
+from libcpychecker.absinterp import ConcreteValue, PointerToRegion, \
+    DeallocatedMemory, UninitializedData, UnknownValue, WithinRange, \
+    Region, get_interned_value, clear_interned_values, _interned_values
+
+class InterningTests(unittest.TestCase):
+    def setUp(self):
+        clear_interned_values()
+        self.int_type = gcc.Type.int()
+
+    def tearDown(self):
+        clear_interned_values()
+
+    def test_concrete_value(self):
+        v1 = ConcreteValue(self.int_type, None, 42)
+        v2 = ConcreteValue(self.int_type, None, 42)
+        self.assertIs(v1, v2)
+        self.assertEqual(v1.value, 42)
+        self.assertIsNot(ConcreteValue(self.int_type, None, 43), v1)
+        # The type of the value is part of the key:
+        v3 = ConcreteValue(self.int_type, None, 42.0)
+        self.assertIsNot(v3, v1)
+        self.assertIsInstance(v3.value, float)
+
+    def test_pointer_to_region(self):
+        r1 = Region('r1', None)
+        r2 = Region('r2', None)
+        self.assertIs(PointerToRegion(None, None, r1),
+                      PointerToRegion(None, None, r1))
+        self.assertIsNot(PointerToRegion(None, None, r1),
+                         PointerToRegion(None, None, r2))
+
+    def test_poisoned_values(self):
+        self.assertIs(DeallocatedMemory(None, None),
+                      DeallocatedMemory(None, None))
+        self.assertIs(UninitializedData(None, None),
+                      UninitializedData(None, None))
+        # The class is part of the key:
+        self.assertIsNot(DeallocatedMemory(None, None),
+                         UninitializedData(None, None))
+
+    def test_get_interned_value(self):
+        v = get_interned_value(DeallocatedMemory, (None, None))
+        self.assertIs(get_interned_value(DeallocatedMemory, (None, None)), v)
+        self.assertIs(_interned_values[(DeallocatedMemory, None, None)], v)
+
+    def test_clear_interned_values(self):
+        # e.g. at the start of the analysis of the next function:
+        v1 = ConcreteValue(self.int_type, None, 42)
+        self.assertTrue(_interned_values)
+        clear_interned_values()
+        self.assertEqual(len(_interned_values), 0)
+        v2 = ConcreteValue(self.int_type, None, 42)
+        self.assertIsNot(v2, v1)
+        self.assertEqual(v2.value, 42)
+
+    def test_unknown_values_not_shared(self):
+        # These are compared by identity (e.g. when splitting them), so
+        # mustn't be shared:
+        self.assertIsNot(UnknownValue.make(self.int_type, None),
+                         UnknownValue.make(self.int_type, None))
+        self.assertIsNot(WithinRange(self.int_type, None, 0, 10),
+                         WithinRange(self.int_type, None, 0, 10))
+        self.assertEqual(len(_interned_values), 0)
+
+    def test_copy_not_shared(self):
+        # A copy can be modified (e.g. marked as "fromsplit") without
+        # affecting the interned instance:
+        v = ConcreteValue(self.int_type, None, 42)
+        copy = v.copy()
+        self.assertIsNot(copy, v)
+        self.assertEqual(copy.value, 42)
+        copy.fromsplit = True
+        self.assertFalse(hasattr(v, 'fromsplit'))
+        self.assertIs(ConcreteValue(self.int_type, None, 42), v)
+
+import sys
+sys.argv = ['foo', '-v']
+
+unittest.main()
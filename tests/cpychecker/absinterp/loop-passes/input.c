@@ -0,0 +1,42 @@
+/*
+   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2014 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+
+/*
+  A loop, for verifying the number of passes made around it when widening
+*/
+
+int
+test(int n)
+{
+    int i;
+    int total = 0;
+
+    for (i = 0; i < n; i++) {
+        total += i;
+    }
+
+    return total;
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
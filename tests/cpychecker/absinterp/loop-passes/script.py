@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that get_state_for_next_loop_pass gives up after MAX_LOOP_PASSES
+# passes around a loop (counting the back edges, not each arrival at the
+# head of the loop), using States that never reach a fixpoint
+
+import gcc
+from gccutils.graph.stmtgraph import StmtGraph
+from libcpychecker.absinterp import State, Trace, Transition, \
+    WideningTransition, get_state_for_next_loop_pass, MAX_LOOP_PASSES
+
+class NeverConvergingState(State):
+    def widen(self, s_other):
+        return NeverConvergingState(self.stmtgraph, self.stmtnode, None, {})
+
+def count_passes(stmtgraph, maxpasses):
+    entry = stmtgraph.entry
+    head = list(entry.succs)[0].dstnode
+    body = list(head.succs)[0].dstnode
+
+    def make_state(stmtnode):
+        return NeverConvergingState(stmtgraph, stmtnode, None, {})
+
+    s_head = make_state(head)
+    trace = Trace().add(Transition(make_state(entry), s_head, None))
+    passes = 0
+    while True:
+        # Go around the loop, back to its head:
+        s_body = make_state(body)
+        trace = trace.add(Transition(s_head, s_body, None))
+        s_back = make_state(head)
+        trace = trace.add(Transition(s_body, s_back, None))
+        passes += 1
+        s_widened = get_state_for_next_loop_pass(trace, maxpasses)
+        if s_widened is None:
+            return passes
+        trace = trace.add(WideningTransition(s_back, s_widened, None))
+        s_head = s_widened
+
+def on_pass_execution(optpass, fun):
+    # Only run in one pass
+    if optpass.name == '*warn_function_return':
+        if fun:
+            stmtgraph = StmtGraph(fun, split_phi_nodes=False)
+            print('MAX_LOOP_PASSES: %i' % MAX_LOOP_PASSES)
+            print('passes: %i' % count_passes(stmtgraph, MAX_LOOP_PASSES))
+            for maxpasses in (1, 2, 3):
+                print('maxpasses=%i: passes: %i'
+                      % (maxpasses, count_passes(stmtgraph, maxpasses)))
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
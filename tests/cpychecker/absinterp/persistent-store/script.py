@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that PersistentOrderedDict behaves like an OrderedDict, and that
+# copies are independent of each other
+from collections import OrderedDict
+from libcpychecker.persistent import PersistentOrderedDict
+
+class CollidingKey(object):
+    # Keys with identical hashes, to exercise the collision handling
+    def __init__(self, name):
+        self.name = name
+    def __hash__(self):
+        return 42
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.name == other.name
+    def __ne__(self, other):
+        return not self == other
+    def __repr__(self):
+        return 'CollidingKey(%r)' % self.name
+
+keys = ([i * 31 for i in range(100)]
+        + [-i for i in range(100)]
+        + ['str%i' % i for i in range(100)]
+        + [CollidingKey(i) for i in range(10)])
+
+od = OrderedDict()
+pod = PersistentOrderedDict()
+snapshots = []
+for i, key in enumerate(keys):
+    od[key] = i
+    pod[key] = i
+    if i % 50 == 0:
+        snapshots.append( (list(od.items()), pod.copy()) )
+for i, key in enumerate(keys):
+    if i % 3 == 0:
+        del od[key]
+        del pod[key]
+    elif i % 3 == 1:
+        od[key] = -i
+        pod[key] = -i
+# Re-insertion after deletion should go at the end:
+od[keys[0]] = 'again'
+pod[keys[0]] = 'again'
+
+assert len(od) == len(pod)
+assert list(od.items()) == pod.items()
+for key in keys:
+    assert (key in od) == (key in pod)
+    assert od.get(key) == pod.get(key)
+
+# Updates made after copy() must not affect the copies:
+for items, copy in snapshots:
+    assert items == copy.items()
+
+try:
+    del pod['not present']
+    assert False
+except KeyError:
+    pass
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that the compact encoding of the JSON error reports can be
+# expanded back into the full form
+
+import json
+import unittest
+
+from libcpychecker_html.compact import compact_states, expand_states, \
+    expand_report, expand_function
+
+EXAMPLE = 'libcpychecker_html/test/example1/bug.c.make_a_list_of_random_ints_badly.json'
+
+def load_example(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+def compact_function(data):
+    result = dict(data)
+    result['reports'] = []
+    for report in data['reports']:
+        report = dict(report)
+        report['trace'] = compact_states(report.pop('states'))
+        result['reports'].append(report)
+    return result
+
+class CompactTests(unittest.TestCase):
+    def test_round_trip(self):
+        data = load_example(EXAMPLE)
+        compact = compact_function(data)
+        self.assertEqual(expand_function(compact), data)
+        # The compact form ought to be smaller:
+        self.assertLess(len(json.dumps(compact)), len(json.dumps(data)))
+
+    def test_variables_removed(self):
+        value = dict(kind='UninitializedData', gcctype='int',
+                     value_comes_from=None)
+        states = [dict(location=None, message='', variables={}),
+                  dict(location=[dict(line=3, column=1),
+                                 dict(line=3, column=1)],
+                       message='when taking True path',
+                       variables=dict(i=value, j=value)),
+                  dict(location=None, message=None,
+                       variables=dict(j=value))]
+        trace = compact_states(states)
+        self.assertEqual(trace['names'], ['i', 'j'])
+        self.assertEqual(len(trace['values']), 1)
+        self.assertEqual(trace['states'][2], [None, None, [[0, None]]])
+        self.assertEqual(expand_states(trace), states)
+
+    def test_full_form_unchanged(self):
+        data = load_example(EXAMPLE)
+        self.assertIs(expand_function(data), data)
+        self.assertIs(expand_report(data['reports'][0]), data['reports'][0])
+
+import sys
+sys.argv = ['foo', '-v']
+
+unittest.main()
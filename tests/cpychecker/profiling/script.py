@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Drive the profiler (libcpychecker.profiling) with fake timings, and verify
+# the JSON lines that it writes out: one record per function, with the
+# expected fields, appended to those already in the file
+
+import json
+import os
+import shutil
+import tempfile
+
+import gcc
+from libcpychecker import profiling
+
+class FakeTime(object):
+    """
+    Replacement for the "time" module, in which each call to time() takes
+    a quarter of a second
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 0.25
+        return self.now
+
+profiling.time = FakeTime()
+
+tmpdir = tempfile.mkdtemp()
+filename = os.path.join(tmpdir, 'input.c.cpychecker-profile.jsonl')
+profiling.get_profile_filename = lambda: filename
+
+# Start with a file left over from an earlier compilation, which ought to be
+# discarded:
+with open(filename, 'w') as f:
+    f.write('{"function": "stale"}\n')
+profiling.enable()
+assert profiling.enabled
+with open(filename) as f:
+    print('after enable(): %r' % f.read())
+
+# A record written by another process (e.g. a worker analyzing another
+# function), which ought to be kept:
+with open(filename, 'a') as f:
+    f.write('{"function": "from_worker"}\n')
+
+def handler(facet, stmt):
+    return [facet, stmt]
+
+def on_pass_execution(optpass, fun):
+    # Only run in one pass
+    if optpass.name == '*warn_function_return':
+        if fun:
+            prof = profiling.begin_function(fun)
+            assert profiling.get_current_profile() is prof
+            prof.transitions = 3
+            prof.traces = 2
+            prof.states = 4
+            with profiling.Phase('traces'):
+                pass
+            for i in range(2):
+                assert (profiling.call_handler(prof, 'impl_foo', handler,
+                                               'facet', 'stmt')
+                        == ['facet', 'stmt'])
+            profiling.end_function(prof)
+            assert profiling.get_current_profile() is None
+
+def on_finish():
+    with open(filename) as f:
+        records = [json.loads(line) for line in f]
+    print('records: %i' % len(records))
+    # The record from the worker comes first, untouched:
+    print('first record: %s' % json.dumps(records[0]))
+    # ...followed by one per function (in whichever order GCC handled them):
+    for record in sorted(records[1:], key=lambda record: record['function']):
+        print('%s: %s' % (record['function'],
+                          ', '.join(sorted(record.keys()))))
+        print('  location: %s' % ', '.join(sorted(record['location'].keys())))
+        for key in ('transitions', 'traces', 'states', 'total_seconds',
+                    'phases', 'handlers'):
+            print('  %s: %s' % (key, json.dumps(record[key], sort_keys=True)))
+    shutil.rmtree(tmpdir)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
+gcc.register_callback(gcc.PLUGIN_FINISH,
+                      on_finish)
@@ -0,0 +1,40 @@
+/*
+   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2014 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+/*
+  Test that the result-cache fingerprint covers the layout of nested structs,
+  and the source text of the function (e.g. comments)
+*/
+
+struct inner {
+    int i;
+    char *s;
+};
+
+struct outer {
+    struct inner in;
+    struct outer *next;
+};
+
+int
+test(struct outer *o)
+{
+    /* This comment doesn't affect the GIMPLE */
+    return o->in.i;
+}
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that the fingerprint used by --cache-dir covers the layout of
+# structs nested within the types that a function uses, and the source
+# text that the HTML reports embed
+
+import gcc
+from libcpychecker.cache import _describe_type, _describe_source
+
+def on_pass_execution(optpass, fun):
+    # Only run in one pass
+    if optpass.name == '*warn_function_return':
+        if fun:
+            desc = _describe_type(fun.decl.arguments[0].type, set())
+            # The fields of the nested struct are described:
+            assert 'int i; char * s' in desc, desc
+            # ...but the self-reference doesn't recurse forever:
+            assert desc.count('struct inner {') == 1, desc
+            print('nested layout described')
+
+            desc = _describe_source(fun)
+            span = desc.split()[0]
+            print('source lines: %s' % span)
+            first, last = [int(i) for i in span.split('-')]
+            # The digested span covers the comment, so editing it changes the
+            # fingerprint:
+            with open(fun.start.file) as f:
+                src = f.readlines()
+            assert '/* This comment' in ''.join(src[first - 1:last])
+            print('source comment covered')
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Run the refcount checker twice on each function with the same cache
+# directory: the second run ought to replay the results of the first from
+# the cache, emitting exactly the same diagnostics
+
+import shutil
+import tempfile
+
+import gcc
+from libcpychecker import refcounts
+from libcpychecker.diagnostics import DiagnosticCapture
+
+cache_dir = tempfile.mkdtemp()
+
+# Count the functions that actually get analyzed:
+analyzed = []
+def analyze_refcounts(fun, **kwargs):
+    analyzed.append(fun.decl.name)
+    return _analyze_refcounts(fun, **kwargs)
+_analyze_refcounts = refcounts.analyze_refcounts
+refcounts.analyze_refcounts = analyze_refcounts
+
+def run_checker(fun):
+    with DiagnosticCapture() as capture:
+        refcounts.check_refcounts(fun, cache_dir=cache_dir)
+    return capture.diagnostics
+
+def on_pass_execution(optpass, fun):
+    # Only run in one pass
+    if optpass.name == '*warn_function_return':
+        if fun:
+            first = run_checker(fun)
+            second = run_checker(fun)
+            assert analyzed.count(fun.decl.name) == 1
+            assert ([d.as_json() for d in first]
+                    == [d.as_json() for d in second])
+            print('%s: analyzed, then replayed from the cache: same diagnostics'
+                  % fun.decl.name)
+            for d in second:
+                d.flush()
+
+def on_finish():
+    shutil.rmtree(cache_dir)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
+gcc.register_callback(gcc.PLUGIN_FINISH,
+                      on_finish)
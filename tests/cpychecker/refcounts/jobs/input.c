@@ -0,0 +1,107 @@
+/*
+   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2014 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+#include <Python.h>
+
+/*
+  Verify that the diagnostics from analyzing functions in worker processes
+  are emitted in source order, even though the first function takes longer
+  to analyze than the others
+*/
+
+PyObject *
+test_slow(PyObject *m)
+{
+    PyObject *item = PyLong_FromLong(4096);
+    if (!item) {
+        return NULL;
+    }
+
+    if (0 == PyModule_AddObject(m, "item_001", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_002", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_003", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_004", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_005", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_006", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_007", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_008", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_009", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_010", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_011", item)) {
+        Py_INCREF(item);
+    }
+
+    if (0 == PyModule_AddObject(m, "item_012", item)) {
+        Py_INCREF(item);
+    }
+
+    return item;
+}
+
+PyObject *
+test_objargs_1(PyObject *callable, PyObject *a)
+{
+    /* BUG: the arguments aren't NULL-terminated: */
+    return PyObject_CallFunctionObjArgs(callable, a);
+}
+
+PyObject *
+test_objargs_2(PyObject *callable, PyObject *a, PyObject *b)
+{
+    /* BUG: the arguments aren't NULL-terminated: */
+    return PyObject_CallFunctionObjArgs(callable, a, b);
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
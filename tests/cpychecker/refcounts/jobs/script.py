@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Analyze each function both in a pool of worker processes, and directly
+# (as with jobs=1), verifying that the pool emits the same diagnostics, in
+# source order
+
+import gcc
+from libcpychecker.diagnostics import DiagnosticCapture
+from libcpychecker.refcounts import check_refcounts
+from libcpychecker.workers import WorkerPool
+
+pool = WorkerPool(4)
+
+# list of ((file, line, column), diagnostics) pairs, one per function, from
+# running the checker directly:
+expected = []
+
+def on_pass_execution(optpass, fun):
+    # Only run in one pass
+    if optpass.name == '*warn_function_return':
+        if fun:
+            pool.submit(fun, dict(maxtrans=256))
+            with DiagnosticCapture() as capture:
+                check_refcounts(fun)
+            expected.append(((fun.start.file, fun.start.line,
+                              fun.start.column),
+                             capture.diagnostics))
+
+def on_finish_unit():
+    with DiagnosticCapture() as capture:
+        pool.finish()
+    in_source_order = []
+    for start, diagnostics in sorted(expected, key=lambda item: item[0]):
+        in_source_order += diagnostics
+    assert ([d.as_json() for d in capture.diagnostics]
+            == [d.as_json() for d in in_source_order])
+    for d in capture.diagnostics:
+        print('%s:%i: %s' % (d.kind, d.loc.line, d.msg))
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
+gcc.register_callback(gcc.PLUGIN_FINISH_UNIT,
+                      on_finish_unit)
@@ -0,0 +1,52 @@
+/*
+   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2014 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+#include <Python.h>
+
+/*
+  Verify that the refcount checker can cope with a function containing a
+  long sequence of statements, each of which leads to a new state in the
+  trace: iter_traces must not need a Python stack frame per state
+*/
+
+#define STEP      i = i + 1;
+#define STEP10    STEP STEP STEP STEP STEP STEP STEP STEP STEP STEP
+#define STEP100   STEP10 STEP10 STEP10 STEP10 STEP10 \
+                  STEP10 STEP10 STEP10 STEP10 STEP10
+#define STEP1000  STEP100 STEP100 STEP100 STEP100 STEP100 \
+                  STEP100 STEP100 STEP100 STEP100 STEP100
+
+int
+test_long_function(PyObject *self)
+{
+    int i = 0;
+
+    STEP1000
+    STEP1000
+
+    return i;
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+import sys
+
+import gcc
+from libcpychecker.absinterp import iter_traces
+from libcpychecker.refcounts import make_stmt_graph, CPython
+
+def verify_traces(optpass, fun):
+    # Only run in one pass
+    if optpass.name == '*warn_function_return':
+        if fun:
+            # Follow every transition, without any Limits:
+            traces = list(iter_traces(make_stmt_graph(fun),
+                                      {'cpython':CPython}))
+            print('traces: %i' % len(traces))
+
+            # The trace ought to be deeper than Python's recursion limit
+            # (which a recursive traversal of it would have exceeded):
+            assert len(traces[0].states) > sys.getrecursionlimit()
+            print('returned: %s' % traces[0].states[-1].return_rvalue.value)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      verify_traces)
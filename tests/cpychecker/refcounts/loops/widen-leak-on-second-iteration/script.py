@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Run the refcount checker on the function with and without --widen-loops,
+# printing the warnings it emits (and whether it gave up on the function)
+
+import gcc
+from libcpychecker.diagnostics import DiagnosticCapture
+from libcpychecker.refcounts import check_refcounts
+
+def check(fun, widen_loops):
+    with DiagnosticCapture() as capture:
+        check_refcounts(fun, widen_loops=widen_loops)
+    print('widen_loops=%r:' % widen_loops)
+    for d in capture.diagnostics:
+        if (d.kind == 'warning'
+            or d.msg.startswith('this function is too complicated')):
+            print('  %s:%i: %s' % (d.kind, d.loc.line, d.msg))
+
+def on_pass_execution(optpass, fun):
+    # Only run in one pass
+    if optpass.name == '*warn_function_return':
+        if fun:
+            check(fun, False)
+            check(fun, True)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
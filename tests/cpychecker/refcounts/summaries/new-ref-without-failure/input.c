@@ -0,0 +1,53 @@
+/*
+   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2014 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+#include <Python.h>
+
+/*
+  Test of the use of function summaries: with them, the checker knows that
+  get_none() always succeeds, and so the caller doesn't need to check for
+  NULL
+*/
+
+static PyObject *
+get_none(void)
+{
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+PyObject *
+test(PyObject *self, PyObject *args)
+{
+    PyObject *result = get_none();
+
+    /* No need to check for NULL: */
+    Py_INCREF(result);
+    Py_DECREF(result);
+
+    return result;
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
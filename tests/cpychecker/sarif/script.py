@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify the conversion of the error reports into SARIF, and the appending
+# of runs to a shared SARIF log
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from libcpychecker.sarif import SarifWriter, append_run, report_to_sarif, \
+    filename_to_uri, SARIF_VERSION
+
+EXAMPLE = 'libcpychecker_html/test/example1/bug.c.make_a_list_of_random_ints_badly.json'
+
+def load_example(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+class UriTests(unittest.TestCase):
+    def test_relative(self):
+        self.assertEqual(filename_to_uri('foo.c'), 'foo.c')
+        self.assertEqual(filename_to_uri('src/foo.c'), 'src/foo.c')
+
+    def test_escaping(self):
+        self.assertEqual(filename_to_uri('my src/foo#1.c'),
+                         'my%20src/foo%231.c')
+        self.assertEqual(filename_to_uri('100%.c'), '100%25.c')
+
+    def test_absolute(self):
+        self.assertEqual(filename_to_uri('/tmp/foo.c'), 'file:///tmp/foo.c')
+        self.assertEqual(filename_to_uri('/tmp/my src/foo.c'),
+                         'file:///tmp/my%20src/foo.c')
+
+class ReportToSarifTests(unittest.TestCase):
+    def test_example(self):
+        data = load_example(EXAMPLE)
+        result = report_to_sarif(data, data['reports'][0])
+        self.assertEqual(result['level'], 'warning')
+        self.assertEqual(result['message'],
+                         dict(text="ob_refcnt of '*item' is 1 too high"))
+
+        # The primary location is the last location within the trace:
+        (primary, ) = result['locations']
+        self.assertEqual(primary['logicalLocations'],
+                         [dict(name='make_a_list_of_random_ints_badly',
+                               kind='function')])
+        physical = primary['physicalLocation']
+        self.assertEqual(physical['artifactLocation'],
+                         dict(uri='libcpychecker_html/test/example1/bug.c'))
+        self.assertEqual(physical['region']['startLine'], 21)
+
+        # Each state with a location is a step within the codeFlow:
+        (codeflow, ) = result['codeFlows']
+        (threadflow, ) = codeflow['threadFlows']
+        self.assertEqual(len(threadflow['locations']), 15)
+        for step in threadflow['locations']:
+            self.assertIn('region', step['location']['physicalLocation'])
+
+        # Each note is a related location:
+        related = result['relatedLocations']
+        self.assertEqual([loc['id'] for loc in related], [0, 1, 2, 3, 4])
+        self.assertEqual(related[0]['message']['text'],
+                         data['reports'][0]['notes'][0]['message'])
+
+    def test_no_location(self):
+        data = dict(filename='foo.c',
+                    function=dict(name='test', lines=[1, 10]),
+                    reports=[])
+        report = dict(message='something went wrong', severity='error',
+                      notes=[], states=[])
+        result = report_to_sarif(data, report)
+        self.assertEqual(result['level'], 'error')
+        (primary, ) = result['locations']
+        self.assertEqual(primary['physicalLocation'],
+                         dict(artifactLocation=dict(uri='foo.c')))
+        self.assertNotIn('codeFlows', result)
+        self.assertNotIn('relatedLocations', result)
+
+    def test_columns(self):
+        # GCC uses 0 for an unknown column; SARIF columns are 1-based, so
+        # these are omitted:
+        data = dict(filename='foo.c',
+                    function=dict(name='test', lines=[1, 10]),
+                    reports=[])
+        report = dict(message='something went wrong', severity='warning',
+                      location=[dict(line=5, column=0),
+                                dict(line=6, column=3)],
+                      notes=[], states=[])
+        (primary, ) = report_to_sarif(data, report)['locations']
+        self.assertEqual(primary['physicalLocation']['region'],
+                         dict(startLine=5, endLine=6, endColumn=3))
+
+class WriterTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_run(self, filename, functions, shared_filename=None):
+        writer = SarifWriter(open(filename, 'w'), filename,
+                             shared_filename=shared_filename)
+        for data in functions:
+            writer.add_function(data)
+        writer.close()
+        return writer
+
+    def test_own_file(self):
+        filename = os.path.join(self.tmpdir, 'bug.c.cpychecker.sarif')
+        data = load_example(EXAMPLE)
+        writer = self.write_run(filename, [data, data])
+        self.assertEqual(writer.num_results, 4)
+        log = load_example(filename)
+        self.assertEqual(log['version'], SARIF_VERSION)
+        (run, ) = log['runs']
+        self.assertEqual(run['tool']['driver']['name'], 'cpychecker')
+        self.assertEqual(len(run['results']), 4)
+        self.assertEqual(run['results'][0],
+                         report_to_sarif(data, data['reports'][0]))
+
+    def test_no_results(self):
+        filename = os.path.join(self.tmpdir, 'empty.c.cpychecker.sarif')
+        self.write_run(filename, [])
+        (run, ) = load_example(filename)['runs']
+        self.assertEqual(run['results'], [])
+
+    def test_shared_file(self):
+        shared = os.path.join(self.tmpdir, 'build.sarif')
+        data = load_example(EXAMPLE)
+        for i, functions in enumerate([[data], [], [data, data]]):
+            run_filename = os.path.join(self.tmpdir, 'run%i' % i)
+            self.write_run(run_filename, functions, shared_filename=shared)
+            # The run is appended to the shared file, which is a valid SARIF
+            # log after each append, and the temporary file is removed:
+            self.assertFalse(os.path.exists(run_filename))
+            log = load_example(shared)
+            self.assertEqual(len(log['runs']), i + 1)
+        self.assertEqual([len(run['results']) for run in log['runs']],
+                         [2, 0, 4])
+
+    def test_append_to_other_file(self):
+        shared = os.path.join(self.tmpdir, 'other.sarif')
+        with open(shared, 'w') as f:
+            f.write('{"runs": []}\n')
+        run_filename = os.path.join(self.tmpdir, 'run')
+        SarifWriter(open(run_filename, 'w'), run_filename,
+                    shared_filename=shared).f.close()
+        self.assertRaises(ValueError, append_run, shared, run_filename)
+        # ...leaving the file untouched:
+        with open(shared) as f:
+            self.assertEqual(f.read(), '{"runs": []}\n')
+
+import sys
+sys.argv = ['foo', '-v']
+
+unittest.main()
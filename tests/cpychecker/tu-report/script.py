@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that the per-translation-unit HTML report highlights each source
+# file once, and slices out the correct lines for each function
+
+import json
+import unittest
+
+from libcpychecker_html.make_html import HighlightedSource, \
+    TranslationUnitPage, open
+from libcpychecker.tureport import TranslationUnitReport
+
+SOURCE = 'libcpychecker_html/test/example1/bug.c'
+EXAMPLE = 'libcpychecker_html/test/example1/bug.c.make_a_list_of_random_ints_badly.json'
+
+def load_example(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+def get_lines(table):
+    return [row.text_content().rstrip('\n') for row in table]
+
+class HighlightedSourceTests(unittest.TestCase):
+    def setUp(self):
+        with open(SOURCE) as f:
+            self.source = HighlightedSource(f)
+
+    def test_rows(self):
+        # One row per line of source:
+        self.assertEqual(len(self.source.rows), 22)
+        self.assertEqual(self.source.rows[0].text_content(),
+                         '#include <Python.h>\n')
+        # (including blank lines):
+        self.assertEqual(self.source.rows[1].text_content(), '\n')
+
+    def test_code(self):
+        # Line numbers are one-based, and the range is inclusive:
+        table = self.source.code(3, 5)
+        self.assertEqual(table.tag, 'table')
+        self.assertEqual(table.get('data-first-line'), '3')
+        self.assertEqual(get_lines(table),
+                         ['PyObject *',
+                          'make_a_list_of_random_ints_badly(PyObject *self,',
+                          '                                 PyObject *args)'])
+
+    def test_single_line(self):
+        table = self.source.code(11, 11)
+        self.assertEqual(table.get('data-first-line'), '11')
+        self.assertEqual(get_lines(table), ['         return NULL;'])
+
+    def test_end_of_file(self):
+        # The function lines within the JSON can run beyond the end of the
+        # file:
+        table = self.source.code(21, 23)
+        self.assertEqual(get_lines(table), ['    return list;', '}'])
+
+    def test_rows_are_copied(self):
+        table = self.source.code(3, 3)
+        table[0].clear()
+        self.assertEqual(self.source.code(3, 3)[0].text_content(),
+                         'PyObject *\n')
+
+class TranslationUnitPageTests(unittest.TestCase):
+    def make_functions(self):
+        whole = load_example(EXAMPLE)
+        # A second "function", covering just the early-return:
+        part = load_example(EXAMPLE)
+        part['function'] = dict(name='early_return', lines=[10, 12])
+        return [whole, part]
+
+    def test_code(self):
+        functions = self.make_functions()
+        page = TranslationUnitPage('bug.c', functions)
+        whole = page.code(functions[0])
+        self.assertEqual(whole.get('data-first-line'), '3')
+        self.assertEqual(len(whole), 20)
+        self.assertEqual(get_lines(whole)[-1], '}')
+        part = page.code(functions[1])
+        self.assertEqual(part.get('data-first-line'), '10')
+        self.assertEqual(get_lines(part),
+                         ['    if (!PyArg_ParseTuple(args, "i", &count)) {',
+                          '         return NULL;',
+                          '    }'])
+        # The source file was only highlighted once:
+        self.assertEqual(list(page.sources.keys()), [SOURCE])
+
+    def test_missing_source(self):
+        functions = self.make_functions()
+        functions[1]['filename'] = 'not-a-file.c'
+        page = TranslationUnitPage('bug.c', functions)
+        table = page.code(functions[1])
+        self.assertEqual(table.get('data-first-line'), '10')
+        self.assertEqual(len(table), 0)
+        self.assertEqual(page.sources['not-a-file.c'], None)
+
+    def test_html(self):
+        functions = self.make_functions()
+        html = str(TranslationUnitPage('bug.c', functions))
+        self.assertTrue(html.startswith('<!DOCTYPE html>\n'))
+        # Both functions are in the index:
+        self.assertIn('<a href="#state1">make_a_list_of_random_ints_badly</a>',
+                      html)
+        self.assertIn('<a href="#state3">early_return</a>', html)
+        # ...and there's an entry for each report of each function:
+        self.assertEqual(html.count('<li id="state'), 4)
+        self.assertIn('%s: early_return' % SOURCE, html)
+
+    def test_function_without_reports(self):
+        functions = self.make_functions()
+        functions[1]['reports'] = []
+        html = str(TranslationUnitPage('bug.c', functions))
+        self.assertIn('<a href="#state1">make_a_list_of_random_ints_badly</a>',
+                      html)
+        self.assertNotIn('early_return', html)
+        self.assertEqual(html.count('<li id="state'), 2)
+
+class TranslationUnitReportTests(unittest.TestCase):
+    def test_filenames(self):
+        report = TranslationUnitReport('foo.c')
+        self.assertEqual(report.get_html_filename(),
+                         'foo.c-refcount-errors.tu.html')
+        self.assertEqual(report.get_json_filename(),
+                         'foo.c-refcount-errors.tu.json')
+        # These mustn't be mistaken for the per-function reports by the
+        # scripts in misc/fedora:
+        self.assertFalse(report.get_html_filename().endswith('-refcount-errors.html'))
+
+    def test_function_without_reports(self):
+        report = TranslationUnitReport('bug.c')
+        report.add_function(load_example(EXAMPLE))
+        empty = load_example(EXAMPLE)
+        empty['function'] = dict(name='no_errors', lines=[10, 12])
+        empty['reports'] = []
+        report.add_function(empty)
+        self.assertEqual([data['function']['name']
+                          for data in report.get_functions()],
+                         ['make_a_list_of_random_ints_badly'])
+
+import sys
+sys.argv = ['foo', '-v']
+
+unittest.main()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify the comparison of warnings between builds within the warning
+# database
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from libcpychecker_html.warningstore import WarningDb, \
+    warnings_from_report_data, get_fingerprint
+from libcpychecker.warningdb import get_source_name, WarningRecorder
+
+def make_data(filename, funcname, reports):
+    """Make the data for a function, as per Reporter.to_json, given a list of
+    (line, message) pairs"""
+    return dict(filename=filename,
+                function=dict(name=funcname, lines=[1, 100]),
+                reports=[dict(message=message,
+                              severity='warning',
+                              location=[dict(line=line, column=1),
+                                        dict(line=line, column=1)],
+                              notes=[],
+                              states=[])
+                         for line, message in reports])
+
+def get_warnings(package, filename, funcname, reports):
+    return list(warnings_from_report_data(
+            package, make_data(filename, funcname, reports)))
+
+LEAK = "ob_refcnt of '*item' is 1 too high"
+NULL_RETURN = 'returning (PyObject*)NULL without setting an exception'
+NULL_ARG = 'calling PyList_Append with NULL as argument 1 (list) at foo.c:%i'
+
+class WarningDbTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = WarningDb(os.path.join(self.tmpdir, 'warnings.db'))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_fingerprint(self):
+        # Line numbers within messages are ignored:
+        self.assertEqual(get_fingerprint(NULL_ARG % 10),
+                         get_fingerprint(NULL_ARG % 20))
+        self.assertNotEqual(get_fingerprint(LEAK),
+                            get_fingerprint(NULL_RETURN))
+
+    def test_diff(self):
+        self.db.add_unit('old', 'foo', 'foo.c',
+                         get_warnings('foo', 'foo.c', 'make_list',
+                                      [(10, LEAK), (20, NULL_ARG % 20)]))
+        self.db.add_unit('old', 'bar', 'bar.c',
+                         get_warnings('bar', 'bar.c', 'bar', [(5, LEAK)]))
+
+        # In the new build, the leak is fixed, the other warning moves, and
+        # there's a new one; "bar" didn't build, and "baz" is new:
+        self.db.add_unit('new', 'foo', 'foo.c',
+                         get_warnings('foo', 'foo.c', 'make_list',
+                                      [(25, NULL_ARG % 25),
+                                       (30, NULL_RETURN)]))
+        self.db.add_unit('new', 'baz', 'baz.c',
+                         get_warnings('baz', 'baz.c', 'baz', [(5, LEAK)]))
+
+        diff = self.db.diff('old', 'new')
+        self.assertEqual([w.message for w in diff.new], [NULL_RETURN])
+        self.assertEqual([w.message for w in diff.fixed], [LEAK])
+        self.assertEqual([(w.message, w.line) for w in diff.persisting],
+                         [(NULL_ARG % 25, 25)])
+        self.assertEqual(diff.only_in_old, ['bar'])
+        self.assertEqual(diff.only_in_new, ['baz'])
+        self.assertEqual(str(diff.new[0]),
+                         'foo: foo.c:30: make_list: %s' % NULL_RETURN)
+
+        diff = self.db.diff('old', 'new', package='bar')
+        self.assertEqual(diff.new, [])
+        self.assertEqual(diff.fixed, [])
+        self.assertEqual(diff.only_in_old, ['bar'])
+        self.assertEqual(diff.only_in_new, [])
+
+    def test_unit_without_warnings(self):
+        # A unit with no warnings still counts as having been built:
+        self.db.add_unit('old', 'foo', 'foo.c',
+                         get_warnings('foo', 'foo.c', 'f', [(10, LEAK)]))
+        self.db.add_unit('new', 'foo', 'foo.c', [])
+        diff = self.db.diff('old', 'new')
+        self.assertEqual(len(diff.fixed), 1)
+        self.assertEqual(diff.only_in_old, [])
+        self.assertEqual(self.db.get_builds(),
+                         [('new', 1, 1, 0), ('old', 1, 1, 1)])
+
+    def test_rebuild_replaces_unit(self):
+        self.db.add_unit('b1', 'foo', 'foo.c',
+                         get_warnings('foo', 'foo.c', 'f', [(10, LEAK)]))
+        self.db.add_unit('b1', 'foo', 'foo.c',
+                         get_warnings('foo', 'foo.c', 'f', [(10, NULL_RETURN)]))
+        self.assertEqual([w.message for w in self.db.get_warnings('b1')],
+                         [NULL_RETURN])
+
+    def test_shared_file(self):
+        # A warning within a header seen by two units is only listed once:
+        for unit in ('a.c', 'b.c'):
+            self.db.add_unit('b1', 'foo', unit,
+                             get_warnings('foo', 'foo.h', 'f', [(3, LEAK)]))
+        self.assertEqual(len(self.db.get_warnings('b1')), 1)
+
+class WarningRecorderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'warnings.db')
+        self.saved_builddir = os.environ.pop('RPM_BUILD_DIR', None)
+
+    def tearDown(self):
+        if self.saved_builddir is not None:
+            os.environ['RPM_BUILD_DIR'] = self.saved_builddir
+        shutil.rmtree(self.tmpdir)
+
+    def record(self, unit, filename, reports):
+        recorder = WarningRecorder(self.filename, 'b1', 'foo', unit)
+        recorder.add_function(make_data(filename, 'f', reports))
+        recorder.write()
+        return recorder
+
+    def get_warnings(self):
+        db = WarningDb(self.filename)
+        try:
+            return [(w.file, w.message) for w in db.get_warnings('b1')]
+        finally:
+            db.close()
+
+    def test_same_basename(self):
+        # e.g. "gcc -c src/a/util.c" then "gcc -c src/b/util.c", from the
+        # same directory: these are two different units, so the second
+        # mustn't replace the warnings of the first:
+        a = self.record(get_source_name('src/a/util.c'), 'src/a/util.c',
+                        [(10, LEAK)])
+        b = self.record(get_source_name('src/b/util.c'), 'src/b/util.c',
+                        [(20, NULL_RETURN)])
+        self.assertNotEqual(a.unit, b.unit)
+        self.assertEqual(sorted(self.get_warnings()),
+                         [(os.path.join(os.getcwd(), 'src/a/util.c'), LEAK),
+                          (os.path.join(os.getcwd(), 'src/b/util.c'),
+                           NULL_RETURN)])
+
+    def test_unit_from_first_function(self):
+        # Without the name of the main input file, the unit is that of the
+        # first function:
+        a = self.record(None, 'src/a/util.c', [(10, LEAK)])
+        b = self.record(None, 'src/b/util.c', [(20, NULL_RETURN)])
+        self.assertEqual(a.unit, os.path.join(os.getcwd(), 'src/a/util.c'))
+        self.assertEqual(b.unit, os.path.join(os.getcwd(), 'src/b/util.c'))
+        self.assertEqual(len(self.get_warnings()), 2)
+
+        # ...and recompiling a unit replaces its warnings:
+        self.record(None, 'src/a/util.c', [(30, NULL_RETURN)])
+        self.assertEqual(sorted(self.get_warnings()),
+                         [(os.path.join(os.getcwd(), 'src/a/util.c'),
+                           NULL_RETURN),
+                          (os.path.join(os.getcwd(), 'src/b/util.c'),
+                           NULL_RETURN)])
+
+class SourceNameTests(unittest.TestCase):
+    def setUp(self):
+        self.saved_builddir = os.environ.pop('RPM_BUILD_DIR', None)
+
+    def tearDown(self):
+        if self.saved_builddir is None:
+            os.environ.pop('RPM_BUILD_DIR', None)
+        else:
+            os.environ['RPM_BUILD_DIR'] = self.saved_builddir
+
+    def test_outside_rpm_build(self):
+        # Relative paths are made absolute, so that they don't depend on the
+        # directory the compiler was invoked from:
+        self.assertEqual(get_source_name('src/../foo.c'),
+                         os.path.join(os.getcwd(), 'foo.c'))
+        self.assertEqual(get_source_name('/tmp/foo.c'), '/tmp/foo.c')
+
+    def test_within_rpm_build(self):
+        os.environ['RPM_BUILD_DIR'] = '/builddir/build/BUILD'
+        self.assertEqual(
+            get_source_name('/builddir/build/BUILD/foo-1.0/src/foo.c'),
+            os.path.join('src', 'foo.c'))
+        # Files outside of the build directory get an absolute path:
+        self.assertEqual(get_source_name('/usr/include/Python.h'),
+                         '/usr/include/Python.h')
+
+import sys
+sys.argv = ['foo', '-v']
+
+unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify the lookup of global typedefs and variables via the
+# GlobalDeclIndex, and that the index is rebuilt when new global
+# declarations appear
+
+import gcc
+import gccutils
+
+# The index built whilst the code is still being parsed:
+early_index = []
+
+def on_finish_decl(decl, *args):
+    if isinstance(decl, gcc.VarDecl) and decl.name == 'first_var':
+        early_index.append(gccutils.get_global_decl_index())
+
+def on_pass_execution(p, fn):
+    if p.name == '*free_lang_data':
+        # Each declaration parsed since the early index was built discarded
+        # it, so that the later ones can be found:
+        index = gccutils.get_global_decl_index()
+        assert early_index
+        print('rebuilt after new declarations: %s'
+              % (index is not early_index[0]))
+
+        for name in ('first_typedef', 'later_typedef'):
+            decl = gccutils.get_global_typedef(name)
+            assert isinstance(decl, gcc.TypeDecl)
+            print('typedef %s: %s' % (name, decl.name))
+        for name in ('first_var', 'later_var'):
+            decl = gccutils.get_global_vardecl_by_name(name)
+            assert isinstance(decl, gcc.VarDecl)
+            print('variable %s: %s' % (name, decl.type))
+        print('unknown typedef: %s' % gccutils.get_global_typedef('not_a_typedef'))
+        print('unknown variable: %s'
+              % gccutils.get_global_vardecl_by_name('not_a_var'))
+
+        # Nothing has changed since, so the index is reused:
+        print('reused: %s' % (gccutils.get_global_decl_index() is index))
+
+        # ...until it's invalidated (as by PLUGIN_FINISH_DECL or
+        # PLUGIN_FINISH_UNIT), after which the lookups still work:
+        gccutils._invalidate_global_decl_index()
+        newindex = gccutils.get_global_decl_index()
+        print('rebuilt after invalidation: %s' % (newindex is not index))
+        print('typedef first_typedef: %s'
+              % gccutils.get_global_typedef('first_typedef').name)
+        print('variable later_var: %s'
+              % gccutils.get_global_vardecl_by_name('later_var').type)
+
+gcc.register_callback(gcc.PLUGIN_FINISH_DECL,
+                      on_finish_decl)
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
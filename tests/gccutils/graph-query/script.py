@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Exercise the query planner and its indexes, using nodes with fake
+# statements and functions, rather than ones from real gcc.Function
+# instances
+
+import gc
+import unittest
+import weakref
+
+from gccutils.graph import Graph, Node
+import gccutils.graph.query
+from gccutils.graph.query import Query, GraphIndex, AssigningTo, Within, \
+    get_index
+
+class Named:
+    def __init__(self, name):
+        self.name = name
+
+class FakeFunction:
+    def __init__(self, name):
+        self.decl = Named(name)
+
+class FakeAssignment:
+    def __init__(self, varname):
+        self.lhs = FakeLhs(varname)
+
+class FakeLhs:
+    def __init__(self, varname):
+        self.var = Named(varname)
+
+class FakeNode(Node):
+    def __init__(self, funcname, varname=None):
+        Node.__init__(self)
+        self.function = FakeFunction(funcname)
+        if varname:
+            self.stmt = FakeAssignment(varname)
+        else:
+            self.stmt = None
+
+    def __repr__(self):
+        return 'FakeNode(%r)' % self.function.decl.name
+
+def make_graph():
+    g = Graph()
+    for i in range(10):
+        g.add_node(FakeNode('big'))
+    a = g.add_node(FakeNode('small', 'a'))
+    b = g.add_node(FakeNode('small', 'b'))
+    c = g.add_node(FakeNode('big', 'a'))
+    return g, a, b, c
+
+class IndexTests(unittest.TestCase):
+    def test_lookup(self):
+        g, a, b, c = make_graph()
+        index = GraphIndex(g)
+        self.assertEqual(set(index.lookup(gccutils.graph.query._get_funcname,
+                                          'small')),
+                         set([a, b]))
+        self.assertEqual(set(index.lookup(gccutils.graph.query._get_lhs_varname,
+                                          'a')),
+                         set([a, c]))
+        self.assertEqual(index.lookup(gccutils.graph.query._get_lhs_varname,
+                                      'not_a_var'),
+                         [])
+
+    def test_shared_between_queries(self):
+        g, a, b, c = make_graph()
+        self.assertIs(get_index(g), get_index(g))
+
+    def test_stale_after_adding_node(self):
+        g, a, b, c = make_graph()
+        self.assertEqual(set(Query(g).within('small')), set([a, b]))
+        d = g.add_node(FakeNode('small'))
+        self.assertEqual(set(Query(g).within('small')), set([a, b, d]))
+
+    def test_stale_after_replacing_node(self):
+        # Removing one node and adding another leaves the number of
+        # nodes unchanged, but the index must still be rebuilt:
+        g, a, b, c = make_graph()
+        self.assertEqual(Query(g).assigning_to('b').one(), b)
+        g.remove_node(b)
+        d = g.add_node(FakeNode('small', 'd'))
+        self.assertEqual(list(Query(g).assigning_to('b')), [])
+        self.assertEqual(Query(g).assigning_to('d').one(), d)
+
+    def test_index_does_not_keep_graph_alive(self):
+        g, a, b, c = make_graph()
+        Query(g).within('small').first()
+        ref = weakref.ref(g)
+        del g
+        gc.collect()
+        self.assertIsNone(ref())
+
+class PlannerTests(unittest.TestCase):
+    def get_starting_point(self, query):
+        filters = []
+        while not isinstance(query, Query):
+            filters.insert(0, query)
+            query = query.innerquery
+        return query.get_starting_point(filters)
+
+    def test_no_filters(self):
+        g, a, b, c = make_graph()
+        best, nodes = self.get_starting_point(Query(g))
+        self.assertIsNone(best)
+        self.assertEqual(len(nodes), 13)
+        self.assertEqual(len(list(Query(g))), 13)
+
+    def test_most_selective_index(self):
+        g, a, b, c = make_graph()
+
+        # "within" gives 2 candidates, "assigning_to" gives 1:
+        q = Query(g).within('small').assigning_to('b')
+        best, nodes = self.get_starting_point(q)
+        self.assertIsInstance(best, AssigningTo)
+        self.assertEqual(nodes, [b])
+        self.assertEqual(q.one(), b)
+
+        # "within" gives 11 candidates, "assigning_to" gives 2:
+        q = Query(g).within('big').assigning_to('a')
+        best, nodes = self.get_starting_point(q)
+        self.assertIsInstance(best, AssigningTo)
+        self.assertEqual(set(nodes), set([a, c]))
+        # ...and the remaining filter is still applied:
+        self.assertEqual(q.one(), c)
+
+        # "within" gives 2 candidates, "assigning_to" gives 2; the first
+        # one wins:
+        q = Query(g).within('small').assigning_to('a')
+        best, nodes = self.get_starting_point(q)
+        self.assertIsInstance(best, Within)
+        self.assertEqual(q.one(), a)
+
+    def test_no_results(self):
+        g, a, b, c = make_graph()
+        q = Query(g).within('not_a_function').assigning_to('a')
+        best, nodes = self.get_starting_point(q)
+        self.assertIsInstance(best, Within)
+        self.assertEqual(nodes, [])
+        self.assertRaises(ValueError, q.first)
+        self.assertRaises(ValueError, q.one)
+
+import sys
+sys.argv = ['foo', '-v']
+
+unittest.main()
@@ -27,12 +27,18 @@
 
 import unittest
 
-from gccutils.graph import Graph, Node, Edge
+from gccutils.graph import Graph, Node, Edge, Subgraph, StringWriter
 
 class NamedNode(Node):
-    def __init__(self, name=None):
+    def __init__(self, name=None, funcname=None):
         Node.__init__(self)
         self.name = name
+        self.funcname = funcname
+
+    def get_subgraph_path(self, ctxt):
+        if self.funcname:
+            return (Subgraph(self.funcname, self.funcname), )
+        return ()
 
     def __str__(self):
         if self.name:
@@ -102,6 +108,38 @@ class GraphTests(unittest.TestCase):
         self.assertEqual(len(g.nodes), LENGTH)
         dot = g.to_dot('example')
 
+    def test_write_dot(self):
+        g = Graph()
+        first, last = add_long_path(g, 10)
+        out = StringWriter()
+        g.write_dot(out, 'example')
+        self.assertEqual(out.getvalue(), g.to_dot('example'))
+
+    def test_collapsed_subgraphs(self):
+        # Verify that large subgraphs can be collapsed into single nodes:
+        #   a ─> b ─> c ─> d ─> e
+        # where a and e aren't within a function, b and c are within
+        # "small", and d is within "big", along with 10 other nodes
+        g = Graph()
+        a = g.add_node(NamedNode('a'))
+        b = g.add_node(NamedNode('b', 'small'))
+        c = g.add_node(NamedNode('c', 'small'))
+        d = g.add_node(NamedNode('d', 'big'))
+        e = g.add_node(NamedNode('e'))
+        for i in range(10):
+            g.add_edge(d, g.add_node(NamedNode('n%i' % i, 'big')))
+        g.add_edge(a, b)
+        g.add_edge(b, c)
+        g.add_edge(c, d)
+        g.add_edge(d, e)
+        dot = g.to_dot('example', maxclusternodes=5)
+        self.assertIn('subgraph cluster_small', dot)
+        self.assertNotIn('subgraph cluster_big', dot)
+        self.assertIn('collapsed_big [label=<big (11 nodes)>];', dot)
+        self.assertIn('%s -> collapsed_big;' % c.to_dot_id(), dot)
+        self.assertIn('collapsed_big -> %s;' % e.to_dot_id(), dot)
+        self.assertNotIn('collapsed_big -> collapsed_big', dot)
+
 class PathfindingTests(unittest.TestCase):
     def test_no_path(self):
         g = Graph()
@@ -165,6 +203,50 @@ class PathfindingTests(unittest.TestCase):
         self.assertEqual(p1, be)
         self.assertEqual(p2, ef)
 
+class CompactGraphTests(unittest.TestCase):
+    def test_trivial(self):
+        g, a, b, ab = make_trivial_graph()
+        adj = g.compact()
+        self.assertEqual(g.compact(), adj)
+        self.assertEqual(list(a.succs), [ab])
+        self.assertEqual(list(a.preds), [])
+        self.assertEqual(list(b.preds), [ab])
+        self.assertEqual(list(b.succs), [])
+        self.assertTrue(a.succs)
+        self.assertFalse(a.preds)
+        self.assertIn(ab, b.preds)
+        self.assertNotIn(ab, b.succs)
+        self.assertEqual(g.edges, [ab])
+        ida = g.get_node_id(a)
+        idb = g.get_node_id(b)
+        self.assertEqual(adj.nodes[ida], a)
+        self.assertEqual(adj.get_succ_ids(ida), [idb])
+        self.assertEqual(adj.get_pred_ids(idb), [ida])
+        self.assertRaises(ValueError, g.add_edge, b, a)
+        self.assertRaises(ValueError, g.add_node, NamedNode('c'))
+        self.assertRaises(ValueError, g.remove_edge, ab)
+
+    def test_cycles(self):
+        # As per PathfindingTests.test_cycles, but on a compacted graph:
+        LENGTH = 5
+        g = Graph()
+        a = add_cycle(g, LENGTH)
+        b = add_cycle(g, LENGTH)
+        c = add_cycle(g, LENGTH)
+        ab = g.add_edge(a, b)
+        bc = g.add_edge(b, c)
+        g.compact()
+        self.assertEqual(len(g.edges), LENGTH * 3 + 2)
+        self.assertEqual(len(a.succs), 2)
+        self.assertEqual(len(b.preds), 2)
+        for node in g.nodes:
+            for edge in node.succs:
+                self.assertEqual(edge.srcnode, node)
+                self.assertIn(edge, edge.dstnode.preds)
+        path = g.get_shortest_path(a, c)
+        self.assertEqual(path, [ab, bc])
+        dot = g.to_dot('example')
+
 import sys
 sys.argv = ['foo', '-v']
 
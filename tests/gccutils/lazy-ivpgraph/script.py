@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Exercise LazyIvpGraph using a hand-built supergraph, rather than one
+# built from real gcc.Function instances:
+#
+#   main:  ENTRY ──> c1 ┄┄> r1 ──> c2 ┄┄> r2 ──> EXIT
+#   f:     ENTRY ──> c3 ┄┄> r3 ──> EXIT
+#   g:     ENTRY ──> EXIT
+#
+# where c1 and c2 call f, and c3 calls g.
+
+import unittest
+
+from gccutils.graph import Graph
+from gccutils.graph.supergraph import SupergraphNode, CallNode, \
+    ReturnNode, SupergraphEdge, CallToStart, ExitToReturnSite
+from gccutils.graph.ivpgraph import Callstring, push_callstring, \
+    LazyIvpGraph, LazyIvpNode
+
+class FakeDecl:
+    def __init__(self, name):
+        self.name = name
+
+class FakeFunction:
+    def __init__(self, name):
+        self.decl = FakeDecl(name)
+
+class FakeStmtGraph:
+    def __init__(self, fun):
+        self.fun = fun
+        self.entry = 'entry of %s' % fun.decl.name
+
+class FakeSupergraph(Graph):
+    def __init__(self):
+        Graph.__init__(self)
+        self.stmtg_for_fun = {}
+        self.supernode_for_stmtnode = {}
+        self.entrynodes = []
+
+    def _make_edge(self, srcnode, dstnode, cls):
+        return cls(srcnode, dstnode, None)
+
+    def add_function(self, name):
+        fun = FakeFunction(name)
+        stmtg = FakeStmtGraph(fun)
+        self.stmtg_for_fun[fun] = stmtg
+        entry = self.add_node(SupergraphNode(None, stmtg))
+        self.supernode_for_stmtnode[stmtg.entry] = entry
+        exit = self.add_node(SupergraphNode(None, stmtg))
+        return fun, stmtg, entry, exit
+
+    def add_call(self, stmtg, callee_entry, callee_exit):
+        callnode = self.add_node(CallNode(None, stmtg))
+        returnnode = self.add_node(ReturnNode(None, stmtg))
+        callnode.returnnode = returnnode
+        returnnode.callnode = callnode
+        self.add_edge(callnode, callee_entry, CallToStart)
+        self.add_edge(callee_exit, returnnode, ExitToReturnSite)
+        return callnode, returnnode
+
+    def get_functions(self):
+        for fun in self.stmtg_for_fun:
+            yield fun
+
+    def get_entry_nodes(self):
+        for node in self.entrynodes:
+            yield node
+
+def make_supergraph():
+    sg = FakeSupergraph()
+    main, main_stmtg, main_entry, main_exit = sg.add_function('main')
+    f, f_stmtg, f_entry, f_exit = sg.add_function('f')
+    g, g_stmtg, g_entry, g_exit = sg.add_function('g')
+
+    c1, r1 = sg.add_call(main_stmtg, f_entry, f_exit)
+    c2, r2 = sg.add_call(main_stmtg, f_entry, f_exit)
+    sg.add_edge(main_entry, c1, SupergraphEdge)
+    sg.add_edge(r1, c2, SupergraphEdge)
+    sg.add_edge(r2, main_exit, SupergraphEdge)
+
+    c3, r3 = sg.add_call(f_stmtg, g_entry, g_exit)
+    sg.add_edge(f_entry, c3, SupergraphEdge)
+    sg.add_edge(r3, f_exit, SupergraphEdge)
+
+    sg.add_edge(g_entry, g_exit, SupergraphEdge)
+
+    sg.entrynodes.append(main_entry)
+    return sg, dict(main_entry=main_entry, main_exit=main_exit,
+                    f_entry=f_entry, f_exit=f_exit,
+                    g_entry=g_entry, g_exit=g_exit,
+                    c1=c1, r1=r1, c2=c2, r2=r2, c3=c3, r3=r3)
+
+class CallstringTests(unittest.TestCase):
+    def test_push(self):
+        sg, n = make_supergraph()
+        empty = Callstring(tuple())
+        cs = push_callstring(empty, n['c1'], 2)
+        self.assertEqual(cs, Callstring((n['c1'], )))
+        cs = push_callstring(cs, n['c3'], 2)
+        self.assertEqual(cs, Callstring((n['c1'], n['c3'])))
+
+    def test_push_truncates(self):
+        sg, n = make_supergraph()
+        cs = Callstring((n['c1'], n['c3']))
+        # The bottom of the stack is lost:
+        self.assertEqual(push_callstring(cs, n['c2'], 2),
+                         Callstring((n['c3'], n['c2'])))
+        self.assertEqual(push_callstring(Callstring((n['c1'], )), n['c3'], 1),
+                         Callstring((n['c3'], )))
+
+class LazyIvpGraphTests(unittest.TestCase):
+    def get_succ_keys(self, node):
+        return set((edge.dstnode.callstring, edge.dstnode.innernode)
+                   for edge in node.succs)
+
+    def test_walk(self):
+        sg, n = make_supergraph()
+        ivpg = LazyIvpGraph(sg, 2)
+        entrynodes = list(ivpg.get_entry_nodes())
+        self.assertEqual(len(entrynodes), 1)
+        node = entrynodes[0]
+        self.assertEqual(node.callstring, Callstring(tuple()))
+        self.assertEqual(node.innernode, n['main_entry'])
+
+        # Calls push onto the callstring:
+        (edge, ) = node.succs
+        self.assertEqual(edge.dstnode.innernode, n['c1'])
+        (edge, ) = edge.dstnode.succs
+        self.assertIsInstance(edge.inneredge, CallToStart)
+        self.assertEqual(edge.dstnode,
+                         LazyIvpNode(ivpg, Callstring((n['c1'], )),
+                                     n['f_entry']))
+
+        (edge, ) = edge.dstnode.succs
+        (edge, ) = edge.dstnode.succs
+        self.assertEqual(edge.dstnode,
+                         LazyIvpNode(ivpg, Callstring((n['c1'], n['c3'])),
+                                     n['g_entry']))
+
+        # Returns pop from it; main has no callers, so the full-length
+        # callstring doesn't gain any other possible bottom elements:
+        (edge, ) = edge.dstnode.succs
+        (edge, ) = edge.dstnode.succs
+        self.assertIsInstance(edge.inneredge, ExitToReturnSite)
+        self.assertEqual(edge.dstnode,
+                         LazyIvpNode(ivpg, Callstring((n['c1'], )),
+                                     n['r3']))
+
+        # f's exit has return edges to both r1 and r2, but only the one
+        # matching the top of the callstring is followed:
+        (edge, ) = edge.dstnode.succs
+        self.assertEqual(self.get_succ_keys(edge.dstnode),
+                         set([(Callstring(tuple()), n['r1'])]))
+
+    def test_return_to_wrong_site(self):
+        sg, n = make_supergraph()
+        ivpg = LazyIvpGraph(sg, 2)
+        node = LazyIvpNode(ivpg, Callstring((n['c2'], )), n['f_exit'])
+        self.assertEqual(self.get_succ_keys(node),
+                         set([(Callstring(tuple()), n['r2'])]))
+
+        # Returning with an empty callstring leads nowhere:
+        node = LazyIvpNode(ivpg, Callstring(tuple()), n['f_exit'])
+        self.assertEqual(node.succs, ())
+
+    def test_truncated_return(self):
+        sg, n = make_supergraph()
+        ivpg = LazyIvpGraph(sg, 1)
+
+        # With maxlength 1, the call to g loses the call to f:
+        node = LazyIvpNode(ivpg, Callstring((n['c1'], )), n['c3'])
+        (edge, ) = node.succs
+        self.assertEqual(edge.dstnode.callstring, Callstring((n['c3'], )))
+
+        # ...so the return from g could be back to either call of f, or
+        # from a stack that was never truncated:
+        node = LazyIvpNode(ivpg, Callstring((n['c3'], )), n['g_exit'])
+        self.assertEqual(self.get_succ_keys(node),
+                         set([(Callstring(tuple()), n['r3']),
+                              (Callstring((n['c1'], )), n['r3']),
+                              (Callstring((n['c2'], )), n['r3'])]))
+
+    def test_lru_eviction(self):
+        sg, n = make_supergraph()
+        ivpg = LazyIvpGraph(sg, 2, maxentries=2)
+        empty = Callstring(tuple())
+        a = LazyIvpNode(ivpg, empty, n['main_entry'])
+        b = LazyIvpNode(ivpg, empty, n['r1'])
+        c = LazyIvpNode(ivpg, empty, n['r2'])
+
+        a.succs
+        b.succs
+        self.assertEqual((ivpg.hits, ivpg.misses), (0, 2))
+
+        # Looking up "a" again is a hit, making "b" the least recently used:
+        a.succs
+        self.assertEqual((ivpg.hits, ivpg.misses), (1, 2))
+
+        # ...so "b" is the one discarded when "c" is added:
+        c.succs
+        self.assertEqual((ivpg.hits, ivpg.misses), (1, 3))
+        self.assertEqual(len(ivpg._succs_for_key), 2)
+        self.assertNotIn((empty, n['r1']), ivpg._succs_for_key)
+
+        # ...and is rebuilt if needed again, discarding "a":
+        self.assertEqual(self.get_succ_keys(b),
+                         set([(empty, n['c2'])]))
+        self.assertEqual((ivpg.hits, ivpg.misses), (1, 4))
+        self.assertNotIn((empty, n['main_entry']), ivpg._succs_for_key)
+        c.succs
+        self.assertEqual((ivpg.hits, ivpg.misses), (2, 4))
+
+import sys
+sys.argv = ['foo', '-v']
+
+unittest.main()
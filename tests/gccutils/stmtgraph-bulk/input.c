@@ -0,0 +1,57 @@
+/*
+   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2014 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+/*
+  Functions with loops, switch statements and (once in SSA form) phi
+  nodes, for comparing the ways of building a StmtGraph
+*/
+
+int
+test_loop(int n)
+{
+    int i;
+    int total = 0;
+    for (i = 0; i < n; i++) {
+        if (i & 1) {
+            total += i;
+        } else {
+            total -= 1;
+        }
+    }
+    return total;
+}
+
+int
+test_switch(int i)
+{
+    switch (i) {
+    case 0:
+        return 42;
+    case 1:
+    case 2:
+        return 17;
+    default:
+        return i;
+    }
+}
+
+void
+test_empty(void)
+{
+}
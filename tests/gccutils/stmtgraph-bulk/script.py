@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that a StmtGraph built from the bulk export of the CFG
+# (gcc.Function.get_stmtgraph_data) has the same nodes and edges as one built
+# by going through the attributes of each block and edge in turn
+
+import gcc
+from gccutils.graph import stmtgraph
+from gccutils.graph.stmtgraph import StmtGraph, SplitPhiNode
+
+def describe_node(node):
+    if isinstance(node, SplitPhiNode):
+        return (node.__class__.__name__, None, node.stmt, node.inneredge)
+    return (node.__class__.__name__,
+            node.bb.index if node.bb else None,
+            node.stmt, None)
+
+def describe_graph(sg):
+    nodes = set(describe_node(node) for node in sg.nodes)
+    edges = [(edge.sortidx,
+              describe_node(edge.srcnode), describe_node(edge.dstnode),
+              edge.cfgedge, edge.caselabelexprs)
+             for edge in sorted(sg.edges, key=lambda edge: edge.sortidx)]
+    return (len(sg.nodes), nodes, edges,
+            describe_node(sg.entry), describe_node(sg.exit))
+
+def build_per_block(fun, **kwargs):
+    saved = stmtgraph.get_stmtgraph_data
+    stmtgraph.get_stmtgraph_data = stmtgraph._get_stmtgraph_data_per_block
+    try:
+        return StmtGraph(fun, **kwargs)
+    finally:
+        stmtgraph.get_stmtgraph_data = saved
+
+def on_pass_execution(p, fn):
+    if p.name in ('*warn_function_return', 'optimized'):
+        assert hasattr(fn, 'get_stmtgraph_data')
+        for kwargs in (dict(split_phi_nodes=False),
+                       dict(split_phi_nodes=True),
+                       dict(split_phi_nodes=True, omit_complex_edges=True)):
+            bulk = describe_graph(StmtGraph(fn, **kwargs))
+            per_block = describe_graph(build_per_block(fn, **kwargs))
+            assert bulk == per_block, (bulk, per_block)
+        checked.append((fn.decl.name, p.name))
+
+# (printed at the end, as the order in which functions are handled varies
+# between versions of GCC)
+checked = []
+
+def on_finish():
+    for funcname, passname in sorted(checked):
+        print('%s: %s: same nodes and edges' % (funcname, passname))
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
+gcc.register_callback(gcc.PLUGIN_FINISH,
+                      on_finish)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that a SupergraphCache reuses the Supergraph, and the StmtGraph of
+# each function, rather than building them again
+
+import gcc
+from gccutils.graph.supergraph import SupergraphCache
+
+def on_pass_execution(p, fn):
+    if p.name == '*free_lang_data':
+        cache = SupergraphCache()
+        numfuns = len([node for node in gcc.get_callgraph_nodes()
+                       if node.decl.function])
+
+        # The first time around, each StmtGraph is built (and only looked
+        # up once):
+        sg1 = cache.get_supergraph(split_phi_nodes=False,
+                                   add_fake_entry_node=False)
+        assert cache.misses == numfuns
+        assert cache.hits == 0
+        print('functions: %s'
+              % ', '.join(sorted(fun.decl.name
+                                 for fun in sg1.get_functions())))
+
+        # Nothing has changed, so the same Supergraph is returned:
+        sg2 = cache.get_supergraph(split_phi_nodes=False,
+                                   add_fake_entry_node=False)
+        assert sg2 is sg1
+        assert cache.misses == numfuns
+        assert cache.hits == numfuns
+        print('same Supergraph: %s' % (sg2 is sg1))
+
+        # ...having compared each function's signature by identity, rather
+        # than walking it again, as the CFG snapshots are cached until this
+        # callback returns to GCC:
+        for fun in sg1.get_functions():
+            assert cache.stmtgraphs[(fun, False)][0] is fun.cfg.export()
+        print('same CFG snapshots: %s'
+              % all(cache.stmtgraphs[(fun, False)][0] is fun.cfg.export()
+                    for fun in sg1.get_functions()))
+
+        # A Supergraph with different options is built anew, but from the
+        # same StmtGraphs:
+        sg3 = cache.get_supergraph(split_phi_nodes=False,
+                                   add_fake_entry_node=True)
+        assert sg3 is not sg1
+        assert sg3.fake_entry_node
+        assert cache.misses == numfuns
+        assert cache.hits == numfuns * 2
+        for fun in sg1.get_functions():
+            assert sg3.stmtg_for_fun[fun] is sg1.stmtg_for_fun[fun]
+        print('same StmtGraphs: %s'
+              % all(sg3.stmtg_for_fun[fun] is sg1.stmtg_for_fun[fun]
+                    for fun in sg1.get_functions()))
+
+        # ...whereas the StmtGraphs with split phi nodes are separate:
+        sg4 = cache.get_supergraph(split_phi_nodes=True,
+                                   add_fake_entry_node=False)
+        assert cache.misses == numfuns * 2
+        print('split phi nodes: %s'
+              % all(sg4.stmtg_for_fun[fun] is not sg1.stmtg_for_fun[fun]
+                    for fun in sg1.get_functions()))
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
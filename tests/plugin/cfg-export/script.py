@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that gcc.Cfg.export() is consistent with the attributes of
+# gcc.BasicBlock and gcc.Edge, and that it's reused within a callback
+
+import gcc
+
+FLAGS = ('true_value', 'false_value', 'loop_exit', 'can_fallthru',
+         'complex', 'eh')
+
+snapshots = []
+
+def on_pass_execution(p, fn):
+    if p.name in ('*warn_function_return', 'ssa'):
+        snapshot = fn.cfg.export()
+        assert isinstance(snapshot, tuple)
+
+        # Reused for the rest of this callback:
+        assert fn.cfg.export() is snapshot
+
+        # ...but not for later ones:
+        for old in snapshots:
+            assert old is not snapshot
+        snapshots.append(snapshot)
+
+        basic_blocks = fn.cfg.basic_blocks
+        assert len(snapshot) == len(basic_blocks)
+        for bb, item in zip(basic_blocks, snapshot):
+            index, exported_bb, phi_nodes, gimple, succs = item
+            assert index == bb.index
+            assert exported_bb == bb
+            assert phi_nodes == tuple(bb.phi_nodes or ())
+            assert gimple == tuple(bb.gimple or ())
+            assert len(succs) == len(bb.succs)
+            for edge, (exported_edge, dest_index, flags) in zip(bb.succs,
+                                                                succs):
+                assert exported_edge == edge
+                assert dest_index == edge.dest.index
+                assert flags == tuple(flag for flag in FLAGS
+                                      if getattr(edge, flag))
+
+        # gcc.Function.get_stmtgraph_data() is built from the same snapshot:
+        data = fn.get_stmtgraph_data()
+        assert len(data) == len(snapshot)
+        for (bb, phi_nodes, gimple, succs), item in zip(data, snapshot):
+            assert bb is item[1]
+            assert tuple(phi_nodes) == item[2]
+            assert tuple(gimple) == item[3]
+            for (edge, destidx), (exported_edge, dest_index, flags) \
+                    in zip(succs, item[4]):
+                assert edge is exported_edge
+                if destidx != -1:
+                    assert snapshot[destidx][0] == dest_index
+        print('%s: %s: OK' % (p.name, fn.decl.name))
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
+
+# Verify that the snapshot is discarded when a pass returns to GCC, even
+# if no other pass starts executing in the meantime:
+class CheckExportPass(gcc.GimplePass):
+    def gate(self, fn):
+        self.gate_snapshot = fn.cfg.export()
+        return True
+
+    def execute(self, fn):
+        assert fn.cfg.export() is not self.gate_snapshot
+        assert fn.cfg.export() == self.gate_snapshot
+        print('%s: %s: OK' % (self.name, fn.decl.name))
+
+ps = CheckExportPass(name='check-export')
+ps.register_after('ssa')
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2014 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2014 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Selftest for gcc.Gimple.find_trees and gcc.Function.find_trees
+import gcc
+
+class FindTreesPass(gcc.GimplePass):
+    def execute(self, fun):
+        # This is called per-function during compilation:
+        print('fun: %s' % fun)
+        pairs = fun.find_trees(gcc.StringCst)
+        for stmt, node in pairs:
+            print('  stmt: %s' % stmt)
+            print('    node: %r (%s)' % (node, node))
+
+        # Verify that this is consistent with the per-statement API,
+        # and that it accepts a tuple of types:
+        expected = []
+        for bb in fun.cfg.basic_blocks:
+            if bb.gimple:
+                for stmt in bb.gimple:
+                    for node in stmt.find_trees((gcc.StringCst, )):
+                        expected.append((stmt, node))
+        assert pairs == expected
+
+        # Verify that find_trees is consistent with walk_tree:
+        for stmt, node in pairs:
+            nodes = []
+            def cb(node):
+                if isinstance(node, gcc.Constant):
+                    nodes.append(node)
+            stmt.walk_tree(cb)
+            assert stmt.find_trees(gcc.Constant) == nodes
+
+ps = FindTreesPass(name='find-trees')
+ps.register_after('cfg')